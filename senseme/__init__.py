@@ -1,4 +1,7 @@
-from senseme.senseme import SenseMe, discover
+from senseme.senseme import SenseMe, discover, iter_discover
+from senseme.aio import AsyncSenseMe
+from senseme.registry import DeviceRegistry
+from senseme.sweep import sweep
 from senseme.known_attribs import KNOWN_ATTRIBUTES
 
 __all__ = "senseme"
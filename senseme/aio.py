@@ -0,0 +1,726 @@
+"""asyncio client for SenseMe devices.
+
+AsyncSenseMe mirrors the SenseMe properties as coroutines, get_<property>()
+and set_<property>(value), so one event loop can drive many devices without
+a thread per call.
+
+Example:
+    from senseme.aio import discover
+
+    fans = await discover()
+    fan = fans[0]
+    await fan.set_brightness(8)
+    print(await fan.get_speed())
+"""
+import asyncio
+import logging
+import time
+
+from .lib import BurstProfile, BurstReader
+from .protocol import (
+    MessageFramer,
+    clamp,
+    from_fahrenheit,
+    last_value,
+    match_reply,
+    parse_attribute,
+    parse_device_ids,
+    parse_level,
+    parse_wakeup_brightness,
+    reply_body,
+    reply_values,
+    response_path,
+    to_fahrenheit,
+    to_minutes,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# get_running_loop is new in Python 3.7, before it get_event_loop returns the
+# running loop when called from a coroutine
+_get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+PORT = 31415
+
+
+class AsyncSenseMe:
+    """asyncio SenseMe device class.
+
+    Unlike SenseMe both ip and name are required, no discovery is done on
+    instantiation. Use discover() to find devices.
+    """
+
+    PORT = PORT
+
+    def __init__(
+        self, ip, name, model="", series="", mac="", timeout=5, cache_timeout=45
+    ):
+        """Init an AsyncSenseMe device.
+
+        :param ip: IP address of the device
+        :param name: Device name, as configured/displayed in HaikuHome app.
+        :param model: Device model number, see SenseMe
+        :param series: See comment on model
+        :param mac: MAC address of the device
+        :param timeout: seconds to wait on connect and replies
+        :param cache_timeout: seconds GETALL results are reused for
+        """
+        self.ip = ip
+        self.name = name
+        self.model = model
+        self.series = series
+        self.mac = mac
+        self.timeout = timeout
+        self.cache_timeout = cache_timeout
+        self._all_cache = None
+        self._all_cache_time = 0.0
+        # made on first use, in the event loop, see get_all
+        self._get_all_lock = None
+        self._getall_profile = BurstProfile()
+
+    def __repr__(self):
+        """Repr Method."""
+        return (
+            f"AsyncSenseMe(name='{self.name}', ip='{self.ip}', "
+            f"model='{self.model}', series='{self.series}', "
+            f"mac='{self.mac}')"
+        )
+
+    # The following are generic to haiku devices
+
+    async def get_beeper_sound(self):
+        """Return if the audible beeper sound is ON or OFF."""
+        return await self._query("<%s;DEVICE;BEEPER;GET>" % self.name)
+
+    async def set_beeper_sound(self, mode):
+        """Set the audible beeper sound to ON or OFF."""
+        mode = _on_off(mode, "beeper sound")
+        if mode:
+            await self._send_command("<%s;DEVICE;BEEPER;%s>" % (self.name, mode))
+
+    async def get_device_time(self):
+        """Return the current time on the device."""
+        return await self._query("<%s;TIME;VALUE;GET>" % self.name)
+
+    async def get_firmware_name(self):
+        """Return the name of the firmware file running on the device."""
+        return await self._query("<%s;FW;NAME;GET>" % self.name)
+
+    async def get_firmware_version(self):
+        """Return the version of the firmware running on the device."""
+        name = await self.get_firmware_name()
+        return await self._query("<%s;FW;%s;GET>" % (self.name, name))
+
+    async def get_led_indicators(self):
+        """Return if the indicator LED is ON or OFF."""
+        return await self._query("<%s;DEVICE;INDICATORS;GET>" % self.name)
+
+    async def set_led_indicators(self, mode):
+        """Set the indicator LED to ON or OFF."""
+        mode = _on_off(mode, "led indicator setting")
+        if mode:
+            await self._send_command("<%s;DEVICE;INDICATORS;%s>" % (self.name, mode))
+
+    async def get_network_ap_status(self):
+        """Return if the wireless access point is enabled on the device."""
+        return await self._query("<%s;NW;AP;GET;STATUS>" % self.name)
+
+    async def get_network_dhcp_state(self):
+        """Return if the device is running a local dhcp service."""
+        return await self._query("<%s;NW;DHCP;GET>" % self.name)
+
+    async def get_network_parameters(self):
+        """Return a tuple of ip address, subnet mask and default gateway."""
+        raw = await self._queryraw("<%s;NW;PARAMS;GET;ACTUAL>" % self.name)
+        return tuple(reply_values(raw, 3))
+
+    async def get_network_ssid(self):
+        """Return the wireless SSID the device is connected to."""
+        return await self._query("<%s;NW;SSID;GET>" % self.name)
+
+    async def get_network_token(self):
+        """Return the network token of the device."""
+        return await self._query("<%s;NW;TOKEN;GET>" % self.name)
+
+    # The following are specific to haiku fans
+
+    async def get_fan_powered_on(self):
+        """Return True if the fan is on, False if off."""
+        return await self._query("<%s;FAN;PWR;GET>" % self.name) == "ON"
+
+    async def set_fan_powered_on(self, power_on=True):
+        """Turn the fan on or off."""
+        await self._send_command(
+            "<%s;FAN;PWR;%s>" % (self.name, "ON" if power_on else "OFF")
+        )
+
+    async def fan_toggle(self):
+        """Toggle power state of fan."""
+        await self.set_fan_powered_on(not await self.get_fan_powered_on())
+
+    async def get_height(self):
+        """Return fan height in centimeters."""
+        return int(await self._query("<%s;WINTERMODE;HEIGHT;GET>" % self.name))
+
+    async def set_height(self, val):
+        """Set fan height in centimeters."""
+        if val > 0:
+            await self._send_command(
+                "<%s;WINTERMODE;HEIGHT;SET;%s>" % (self.name, val)
+            )
+
+    async def get_speed(self):
+        """Return the fan speed."""
+        # see https://github.com/TomFaulkner/SenseMe/issues/38
+        for _ in range(2):
+            speed = parse_level(
+                await self._query("<%s;FAN;SPD;GET;ACTUAL>" % self.name)
+            )
+            if speed is not None:
+                return speed
+        return 0
+
+    async def set_speed(self, speed):
+        """Set fan speed, valid values are 0 to 7."""
+        speed = clamp(speed, 0, 7)
+        await self._send_command("<%s;FAN;SPD;SET;%s>" % (self.name, speed))
+
+    async def get_min_speed(self):
+        """Return the fan's minimum speed setting."""
+        return await self._query("<%s;FAN;SPD;GET;MIN>" % self.name)
+
+    async def get_max_speed(self):
+        """Return the fan's maximum speed setting."""
+        return await self._query("<%s;FAN;SPD;GET;MAX>" % self.name)
+
+    async def get_room_settings_fan_speed_limits(self):
+        """Return a tuple of the min and max fan speeds for the room."""
+        raw = await self._queryraw("<%s;FAN;BOOKENDS;GET>" % self.name)
+        low, high = reply_values(raw, 2)
+        return int(low), int(high)
+
+    async def set_room_settings_fan_speed_limits(self, speeds):
+        """Set the min and max fan speeds for the room from a (min, max)."""
+        if speeds[0] >= speeds[1]:
+            LOGGER.debug("min speed cannot exceed max speed")
+            return
+        await self._send_command(
+            "<%s;FAN;BOOKENDS;SET;%s;%s>" % (self.name, speeds[0], speeds[1])
+        )
+
+    async def dec_speed(self, decrement=1):
+        """Decrease fan speed by decrement value, default is 1."""
+        await self.set_speed(await self.get_speed() - decrement)
+
+    async def inc_speed(self, increment=1):
+        """Increase fan speed by increment value, default is 1."""
+        await self.set_speed(await self.get_speed() + increment)
+
+    async def get_learnmode(self):
+        """Return the fan's learn mode setting."""
+        mode = (await self._query("<%s;LEARN;STATE;GET>" % self.name)).upper()
+        return "ON" if mode == "LEARN" else mode
+
+    async def set_learnmode(self, mode):
+        """Set the fan's learn mode setting, valid values are OFF and ON."""
+        mode = mode.upper()
+        if mode == "ON":
+            mode = "LEARN"
+        elif mode != "OFF":
+            LOGGER.error("%s is an invalid learn mode" % mode)
+        await self._send_command("<%s;LEARN;STATE;SET;%s>" % (self.name, mode))
+
+    async def get_learnmode_zerotemp(self):
+        """Return the temperature in fahrenheit the fan will auto shutoff."""
+        return to_fahrenheit(
+            await self._query("<%s;LEARN;ZEROTEMP;GET>" % self.name)
+        )
+
+    async def set_learnmode_zerotemp(self, temp):
+        """Set the temperature in fahrenheit the fan will auto shutoff, 50-90."""
+        temp = from_fahrenheit(clamp(temp, 50, 90))
+        await self._send_command("<%s;LEARN;ZEROTEMP;SET;%s>" % (self.name, temp))
+
+    async def get_learnmode_minspeed(self):
+        """Return the fan's minimum speed setting in learning mode."""
+        return await self._query("<%s;LEARN;MINSPEED;GET>" % self.name)
+
+    async def set_learnmode_minspeed(self, speed):
+        """Set the fan's minimum speed setting in learning mode, 0-7."""
+        speed = clamp(speed, 0, 7)
+        await self._send_command("<%s;LEARN;MINSPEED;SET;%s>" % (self.name, speed))
+
+    async def get_learnmode_maxspeed(self):
+        """Return the fan's maximum speed setting in learning mode."""
+        return await self._query("<%s;LEARN;MAXSPEED;GET>" % self.name)
+
+    async def set_learnmode_maxspeed(self, speed):
+        """Set the fan's maximum speed setting in learning mode, 0-7."""
+        speed = clamp(speed, 0, 7)
+        await self._send_command("<%s;LEARN;MAXSPEED;SET;%s>" % (self.name, speed))
+
+    async def get_smartsleep_mode(self):
+        """Return the fan's smart sleep mode setting."""
+        return await self._query("<%s;SLEEP;STATE;GET>" % self.name)
+
+    async def set_smartsleep_mode(self, mode):
+        """Set the fan's smart sleep mode setting, valid values are ON and OFF."""
+        mode = mode.upper()
+        if mode != "ON" and mode != "OFF":
+            LOGGER.error(
+                "%s is an invalid sleep mode. Valid values are ON and OFF" % mode
+            )
+        await self._send_command("<%s;SLEEP;STATE;%s>" % (self.name, mode))
+
+    async def get_smartsleep_idealtemp(self):
+        """Return the fan's smart sleep ideal temp setting."""
+        return to_fahrenheit(
+            await self._query("<%s;SMARTSLEEP;IDEALTEMP;GET>" % self.name)
+        )
+
+    async def set_smartsleep_idealtemp(self, temp):
+        """Set the fan's smart sleep ideal temp in fahrenheit, 50-90."""
+        temp = from_fahrenheit(clamp(temp, 50, 90))
+        await self._send_command(
+            "<%s;SMARTSLEEP;IDEALTEMP;SET;%s>" % (self.name, temp)
+        )
+
+    async def get_smartsleep_minspeed(self):
+        """Return the fan's smart sleep minimum speed setting."""
+        return await self._query("<%s;SMARTSLEEP;MINSPEED;GET>" % self.name)
+
+    async def set_smartsleep_minspeed(self, speed):
+        """Set the fan's smart sleep minimum speed setting, 0-7."""
+        speed = clamp(speed, 0, 7)
+        await self._send_command(
+            "<%s;SMARTSLEEP;MINSPEED;SET;%s>" % (self.name, speed)
+        )
+
+    async def get_smartsleep_maxspeed(self):
+        """Return the fan's smart sleep maximum speed setting."""
+        return await self._query("<%s;SMARTSLEEP;MAXSPEED;GET>" % self.name)
+
+    async def set_smartsleep_maxspeed(self, speed):
+        """Set the fan's smart sleep maximum speed setting, 0-7."""
+        speed = clamp(speed, 0, 7)
+        await self._send_command(
+            "<%s;SMARTSLEEP;MAXSPEED;SET;%s>" % (self.name, speed)
+        )
+
+    async def get_smartsleep_wakeup_brightness(self):
+        """Return light brightness at wakeup for sleep mode."""
+        return parse_wakeup_brightness(
+            await self._query("<%s;SLEEP;EVENT;OFF;GET>" % self.name)
+        )
+
+    async def set_smartsleep_wakeup_brightness(self, light):
+        """Set light brightness at wakeup for sleep mode, 0-16."""
+        light = clamp(light, 0, 16)
+        await self._send_command(
+            "<%s;SLEEP;EVENT;OFF;SET;LIGHT,LEVEL,%s>" % (self.name, light)
+        )
+
+    async def get_fan_direction(self):
+        """Return the direction of the fan."""
+        return await self._query("<%s;FAN;DIR;GET>" % self.name)
+
+    async def set_fan_direction(self, mode):
+        """Set the direction of the fan rotation, valid values are FWD and REV."""
+        mode = mode.upper()
+        if mode != "FWD" and mode != "REV":
+            LOGGER.error(
+                "%s is an invalid direction.  Valid values are FWD and REV" % mode
+            )
+        else:
+            await self._send_command("<%s;FAN;DIR;SET;%s>" % (self.name, mode))
+
+    async def get_fan_motionmode(self):
+        """Return the fan motion sensor mode."""
+        return await self._query("<%s;FAN;AUTO;GET>" % self.name)
+
+    async def set_fan_motionmode(self, mode):
+        """Set the fan motion sensor mode, valid values are ON and OFF."""
+        mode = _on_off(mode, "fan motion mode")
+        if mode:
+            await self._send_command("<%s;FAN;AUTO;SET;%s>" % (self.name, mode))
+
+    async def get_motionmode_mintimer(self):
+        """Return the minimum no motion auto shutoff timer in minutes."""
+        return to_minutes(
+            await self._query("<%s;SNSROCC;TIMEOUT;GET;MIN>" % self.name)
+        )
+
+    async def get_motionmode_maxtimer(self):
+        """Return the maximum no motion auto shutoff timer in minutes."""
+        return to_minutes(
+            await self._query("<%s;SNSROCC;TIMEOUT;GET;MAX>" % self.name)
+        )
+
+    async def get_motionmode_currenttimer(self):
+        """Return the current no motion auto shutoff timer in minutes."""
+        return to_minutes(
+            await self._query("<%s;SNSROCC;TIMEOUT;GET;CURR>" % self.name)
+        )
+
+    async def set_motionmode_currenttimer(self, timeout):
+        """Set the no motion auto shutoff timer in minutes."""
+        await self._send_command(
+            "<%s;SNSROCC;TIMEOUT;SET;%s>" % (self.name, int(int(timeout) * 60000))
+        )
+
+    async def get_motionmode_occupied_status(self):
+        """Return if the room is currently OCCUPIED or UNOCCUPIED."""
+        return await self._query("<%s;SNSROCC;STATUS;GET>" % self.name)
+
+    async def get_wintermode(self):
+        """Return the fan's winter mode setting."""
+        return await self._query("<%s;WINTERMODE;STATE;GET>" % self.name)
+
+    async def set_wintermode(self, mode):
+        """Set the fan's winter mode setting, valid values are OFF and ON."""
+        mode = _on_off(mode, "winter mode")
+        if mode:
+            await self._send_command("<%s;WINTERMODE;STATE;%s>" % (self.name, mode))
+
+    async def get_smartmode(self):
+        """Return the fan's smart mode setting."""
+        return await self._query("<%s;SMARTMODE;STATE;GET>" % self.name)
+
+    async def set_smartmode(self, mode):
+        """Set the fan's smart mode, valid values are OFF, COOLING, HEATING."""
+        mode = mode.upper()
+        if mode not in ("OFF", "COOLING", "HEATING"):
+            LOGGER.error("%s is an invalid smartmode" % mode)
+        await self._send_command("<%s;SMARTMODE;STATE;SET;%s>" % (self.name, mode))
+
+    async def get_whoosh(self):
+        """Return True if whoosh mode is on.
+
+        There is no single item request for whoosh status, this uses GETALL.
+        """
+        try:
+            return await self.get_attribute("FAN;WHOOSH;STATUS") == "ON"
+        except KeyError:
+            LOGGER.error("FAN;WHOOSH;STATUS wasn't found in dict")
+            raise OSError("Fan failed to return whoosh status")
+
+    async def set_whoosh(self, whoosh_on):
+        """Turn whoosh mode on or off."""
+        await self._send_command(
+            "<%s;FAN;WHOOSH;%s>" % (self.name, "ON" if whoosh_on else "OFF")
+        )
+
+    # The following are specific to haiku fans add-on light modules.
+    # Most of these apply to the standalone light units as well
+
+    async def get_brightness(self):
+        """Return light brightness."""
+        # see https://github.com/TomFaulkner/SenseMe/issues/38
+        for _ in range(2):
+            result = parse_level(
+                await self._query("<%s;LIGHT;LEVEL;GET;ACTUAL>" % self.name)
+            )
+            if result is not None:
+                return result
+        return 0
+
+    async def set_brightness(self, light):
+        """Set light brightness, valid values are 0 to 16."""
+        light = clamp(light, 0, 16)
+        await self._send_command("<%s;LIGHT;LEVEL;SET;%s>" % (self.name, light))
+
+    async def get_min_brightness(self):
+        """Return the add-on light's minimum brightness setting."""
+        return await self._query("<%s;LIGHT;LEVEL;GET;MIN>" % self.name)
+
+    async def set_min_brightness(self, light):
+        """Set the add-on light's minimum brightness setting, 0-16."""
+        light = clamp(light, 0, 16)
+        await self._send_command("<%s;LIGHT;LEVEL;MIN;%s>" % (self.name, light))
+
+    async def get_max_brightness(self):
+        """Return the add-on light's maximum brightness setting."""
+        return int(await self._query("<%s;LIGHT;LEVEL;GET;MAX>" % self.name))
+
+    async def set_max_brightness(self, light):
+        """Set the add-on light's maximum brightness setting, 0-16."""
+        light = clamp(light, 0, 16)
+        await self._send_command("<%s;LIGHT;LEVEL;MAX;%s>" % (self.name, light))
+
+    async def get_room_settings_brightness_limits(self):
+        """Return a tuple of the min and max light brightness for the room."""
+        raw = await self._queryraw("<%s;LIGHT;BOOKENDS;GET>" % self.name)
+        low, high = reply_values(raw, 2)
+        return int(low), int(high)
+
+    async def set_room_settings_brightness_limits(self, limits):
+        """Set the min and max light brightness for the room from (min, max)."""
+        if limits[0] >= limits[1]:
+            LOGGER.debug("minbrightness cannot exceed maxbrightness")
+        await self._send_command(
+            "<%s;LIGHT;BOOKENDS;SET;%s;%s>" % (self.name, limits[0], limits[1])
+        )
+
+    async def dec_brightness(self, decrement=1):
+        """Decrease brightness by decrement value, default is 1."""
+        await self.set_brightness(await self.get_brightness() - decrement)
+
+    async def inc_brightness(self, increment=1):
+        """Increase brightness by increment value, default is 1."""
+        await self.set_brightness(await self.get_brightness() + increment)
+
+    async def get_is_fan_light_installed(self):
+        """Return True if the optional light module is installed."""
+        mode = await self._query("<%s;DEVICE;LIGHT;GET>" % self.name)
+        return mode.lower() == "present"
+
+    async def get_light_motionmode(self):
+        """Return if the add-on light responds to the motion sensor."""
+        return await self._query("<%s;LIGHT;AUTO;GET>" % self.name)
+
+    async def set_light_motionmode(self, mode):
+        """Set if the add-on light responds to the motion sensor, OFF or ON."""
+        mode = _on_off(mode, "light motion mode")
+        if mode:
+            await self._send_command("<%s;LIGHT;AUTO;%s>" % (self.name, mode))
+
+    async def get_light_powered_on(self):
+        """Return True if the light is on, False if off."""
+        return await self._query("<%s;LIGHT;PWR;GET>" % self.name) == "ON"
+
+    async def set_light_powered_on(self, power_on=True):
+        """Turn the add-on light on or off."""
+        await self._send_command(
+            "<%s;LIGHT;PWR;%s>" % (self.name, "ON" if power_on else "OFF")
+        )
+
+    async def light_toggle(self):
+        """Toggle power state of light."""
+        await self.set_light_powered_on(not await self.get_light_powered_on())
+
+    async def get_many(self, properties):
+        """Read several properties concurrently.
+
+        :param properties: iterable of property names, i.e. "speed"
+        :return: dict of property name to value
+        """
+        properties = list(properties)
+        values = await asyncio.gather(
+            *(getattr(self, "get_" + prop)() for prop in properties)
+        )
+        return dict(zip(properties, values))
+
+    async def get_all(self):
+        """Get [almost] all parameters from the device as a flat dict.
+
+        Results are cached for cache_timeout seconds, concurrent callers
+        share a single request.
+        """
+        if self._get_all_lock is None:
+            # before Python 3.10 a lock is bound to the event loop current
+            # when it's made, which __init__ may run outside of
+            self._get_all_lock = asyncio.Lock()
+        async with self._get_all_lock:
+            age = time.monotonic() - self._all_cache_time
+            if self._all_cache is None or age > self.cache_timeout:
+                results = await self._get_all_request()
+                self._all_cache = dict(
+                    parse_attribute(reply_body(message)) for message in results
+                )
+                self._all_cache_time = time.monotonic()
+            return self._all_cache
+
+    async def get_attribute(self, attribute):
+        """Given a string in the format NW;PARAMS;ACTUAL return its value.
+
+        Raises KeyError if key doesn't exist.
+        """
+        if attribute == "SNSROCC;STATUS":  # doesn't get retrieved in get_all
+            return await self.get_motionmode_occupied_status()
+        return (await self.get_all())[attribute]
+
+    async def _open(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.PORT), self.timeout
+        )
+
+    async def _send_command(self, msg):
+        _, writer = await self._open()
+        try:
+            writer.write(msg.encode("utf-8"))
+            await writer.drain()
+        finally:
+            writer.close()
+        # cached values may no longer be correct
+        self._all_cache = None
+
+    async def _query(self, msg):
+        status = await self._queryraw(msg)
+        if status is None:
+            return None
+        return last_value(status)
+
+    async def _queryraw(self, msg):
+        """Send msg and return the reply for the attribute it asks for.
+
+        Other messages, such as changes the device pushes, are skipped.
+
+        :return: the reply, "" if the device closed the connection or None
+            if no reply came within timeout
+        """
+        attribute = response_path(msg)
+        reader, writer = await self._open()
+        try:
+            writer.write(msg.encode("utf-8"))
+            await writer.drain()
+            framer = MessageFramer()
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    messages = await self._read_messages(
+                        reader, framer, max(0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    LOGGER.error("Socket Timed Out")
+                    return None
+                if not messages:
+                    return ""
+                for message in messages:
+                    if match_reply(message, [attribute]):
+                        LOGGER.info("Status: " + message)
+                        return message
+                    LOGGER.debug("Skipping unrelated message %s" % message)
+        finally:
+            writer.close()
+
+    async def send_raw(self, msg):
+        """Send a raw command. Device name is not included.
+
+        :param msg: command to send
+        :return: list of responses as str
+        """
+        reader, writer = await self._open()
+        try:
+            writer.write(msg.encode("utf-8"))
+            await writer.drain()
+            framer = MessageFramer()
+            messages = []
+            timeout_occurred = False
+            while True:
+                try:
+                    received = await self._read_messages(reader, framer)
+                except asyncio.TimeoutError:
+                    LOGGER.info("Socket Timed Out")
+                    # most likely this means no more data, give it one more iter
+                    if timeout_occurred:
+                        break
+                    timeout_occurred = True
+                    continue
+                if not received:
+                    break
+                messages.extend(received)
+        finally:
+            writer.close()
+        return messages
+
+    async def _get_all_request(self):
+        """Send GETALL and read the dump, see SenseMe._read_burst."""
+        reader, writer = await self._open()
+        burst = BurstReader(self._getall_profile, self.timeout)
+        try:
+            writer.write(("<%s;GETALL>" % self.name).encode("utf-8"))
+            await writer.drain()
+            while True:
+                try:
+                    received = await self._read_messages(
+                        reader, burst.framer, burst.next_timeout()
+                    )
+                except asyncio.TimeoutError:
+                    if burst.timed_out():
+                        break
+                    LOGGER.info("Socket Timed Out")
+                    continue
+                if not received or burst.received(received):
+                    break
+        finally:
+            writer.close()
+        return burst.finish()
+
+    async def _read_messages(self, reader, framer, timeout=None):
+        """Read until framer has at least one complete message.
+
+        Raises asyncio.TimeoutError if nothing arrives within timeout.
+
+        :param timeout: seconds to wait for data, defaults to self.timeout
+        :return: list of messages, empty if the device closed the connection
+        """
+        if timeout is None:
+            timeout = self.timeout
+        while True:
+            data = await asyncio.wait_for(reader.read(4096), timeout)
+            if not data:
+                return []
+            messages = framer.feed(data)
+            if messages:
+                return messages
+
+
+def _on_off(mode, setting):
+    """Return mode upper cased if ON or OFF, otherwise log and return None."""
+    mode = mode.upper()
+    if mode != "OFF" and mode != "ON":
+        LOGGER.error("%s is an invalid %s.  Use ON or OFF" % (mode, setting))
+        return None
+    return mode
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_device):
+        self.on_device = on_device
+
+    def datagram_received(self, data, addr):
+        for details in parse_device_ids(data):
+            self.on_device(details, addr[0])
+
+
+async def discover(devices_to_find=6, time_to_wait=5):
+    """Discover SenseMe devices.
+
+    Returns as soon as devices_to_find devices have answered or after
+    time_to_wait seconds.
+
+    :return: List of discovered AsyncSenseMe devices.
+    """
+    loop = _get_running_loop()
+    devices = []
+    enough = asyncio.Event()
+
+    def on_device(details, ip):
+        name, mac, model, series = details
+        if any(device.mac == mac for device in devices):
+            return
+        LOGGER.info("Discovered %s at %s", name, ip)
+        devices.append(
+            AsyncSenseMe(ip=ip, name=name, model=model, series=series, mac=mac)
+        )
+        if len(devices) >= devices_to_find:
+            enough.set()
+
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(on_device),
+            local_addr=("0.0.0.0", PORT),
+            allow_broadcast=True,
+        )
+    except OSError:
+        raise OSError("Couldn't get port 31415")
+    try:
+        LOGGER.debug("Sending broadcast.")
+        transport.sendto("<ALL;DEVICE;ID;GET>".encode("utf-8"), ("<broadcast>", PORT))
+        try:
+            await asyncio.wait_for(enough.wait(), time_to_wait)
+        except asyncio.TimeoutError:
+            LOGGER.debug("time_to_wait exceeded")
+    finally:
+        transport.close()
+    return devices
@@ -1,4 +1,4 @@
-"""Known attributes for reference purposes only."""
+"""Known attributes, how long their values may be cached and how they interact."""
 KNOWN_ATTRIBUTES = sorted(
     """ERRORLOG;ENTRIES;MAX
 GROUP;LIST
@@ -56,3 +56,158 @@ SCHEDULE;EVENT;LIST""".split(
         "\n"
     )
 )
+
+# Cache policies, how long a value read from the device may be reused.
+# IMMUTABLE values never change, SLOW ones are settings that rarely change,
+# VOLATILE ones are state that can change any time and are only reused from
+# a GETALL snapshot, NEVER_CACHE ones are always read from the device.
+IMMUTABLE = "immutable"
+SLOW = "slow"
+VOLATILE = "volatile"
+NEVER_CACHE = "never_cache"
+
+# seconds a value may be reused for, None for forever
+POLICY_TTLS = {IMMUTABLE: None, SLOW: 600, VOLATILE: 0, NEVER_CACHE: 0}
+
+ATTRIBUTE_POLICIES = {
+    "DEVICE;BEEPER": SLOW,
+    "DEVICE;INDICATORS": SLOW,
+    "DEVICE;LIGHT": IMMUTABLE,
+    "DEVICE;SERVER": SLOW,
+    "ERRORLOG;ENTRIES;MAX": IMMUTABLE,
+    "ERRORLOG;ENTRIES;NUM": VOLATILE,
+    "FAN;AUTO": VOLATILE,
+    "FAN;BOOKENDS": SLOW,
+    "FAN;DIR": SLOW,
+    "FAN;PWR": VOLATILE,
+    "FAN;SPD;ACTUAL": VOLATILE,
+    "FAN;SPD;MAX": IMMUTABLE,
+    "FAN;SPD;MIN": IMMUTABLE,
+    "FAN;TIMER;CURR": VOLATILE,
+    "FAN;TIMER;MAX": IMMUTABLE,
+    "FAN;TIMER;MIN": IMMUTABLE,
+    "FAN;WHOOSH;STATUS": VOLATILE,
+    "FW;NAME": SLOW,
+    "GROUP;LIST": SLOW,
+    "GROUP;ROOM;TYPE": SLOW,
+    "LEARN;MAXSPEED": SLOW,
+    "LEARN;MINSPEED": SLOW,
+    "LEARN;STATE": VOLATILE,
+    "LEARN;ZEROTEMP": SLOW,
+    "LIGHT;AUTO": VOLATILE,
+    "LIGHT;BOOKENDS": SLOW,
+    "LIGHT;LEVEL;ACTUAL": VOLATILE,
+    "LIGHT;LEVEL;MAX": SLOW,
+    "LIGHT;LEVEL;MIN": SLOW,
+    "LIGHT;PWR": VOLATILE,
+    "NAME;VALUE": SLOW,
+    "NW;AP;STATUS": SLOW,
+    "NW;DHCP": SLOW,
+    "NW;PARAMS;ACTUAL": SLOW,
+    "NW;SSID": SLOW,
+    "NW;TOKEN": IMMUTABLE,
+    "SCHEDULE;CAP": IMMUTABLE,
+    "SCHEDULE;EVENT;LIST": SLOW,
+    "SLEEP;EVENT": SLOW,
+    "SLEEP;EVENT;OFF": SLOW,
+    "SLEEP;STATE": VOLATILE,
+    "SMARTMODE;ACTUAL": VOLATILE,
+    "SMARTMODE;STATE": VOLATILE,
+    "SMARTSLEEP;IDEALTEMP": SLOW,
+    "SMARTSLEEP;MAXSPEED": SLOW,
+    "SMARTSLEEP;MINSPEED": SLOW,
+    "SNSROCC;STATUS": NEVER_CACHE,
+    "SNSROCC;TIMEOUT;CURR": SLOW,
+    "SNSROCC;TIMEOUT;MAX": IMMUTABLE,
+    "SNSROCC;TIMEOUT;MIN": IMMUTABLE,
+    "TIME;VALUE": NEVER_CACHE,
+    "WINTERMODE;HEIGHT": SLOW,
+    "WINTERMODE;STATE": VOLATILE,
+}
+
+
+def attribute_policy(attribute):
+    """Return the cache policy of an attribute path.
+
+    Firmware versions are reported as FW;<firmware name>, anything else not
+    listed in ATTRIBUTE_POLICIES is treated as VOLATILE.
+    """
+    policy = ATTRIBUTE_POLICIES.get(attribute)
+    if policy is not None:
+        return policy
+    if attribute.startswith("FW;"):
+        return SLOW
+    return VOLATILE
+
+
+def _is_zero(value):
+    return value in ("0", "OFF")
+
+
+def _is_nonzero(value):
+    return not _is_zero(value)
+
+
+def _same(value):
+    return value
+
+
+# Attributes a write changes besides the one written, used to update the
+# cache right after a command rather than waiting for the device to be read.
+# Each rule is (attribute, condition, implied values). condition is None for
+# any value, a value to compare with, or a function of the written value.
+# Implied values are values, or functions of the written value, and are
+# applied in turn, so FAN;SPD;ACTUAL 0 turns FAN;PWR OFF and with it whoosh.
+# An implied value of None means the write leaves the attribute unknown.
+# Extend the list to teach the cache about other interactions.
+DEPENDENCIES = [
+    ("FAN;PWR", "OFF", {"FAN;SPD;ACTUAL": "0", "FAN;WHOOSH;STATUS": "OFF"}),
+    # the fan comes back on at a speed of its own choosing
+    ("FAN;PWR", "ON", {"FAN;SPD;ACTUAL": None}),
+    ("FAN;SPD;ACTUAL", _is_zero, {"FAN;PWR": "OFF"}),
+    ("FAN;SPD;ACTUAL", _is_nonzero, {"FAN;PWR": "ON"}),
+    ("SMARTMODE;STATE", None, {"SMARTMODE;ACTUAL": _same}),
+    ("LIGHT;PWR", "OFF", {"LIGHT;LEVEL;ACTUAL": "0"}),
+    ("LIGHT;PWR", "ON", {"LIGHT;LEVEL;ACTUAL": None}),
+    ("LIGHT;LEVEL;ACTUAL", _is_zero, {"LIGHT;PWR": "OFF"}),
+    ("LIGHT;LEVEL;ACTUAL", _is_nonzero, {"LIGHT;PWR": "ON"}),
+]
+
+
+def implied_values(attribute, value, dependencies=None):
+    """Return the values writing value to attribute leaves in the cache.
+
+    Example:
+        implied_values("FAN;SPD;ACTUAL", "0")
+        {'FAN;SPD;ACTUAL': '0', 'FAN;PWR': 'OFF', 'FAN;WHOOSH;STATUS': 'OFF'}
+
+    :param attribute: attribute path written
+    :param value: value written, as the device reports it
+    :param dependencies: rules to apply, default DEPENDENCIES
+    :return: dict of attribute to value, attribute included, None for
+        attributes left unknown. An attribute already given a value keeps
+        it, the one written first of all.
+    """
+    if dependencies is None:
+        dependencies = DEPENDENCIES
+    values = {attribute: value}
+    pending = [(attribute, value)]
+    while pending:
+        written, written_value = pending.pop(0)
+        for source, condition, implied in dependencies:
+            if source != written:
+                continue
+            if callable(condition):
+                if not condition(written_value):
+                    continue
+            elif condition is not None and condition != written_value:
+                continue
+            for target, target_value in implied.items():
+                if target in values:
+                    continue
+                if callable(target_value):
+                    target_value = target_value(written_value)
+                values[target] = target_value
+                if target_value is not None:
+                    pending.append((target, target_value))
+    return values
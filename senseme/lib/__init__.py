@@ -1,4 +1,34 @@
+from .adaptive_interval import AdaptiveInterval
 from .background_monitor import BackgroundLoop
+from .burst_profile import BurstProfile, BurstReader
+from .coalescer import Coalescer
+from .command_queue import CommandQueue
+from .connection_pool import ConnectionPool
+from .identity_cache import IdentityCache
+from .interfaces import Interface
 from .mwt import MWT
+from .retry import Deadline, DeadlineExceeded, RetryPolicy
+from .scheduler import ScheduledJob, Scheduler
+from .snapshot import Snapshot
+from .ttl_cache import CachedMethod, TTLCache
 
-__all__ = ["MWT", "BackgroundLoop"]
+__all__ = [
+    "AdaptiveInterval",
+    "BackgroundLoop",
+    "BurstProfile",
+    "BurstReader",
+    "CachedMethod",
+    "Coalescer",
+    "CommandQueue",
+    "ConnectionPool",
+    "Deadline",
+    "DeadlineExceeded",
+    "IdentityCache",
+    "Interface",
+    "MWT",
+    "RetryPolicy",
+    "ScheduledJob",
+    "Scheduler",
+    "Snapshot",
+    "TTLCache",
+]
@@ -0,0 +1,47 @@
+"""Polling interval that follows how often things change.
+
+A device nobody touches doesn't need polling every few seconds, one being
+changed does. AdaptiveInterval drops to its minimum whenever a change is
+seen and grows by backoff for every poll that finds nothing new, up to its
+maximum.
+
+Example:
+    interval = AdaptiveInterval(minimum=5, maximum=300)
+    interval.record(changed=False)  # 7.5
+    interval.record(changed=True)  # 5
+"""
+import threading
+
+
+class AdaptiveInterval:
+    """Interval between minimum and maximum, short after changes."""
+
+    def __init__(self, minimum, maximum, backoff=1.5, initial=None):
+        """
+        :param minimum: seconds, used after a change
+        :param maximum: seconds, reached after enough polls without changes
+        :param backoff: factor the interval grows by per unchanged poll
+        :param initial: seconds to start at, default maximum
+        """
+        if minimum > maximum:
+            raise ValueError("minimum must not be more than maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.interval = self._bound(maximum if initial is None else initial)
+        self._lock = threading.Lock()
+
+    def _bound(self, interval):
+        return max(self.minimum, min(self.maximum, interval))
+
+    def record(self, changed):
+        """Adapt to a poll or local change, return the new interval.
+
+        :param changed: True if something changed since the last poll
+        """
+        with self._lock:
+            if changed:
+                self.interval = self.minimum
+            else:
+                self.interval = self._bound(self.interval * self.backoff)
+            return self.interval
@@ -0,0 +1,175 @@
+"""Learn when a burst of replies, such as a GETALL dump, has finished.
+
+Devices don't mark the end of a GETALL, the only sign is that replies stop
+coming. Rather than waiting out long socket timeouts every time the profile
+remembers, from earlier bursts, the longest pause seen between replies and
+the keys the device always sends, so a burst can be called finished as soon
+as every expected key has arrived or the line has been quiet for a few
+times the usual pause.
+
+Until a first burst has been recorded nothing is known and readers should
+fall back to their plain timeout behavior. Every relearn_every bursts one is
+read until the device goes quiet so keys the device started sending since
+are picked up.
+
+BurstReader holds what is learned while reading one burst. It leaves the
+reading itself to the caller, so the blocking and asyncio clients decide the
+end of a burst the same way.
+"""
+import threading
+import time
+
+from ..protocol import MessageFramer, parse_attribute, reply_body
+
+
+class BurstProfile:
+    """Expected keys and inter-reply pause learned from completed bursts."""
+
+    def __init__(
+        self, multiplier=3, min_idle=0.25, max_idle=5, smoothing=0.3, relearn_every=20
+    ):
+        """
+        :param multiplier: idle timeout as a multiple of the learned pause
+        :param min_idle: lower bound of the idle timeout in seconds
+        :param max_idle: upper bound of the idle timeout in seconds
+        :param smoothing: weight given to a newer, shorter pause. Longer
+            pauses are adopted immediately.
+        :param relearn_every: read every nth burst until quiet, ignoring the
+            expected keys
+        """
+        self.multiplier = multiplier
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.smoothing = smoothing
+        self.relearn_every = relearn_every
+        self.expected = None
+        self._bursts = 0
+        self.gap = None
+        self._lock = threading.Lock()
+
+    def idle_timeout(self):
+        """Return seconds of quiet after which a burst is over, or None."""
+        if self.gap is None:
+            return None
+        return max(self.min_idle, min(self.max_idle, self.gap * self.multiplier))
+
+    def should_drain(self):
+        """Return True if the next burst should be read until quiet.
+
+        Call once per burst.
+        """
+        with self._lock:
+            self._bursts += 1
+            return self.expected is None or self._bursts % self.relearn_every == 0
+
+    def is_complete(self, seen):
+        """Return True if every key the device reliably sends is in seen."""
+        expected = self.expected
+        return expected is not None and expected <= seen
+
+    def record(self, gaps, seen, drained, relearn=False):
+        """Learn from a finished burst.
+
+        :param gaps: pauses in seconds between replies of the burst
+        :param seen: set of keys received
+        :param drained: True if the burst was read until the device went
+            quiet, False if it was cut short because it looked complete.
+            Only drained bursts can show a key is no longer sent.
+        :param relearn: True if the burst was drained because should_drain()
+            asked for it, its keys replace the expected keys rather than
+            narrowing them
+        """
+        with self._lock:
+            if gaps:
+                gap = max(gaps)
+                if self.gap is None or gap > self.gap:
+                    self.gap = gap
+                else:
+                    self.gap = self.smoothing * gap + (1 - self.smoothing) * self.gap
+            if drained and seen:
+                if self.expected is None or relearn:
+                    self.expected = frozenset(seen)
+                else:
+                    self.expected = self.expected & frozenset(seen)
+
+    def reset(self):
+        """Forget everything learned."""
+        with self._lock:
+            self.expected = None
+            self.gap = None
+            self._bursts = 0
+
+
+class BurstReader:
+    """Decide when a burst of replies is over, while the caller reads it.
+
+    Example:
+        reader = BurstReader(profile, timeout=5)
+        while True:
+            try:
+                received = read(reader.framer, reader.next_timeout())
+            except socket.timeout:
+                if reader.timed_out():
+                    break
+                continue
+            if not received or reader.received(received):
+                break
+        messages = reader.finish()
+    """
+
+    def __init__(self, profile, timeout):
+        """
+        :param profile: BurstProfile for this kind of request, updated by
+            finish()
+        :param timeout: plain timeout in seconds, used until the profile
+            knows the pause between replies
+        """
+        self.profile = profile
+        self.timeout = timeout
+        self.framer = MessageFramer()
+        self.messages = []
+        self.drain = profile.should_drain()
+        self._relearn = self.drain and profile.expected is not None
+        self._seen = set()
+        self._gaps = []
+        self._last = None
+        self._timeout_occurred = False
+        self._use_idle = False
+        self._drained = True
+
+    def next_timeout(self):
+        """Return seconds to wait for the next reply."""
+        idle = self.profile.idle_timeout() if self.messages else None
+        self._use_idle = idle is not None and not self._timeout_occurred
+        return idle if self._use_idle else self.timeout
+
+    def timed_out(self):
+        """Note a wait timed out, return True if the burst is over.
+
+        Without anything learned yet a burst ends at the second timeout. If
+        the line goes quiet with expected keys still missing one more full
+        timeout is allowed.
+        """
+        if self._timeout_occurred or (self._use_idle and self.drain):
+            return True
+        self._timeout_occurred = True
+        return False
+
+    def received(self, messages):
+        """Add messages read together, return True if the burst is complete."""
+        now = time.monotonic()
+        if self._last is not None:
+            self._gaps.append(now - self._last)
+        self._last = now
+        for message in messages:
+            self._seen.add(parse_attribute(reply_body(message))[0])
+            self.messages.append(message)
+        if not self.drain and self.profile.is_complete(self._seen):
+            self._drained = False
+            return True
+        return False
+
+    def finish(self):
+        """Teach the profile about the burst and return its messages."""
+        self.profile.record(self._gaps, self._seen, self._drained, self._relearn)
+        return self.messages
@@ -0,0 +1,102 @@
+"""Collapse rapid writes to the same setting into one.
+
+A slider dragged across its range sets a value many times a second, more
+than a device takes commands, so it falls seconds behind. Coalescer sends
+the first write to a key straight away and, for window seconds after, only
+remembers the latest, sending it when the window ends. Held writes are
+sent together, so a key's may go a little early, but no key is written more
+than twice per window, whatever the rate writes come in at.
+
+Writes are sent in the order they were made: a write sent straight away
+first sends any still held for other keys, so a held speed change can't
+land after a later power off.
+
+Example:
+    coalescer = Coalescer(0.25, send)
+    for level in range(16):
+        coalescer.submit("LIGHT;LEVEL", level)  # sends 0, then 15
+"""
+import collections
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """Sends the first write to a key and the latest one per window."""
+
+    def __init__(self, window, send):
+        """
+        :param window: seconds after a write to a key during which further
+            writes to it are held, only the latest being sent at the end
+        :param send: callable sending a write, called with what was
+            submitted. Writes sent at the end of a window are sent from a
+            timer thread, their errors are logged.
+        """
+        self.window = window
+        self._send = send
+        self._pending = collections.OrderedDict()
+        self._last_sent = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        # held while sending, keeps writes in order across threads
+        self._send_lock = threading.Lock()
+
+    def submit(self, key, write):
+        """Send write now, or hold it if key was written to within window."""
+        with self._send_lock:
+            with self._lock:
+                now = time.monotonic()
+                last = self._last_sent.get(key)
+                if key in self._pending or (
+                    last is not None and now - last < self.window
+                ):
+                    self._pending.pop(key, None)
+                    self._pending[key] = write
+                    self._start_timer(last + self.window - now)
+                    return
+                batch = self._take_pending(now)
+                batch.append(write)
+                self._last_sent[key] = now
+            for held in batch:
+                self._send(held)
+
+    def _take_pending(self, now):
+        # called holding _lock
+        batch = list(self._pending.values())
+        for key in self._pending:
+            self._last_sent[key] = now
+        self._pending.clear()
+        return batch
+
+    def _start_timer(self, delay):
+        # called holding _lock
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(max(0, delay), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            LOGGER.exception("Error sending held writes")
+
+    def flush(self):
+        """Send held writes now."""
+        with self._send_lock:
+            with self._lock:
+                batch = self._take_pending(time.monotonic())
+            for held in batch:
+                self._send(held)
+
+    @property
+    def pending(self):
+        """Number of writes being held."""
+        with self._lock:
+            return len(self._pending)
@@ -0,0 +1,141 @@
+"""Serialize the commands sent to a device, interactive ones first.
+
+Without it the monitor's GETALL, a setter and a property read from another
+thread each open their own connection to the device at the same time, which
+firmware handles poorly. CommandQueue runs one command at a time, each on
+the thread that submitted it, in two lanes: INTERACTIVE commands always go
+before waiting BACKGROUND ones. A BACKGROUND command already running, such
+as a GETALL taking seconds, is asked to stop through preempt_requested()
+when an INTERACTIVE one is waiting, and is run again once it has gone.
+
+Each lane holds at most maxsize waiting commands. Submitting to a full lane
+blocks until there is room, or raises queue.Full, so callers faster than the
+device are slowed down rather than piling up.
+
+Example:
+    commands = CommandQueue(maxsize=8)
+    commands.run(send_speed)  # INTERACTIVE
+    commands.run(read_getall, priority=BACKGROUND)
+"""
+import collections
+import queue
+import threading
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class Preempted(Exception):
+    """Raised by a BACKGROUND command giving way, see preempt_requested()."""
+
+
+class _Ticket:
+    """A command waiting for, or having, its turn."""
+
+    __slots__ = ("priority", "thread", "preemptions")
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.thread = threading.get_ident()
+        self.preemptions = 0
+
+
+class CommandQueue:
+    """Runs commands one at a time, INTERACTIVE before BACKGROUND."""
+
+    def __init__(self, maxsize=8, max_preemptions=3):
+        """
+        :param maxsize: commands that may wait in each lane, 0 for no limit
+        :param max_preemptions: times a BACKGROUND command may be preempted,
+            after which it runs to the end, so it isn't starved
+        """
+        self.maxsize = maxsize
+        self.max_preemptions = max_preemptions
+        self._lanes = (collections.deque(), collections.deque())
+        self._running = None
+        self._condition = threading.Condition()
+
+    def run(self, command, priority=INTERACTIVE, block=True, timeout=None):
+        """Call command() once the commands before it are done.
+
+        A command run from within a command, on the same thread, is called
+        right away.
+
+        :param command: callable, called on this thread
+        :param priority: INTERACTIVE or BACKGROUND
+        :param block: wait for room in a full lane, else raise queue.Full
+        :param timeout: most seconds to wait for room and then for its turn,
+            then raise queue.Full
+        :return: whatever command returns
+        """
+        running = self._running
+        if running is not None and running.thread == threading.get_ident():
+            return command()
+        ticket = _Ticket(priority)
+        lane = self._lanes[priority]
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            if self.maxsize:
+                if not block and len(lane) >= self.maxsize:
+                    raise queue.Full
+                if not self._condition.wait_for(
+                    lambda: len(lane) < self.maxsize, timeout
+                ):
+                    raise queue.Full
+            lane.append(ticket)
+        while True:
+            self._take_turn(ticket, end)
+            # once started, a preempted command waits as long as it takes
+            end = None
+            try:
+                return command()
+            except Preempted:
+                ticket.preemptions += 1
+                with self._condition:
+                    # first in its lane again
+                    lane.appendleft(ticket)
+            finally:
+                with self._condition:
+                    self._running = None
+                    self._condition.notify_all()
+
+    def _take_turn(self, ticket, end=None):
+        lane = self._lanes[ticket.priority]
+        with self._condition:
+            timeout = None if end is None else max(0, end - time.monotonic())
+            if not self._condition.wait_for(lambda: self._is_next(ticket), timeout):
+                lane.remove(ticket)
+                self._condition.notify_all()
+                raise queue.Full
+            lane.popleft()
+            self._running = ticket
+            # a lane with room again
+            self._condition.notify_all()
+
+    def _is_next(self, ticket):
+        # called holding _condition
+        if self._running is not None:
+            return False
+        for lane in self._lanes:
+            if lane:
+                return lane[0] is ticket
+        return False
+
+    def preempt_requested(self):
+        """Return True if the running command should raise Preempted.
+
+        Only BACKGROUND commands that haven't been preempted max_preemptions
+        times yet are asked to, and only while an INTERACTIVE one waits.
+        """
+        running = self._running
+        return (
+            running is not None
+            and running.priority == BACKGROUND
+            and running.preemptions < self.max_preemptions
+            and bool(self._lanes[INTERACTIVE])
+        )
+
+    def __len__(self):
+        """Number of waiting commands."""
+        return sum(len(lane) for lane in self._lanes)
@@ -0,0 +1,201 @@
+"""Connection pool keeping a warm TCP connection per SenseMe device.
+
+Every command otherwise pays for a TCP handshake. The pool keeps one socket
+per device address, hands it to one caller at a time, reconnects when the
+device has dropped it and closes sockets that have been idle too long, on
+the shared scheduler so idle sockets are closed even if the pool isn't used
+again.
+
+Example:
+    pool = ConnectionPool(idle_timeout=30)
+    fan = SenseMe(ip="192.168.1.50", name="Living Room Fan",
+                  connection_pool=pool)
+"""
+import functools
+import logging
+import select
+import socket
+import threading
+import time
+import weakref
+
+from ..protocol import MessageFramer
+from .scheduler import default_scheduler
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """A single device socket and the lock serializing its use."""
+
+    def __init__(self, address, timeout):
+        self.address = address
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock = None
+        self.last_used = 0.0
+
+    def close(self):
+        """Close the socket, if open."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def is_alive(self, on_unread=None):
+        """Return False if the device closed the socket.
+
+        Anything left unread on the socket (late replies or status messages
+        the device sent on its own) is read off so it isn't mistaken for the
+        answer to the next request. Complete messages are passed to
+        on_unread, if given, the rest is discarded.
+        """
+        framer = MessageFramer()
+        try:
+            while True:
+                readable, _, _ = select.select([self.sock], [], [], 0)
+                if not readable:
+                    return True
+                data = self.sock.recv(4096)
+                if not data:
+                    return False
+                for message in framer.feed(data):
+                    if on_unread is None:
+                        LOGGER.debug("Discarding unread message: %s", message)
+                    else:
+                        on_unread(message)
+        except (OSError, ValueError):
+            return False
+
+    def checkout(self, idle_timeout, timeout=None, on_unread=None):
+        """Return a connected socket, reconnecting if needed.
+
+        :param timeout: socket timeout for this use, default the pool's
+        :param on_unread: called with each message left unread on the socket
+        :return: tuple of (socket, True if the socket was reused)
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if self.sock is not None:
+            idle = time.monotonic() - self.last_used
+            if idle > idle_timeout:
+                LOGGER.debug("Connection to %s idle for %.1fs", self.address, idle)
+                self.close()
+            elif not self.is_alive(on_unread):
+                LOGGER.debug("Connection to %s was dropped", self.address)
+                self.close()
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout)
+            return self.sock, False
+        self.sock.settimeout(timeout)
+        return self.sock, True
+
+
+class ConnectionPool:
+    """Keep one persistent connection per device address.
+
+    A pool may be shared by any number of SenseMe objects. Use of a given
+    device's connection is serialized, different devices are independent.
+    """
+
+    def __init__(self, idle_timeout=30, timeout=5, scheduler=None):
+        """
+        :param idle_timeout: seconds a connection may sit unused before it is
+            closed rather than reused
+        :param timeout: socket timeout in seconds for connect, send and recv
+        :param scheduler: the lib.Scheduler closing idle connections, by
+            default one shared by all pools and devices
+        """
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._scheduler = scheduler
+        self._evict_job = None
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _get(self, address):
+        with self._lock:
+            conn = self._connections.get(address)
+            if conn is None:
+                conn = self._connections[address] = _PooledConnection(
+                    address, self.timeout
+                )
+                if self._evict_job is None:
+                    self._schedule_eviction()
+            return conn
+
+    def _schedule_eviction(self):
+        # called holding _lock, the job holds no reference keeping the pool
+        scheduler = self._scheduler or default_scheduler()
+        self._evict_job = scheduler.schedule(
+            functools.partial(_evict_idle, weakref.ref(self)), self.idle_timeout
+        )
+        weakref.finalize(self, self._evict_job.cancel)
+
+    def run(self, ip, port, handler, timeout=None, on_unread=None):
+        """Call handler(sock) with the pooled socket for ip:port.
+
+        If a reused connection turns out to have been reset by the device the
+        handler is retried once on a fresh connection. Any other error closes
+        the connection and is raised.
+
+        :param handler: callable taking a connected socket
+        :param timeout: socket timeout for this call, default the pool's
+        :param on_unread: called with each message the device sent on the
+            connection since its last use, rather than discarding them
+        :return: whatever handler returns
+        """
+        conn = self._get((ip, port))
+        with conn.lock:
+            for attempt in range(2):
+                sock, reused = conn.checkout(self.idle_timeout, timeout, on_unread)
+                try:
+                    result = handler(sock)
+                except ConnectionError:
+                    conn.close()
+                    if reused and attempt == 0:
+                        LOGGER.debug("Connection to %s reset, reconnecting", ip)
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                conn.last_used = time.monotonic()
+                break
+        return result
+
+    def evict_idle(self):
+        """Close connections that have been idle longer than idle_timeout."""
+        now = time.monotonic()
+        with self._lock:
+            connections = list(self._connections.values())
+        for conn in connections:
+            if conn.sock is None or now - conn.last_used <= self.idle_timeout:
+                continue
+            # connections in use are not idle, skip rather than wait
+            if conn.lock.acquire(blocking=False):
+                try:
+                    conn.close()
+                finally:
+                    conn.lock.release()
+
+    def close(self):
+        """Close all pooled connections."""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            if self._evict_job is not None:
+                self._evict_job.cancel()
+                self._evict_job = None
+        for conn in connections:
+            with conn.lock:
+                conn.close()
+
+
+def _evict_idle(pool_ref):
+    """Evict the idle connections of a pool, unless it's gone."""
+    pool = pool_ref()
+    if pool is not None:
+        pool.evict_idle()
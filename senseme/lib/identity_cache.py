@@ -0,0 +1,129 @@
+"""Device identities saved to disk between runs.
+
+Discovery costs seconds of listening for broadcast replies. Fleets rarely
+change, so remembering each device's name, MAC, model, series, last IP and
+firmware lets a restarted process go straight to a quick check of the
+remembered address instead.
+
+Example:
+    cache = IdentityCache()  # ~/.cache/senseme/devices.json
+    fan = SenseMe(name="Living Room Fan", identity_cache=cache)
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+def default_path():
+    """Return the default cache file, under $XDG_CACHE_HOME or ~/.cache."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "senseme", "devices.json")
+
+
+def resolve_identity_cache(identity_cache):
+    """Return the IdentityCache an identity_cache argument asks for, or None.
+
+    :param identity_cache: an IdentityCache, True for one at the default
+        path, or None or False for none
+    """
+    if identity_cache is True:
+        return IdentityCache()
+    return identity_cache or None
+
+
+class IdentityCache:
+    """Device identities keyed by MAC address, kept in a JSON file."""
+
+    def __init__(self, path=None):
+        """
+        :param path: file to keep identities in, see default_path()
+        """
+        self.path = path or default_path()
+        self._lock = threading.Lock()
+        self._devices = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                devices = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            LOGGER.warning("Ignoring unreadable identity cache %s", self.path)
+            return {}
+        if not isinstance(devices, dict):
+            return {}
+        return devices
+
+    def save(self):
+        """Write identities to disk, replacing the file atomically."""
+        with self._lock:
+            data = json.dumps(self._devices, indent=2, sort_keys=True)
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError:
+            LOGGER.exception("Couldn't write identity cache %s", self.path)
+
+    def devices(self):
+        """Return a list of all remembered identities, as dicts."""
+        with self._lock:
+            return [dict(device) for device in self._devices.values()]
+
+    def find(self, name=None, ip=None, mac=None):
+        """Return the identity matching all given fields, or None.
+
+        If no field is given, returns the only identity if exactly one is
+        remembered.
+        """
+        with self._lock:
+            matches = [
+                device
+                for device in self._devices.values()
+                if (not name or device.get("name") == name)
+                and (not ip or device.get("ip") == ip)
+                and (not mac or device.get("mac") == mac)
+            ]
+        if len(matches) != 1 and not (name or ip or mac):
+            return None
+        return dict(matches[0]) if matches else None
+
+    def store(self, name, mac, model="", series="", ip="", firmware=None):
+        """Remember or update an identity and save to disk."""
+        if not mac:
+            return
+        with self._lock:
+            device = self._devices.setdefault(mac, {})
+            device.update(
+                name=name, mac=mac, model=model, series=series, ip=ip, seen=time.time()
+            )
+            if firmware is not None:
+                device["firmware"] = firmware
+        self.save()
+
+    def update(self, mac, **fields):
+        """Update fields of a remembered identity and save to disk."""
+        with self._lock:
+            device = self._devices.get(mac)
+            if device is None:
+                return
+            device.update(fields)
+        self.save()
+
+    def remove(self, mac):
+        """Forget an identity and save to disk."""
+        with self._lock:
+            removed = self._devices.pop(mac, None)
+        if removed is not None:
+            self.save()
@@ -0,0 +1,125 @@
+"""Local network interfaces to send discovery broadcasts on.
+
+A broadcast to <broadcast> leaves through one interface only, so on hosts
+with several networks discovery sends to the directed broadcast address of
+each interface instead.
+
+Interfaces are found with Linux ioctls. Elsewhere local_interfaces()
+returns an empty list, and interfaces can still be given explicitly as
+address/prefix strings.
+
+Example:
+    resolve_interfaces(["eth1", "10.0.8.2/22"])
+    [Interface(name='eth1', address=IPv4Address('192.168.1.2'), ...),
+     Interface(name='10.0.8.2/22', address=IPv4Address('10.0.8.2'), ...)]
+"""
+import ipaddress
+import logging
+import socket
+import struct
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+SIOCGIFFLAGS = 0x8913
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891B
+IFF_UP = 0x1
+IFF_BROADCAST = 0x2
+IFF_LOOPBACK = 0x8
+
+
+class Interface(namedtuple("Interface", "name address network")):
+    """A local IPv4 interface, with its address and network."""
+
+    @property
+    def broadcast(self):
+        """Directed broadcast address of the interface's network, as str."""
+        return str(self.network.broadcast_address)
+
+    @classmethod
+    def from_string(cls, spec, name=None):
+        """Make an Interface from an address/prefix string."""
+        interface = ipaddress.ip_interface(spec)
+        return cls(name or spec, interface.ip, interface.network)
+
+
+def _ioctl(sock, request, name):
+    ifreq = struct.pack("256s", name.encode("utf-8")[:15])
+    return fcntl.ioctl(sock.fileno(), request, ifreq)
+
+
+def local_interfaces():
+    """Return the local interfaces that are up and can broadcast.
+
+    :return: list of Interface, empty if they can't be listed on this
+        platform
+    """
+    if fcntl is None or not hasattr(socket, "if_nameindex"):
+        return []
+    interfaces = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _, name in socket.if_nameindex():
+            try:
+                flags = struct.unpack("H", _ioctl(sock, SIOCGIFFLAGS, name)[16:18])[0]
+                if not flags & IFF_UP or not flags & IFF_BROADCAST:
+                    continue
+                if flags & IFF_LOOPBACK:
+                    continue
+                address = socket.inet_ntoa(_ioctl(sock, SIOCGIFADDR, name)[20:24])
+                netmask = socket.inet_ntoa(_ioctl(sock, SIOCGIFNETMASK, name)[20:24])
+            except OSError:
+                # no IPv4 address
+                continue
+            interfaces.append(
+                Interface.from_string("%s/%s" % (address, netmask), name=name)
+            )
+    except OSError:
+        LOGGER.exception("Couldn't list network interfaces")
+    finally:
+        sock.close()
+    return interfaces
+
+
+def resolve_interfaces(interfaces=None):
+    """Turn interface names and address/prefix strings into Interfaces.
+
+    :param interfaces: list of interface names, such as "eth0",
+        address/prefix strings, such as "192.168.1.2/24", or Interfaces.
+        None for all local interfaces.
+    :return: list of Interface
+    :raises ValueError: if a name isn't a local interface
+    """
+    if interfaces is None:
+        return local_interfaces()
+    if isinstance(interfaces, (str, Interface)):
+        interfaces = [interfaces]
+    local = None
+    resolved = []
+    for interface in interfaces:
+        if isinstance(interface, Interface):
+            resolved.append(interface)
+        elif "/" in interface:
+            resolved.append(Interface.from_string(interface))
+        else:
+            if local is None:
+                local = {i.name: i for i in local_interfaces()}
+            if interface not in local:
+                raise ValueError("Unknown or unusable interface %s" % interface)
+            resolved.append(local[interface])
+    return resolved
+
+
+def interface_of(ip, interfaces):
+    """Return the Interface whose network holds ip, or None."""
+    address = ipaddress.ip_address(ip)
+    for interface in interfaces:
+        if address in interface.network:
+            return interface
+    return None
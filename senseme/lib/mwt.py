@@ -1,12 +1,18 @@
-import logging
-import time
+"""Deprecated memoize decorator, kept for code written against it.
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+MWT now stores its results in a TTLCache, so concurrent calls with the
+same arguments share one call and old results are evicted past maxsize.
+Use CachedMethod for methods, or a TTLCache directly, instead.
+"""
+import functools
+import warnings
+
+from .ttl_cache import TTLCache
 
 
 class MWT(object):
-    """Memoize With Timeout
-    
+    """Memoize With Timeout, deprecated, see CachedMethod.
+
     Example:
         @MWT(timeout=30)
         def do_slow_thing():
@@ -17,39 +23,30 @@ class MWT(object):
         # was really slow the first time, instant on the remaining
     """
 
-    # https://code.activestate.com/recipes/325905-memoize-decorator-with-timeout/
-    _caches = {}
-    _timeouts = {}
-
-    def __init__(self, timeout=2):
+    def __init__(self, timeout=2, maxsize=128):
+        """
+        :param timeout: seconds a result is reused for
+        :param maxsize: most results kept, least recently used go first
+        """
+        warnings.warn(
+            "MWT is deprecated, use CachedMethod or TTLCache",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         self.timeout = timeout
+        self.cache = TTLCache(timeout, maxsize)
 
     def collect(self):
         """Clear cache of results which have timed out"""
-        for func in self._caches:
-            cache = {}
-            for key in self._caches[func]:
-                if (time.time() - self._caches[func][key][1]) < self._timeouts[func]:
-                    cache[key] = self._caches[func][key]
-            self._caches[func] = cache
+        self.cache.collect()
 
     def __call__(self, f):
-        self.cache = self._caches[f] = {}
-        self._timeouts[f] = self.timeout
+        cache = self.cache
 
+        @functools.wraps(f)
         def func(*args, **kwargs):
-            kw = sorted(kwargs.items())
-            key = (args, tuple(kw))
-            try:
-                v = self.cache[key]
-                logging.debug("Pulled from cache")
-                if (time.time() - v[1]) > self.timeout:
-                    raise KeyError
-            except KeyError:
-                logging.debug("Ran function")
-                v = self.cache[key] = f(*args, **kwargs), time.time()
-            return v[0]
-
-        func.func_name = f.__name__
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(key, lambda: f(*args, **kwargs))
 
+        func.cache = cache
         return func
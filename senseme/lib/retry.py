@@ -0,0 +1,109 @@
+"""Retry failed transport calls, all within an overall deadline.
+
+RetryPolicy says how often a call is tried and how long to wait in between:
+the wait grows by multiplier from backoff up to max_backoff, and is varied
+by a random part of jitter, so devices that failed together aren't retried
+together. Only errors of the classes in retry_on are retried.
+
+A Deadline is the time a call, with all its retries, must be done by. The
+timeouts of the connect, send and recv making up a call are shortened to
+what is left of it, so the call can't take longer whatever the device does.
+
+Example:
+    policy = RetryPolicy(attempts=3, backoff=0.2)
+    deadline = Deadline(2)
+    policy.run(lambda: request(timeout=deadline.timeout(5)), deadline)
+"""
+import logging
+import random
+import socket
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(socket.timeout):
+    """Raised when a call's deadline passed before it was done."""
+
+
+class Deadline:
+    """Point in time a call must be done by."""
+
+    def __init__(self, seconds):
+        """
+        :param seconds: time from now the call may take
+        """
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        """Return seconds left, negative once passed."""
+        return self.expires - time.monotonic()
+
+    def timeout(self, timeout=None):
+        """Return timeout shortened to the time left.
+
+        Raises DeadlineExceeded if no time is left.
+
+        :param timeout: seconds, None for as long as is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded")
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+
+class RetryPolicy:
+    """How often, and how far apart, a failed call is tried again."""
+
+    def __init__(
+        self,
+        attempts=2,
+        backoff=0.1,
+        multiplier=2,
+        max_backoff=2,
+        jitter=0.5,
+        retry_on=(ConnectionError, socket.timeout),
+    ):
+        """
+        :param attempts: times a call is tried, 1 for no retries
+        :param backoff: seconds before the first retry
+        :param multiplier: factor the wait grows by for each further retry
+        :param max_backoff: most seconds between tries
+        :param jitter: fraction of the wait that is random, 0 for none
+        :param retry_on: exception classes worth trying again for, others
+            are raised straight away. DeadlineExceeded never is.
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+
+    def delay(self, retry):
+        """Return seconds to wait before retry, counting from 0."""
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** retry)
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    def run(self, call, deadline=None):
+        """Return call(), trying it again for retryable errors.
+
+        :param call: callable taking no arguments
+        :param deadline: optional Deadline, no retry is made that couldn't
+            start before it, the last error is raised instead
+        """
+        for retry in range(self.attempts):
+            try:
+                return call()
+            except DeadlineExceeded:
+                raise
+            except self.retry_on as e:
+                if retry + 1 >= self.attempts:
+                    raise
+                delay = self.delay(retry)
+                if deadline is not None and deadline.remaining() <= delay:
+                    raise
+                LOGGER.debug("%s, retrying in %.2fs", e, delay)
+                time.sleep(delay)
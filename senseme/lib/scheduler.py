@@ -0,0 +1,208 @@
+"""Run many periodic jobs from a few threads.
+
+A BackgroundLoop is a thread per job, and loops started together stay in
+step, so many monitored devices mean many threads all polling at the same
+moment. Scheduler keeps every job in one heap ordered by due time. A single
+timer thread hands due jobs to a small pool of workers, so the thread count
+depends on workers, not on the number of jobs.
+
+Each job runs on a fixed grid, start + n * interval, so slow runs don't make
+it drift, and a job that is still running when due skips that turn. Every
+run is offset by a random part of jitter * interval so jobs started
+together spread out.
+
+Example:
+    scheduler = Scheduler(workers=4)
+    job = scheduler.schedule(do_the_thing, interval=45)
+    ...
+    job.cancel()
+    scheduler.stop()
+"""
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """A periodic job, returned by Scheduler.schedule()."""
+
+    def __init__(self, scheduler, action, interval, start):
+        self.scheduler = scheduler
+        self.action = action
+        self.interval = interval
+        self.cancelled = False
+        self.running = False
+        # grid the runs are planned on, jitter is added to each run on top
+        self.base = start
+        # when the next run is due, heap entries for other times are stale
+        self.due = None
+
+    def cancel(self):
+        """Stop running the job. A run in progress finishes."""
+        self.cancelled = True
+        self.scheduler._wake()
+
+    def set_interval(self, interval):
+        """Change the interval, moving the next run closer if it's shortened."""
+        self.scheduler._set_interval(self, interval)
+
+
+class Scheduler:
+    """Heap of periodic jobs run by a pool of worker threads."""
+
+    def __init__(self, workers=4, jitter=0.1):
+        """
+        :param workers: threads running jobs
+        :param jitter: fraction of each job's interval its runs are randomly
+            delayed by
+        """
+        self.workers = workers
+        self.jitter = jitter
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._queue = None
+        self._generation = 0
+        self._running = False
+
+    def _delay(self, interval):
+        return random.uniform(0, interval * self.jitter)
+
+    def schedule(self, action, interval, delay=None):
+        """Run action every interval seconds.
+
+        :param action: function to call
+        :param interval: seconds between runs
+        :param delay: seconds before the first run, default a random part of
+            jitter * interval
+        :return: ScheduledJob, cancel() it to stop
+        """
+        now = time.monotonic()
+        if delay is None:
+            delay = self._delay(interval)
+        job = ScheduledJob(self, action, interval, now)
+        with self._condition:
+            self._start()
+            self._push(job, now + delay)
+            self._condition.notify()
+        return job
+
+    def _push(self, job, due):
+        # called holding _condition
+        job.due = due
+        heapq.heappush(self._heap, (due, next(self._counter), job))
+
+    @staticmethod
+    def _is_stale(entry):
+        due, _, job = entry
+        return job.cancelled or job.due != due
+
+    def _set_interval(self, job, interval):
+        with self._condition:
+            job.interval = interval
+            base = time.monotonic() + interval
+            if job.cancelled or job.due is None or job.due <= base:
+                return
+            job.base = base
+            self._push(job, base + self._delay(interval))
+            self._condition.notify()
+
+    def _start(self):
+        # called holding _condition
+        if self._running:
+            return
+        self._running = True
+        # threads of an earlier start may still be finishing, they keep
+        # their own queue and generation
+        self._generation += 1
+        self._queue = queue.Queue()
+        threads = [
+            threading.Thread(target=self._timer, args=(self._generation,), daemon=True)
+        ]
+        threads.extend(
+            threading.Thread(target=self._worker, args=(self._queue,), daemon=True)
+            for _ in range(self.workers)
+        )
+        for thread in threads:
+            thread.start()
+
+    def _wake(self):
+        with self._condition:
+            self._condition.notify()
+
+    def _timer(self, generation):
+        """Hand jobs to the workers as they come due."""
+        with self._condition:
+            while self._running and self._generation == generation:
+                while self._heap and self._is_stale(self._heap[0]):
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due, _, job = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                if job.running:
+                    LOGGER.debug("Job still running, skipping a turn")
+                else:
+                    job.running = True
+                    self._queue.put(job)
+                self._reschedule(job)
+
+    def _reschedule(self, job):
+        # called holding _condition
+        now = time.monotonic()
+        job.base += job.interval
+        if job.base <= now:
+            # fell behind, skip the missed turns rather than catching up
+            missed = int((now - job.base) // job.interval) + 1
+            job.base += missed * job.interval
+        self._push(job, job.base + self._delay(job.interval))
+
+    @staticmethod
+    def _worker(jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                if not job.cancelled:
+                    job.action()
+            except Exception:
+                # catch all exceptions to keep the worker alive
+                LOGGER.exception("Scheduled job error")
+            finally:
+                job.running = False
+
+    def stop(self):
+        """Stop the threads, running jobs finish first. Jobs are forgotten."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._heap.clear()
+            self._condition.notify_all()
+            for _ in range(self.workers):
+                self._queue.put(None)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """Return the Scheduler shared by devices not given one."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Scheduler()
+        return _default
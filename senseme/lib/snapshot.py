@@ -0,0 +1,55 @@
+"""Read-only, versioned attribute values.
+
+State shared between the monitor, push listener and callers is held in a
+Snapshot that is never changed once made. Writers build a new Snapshot
+from the current one and swap the reference, so a reader holding one sees
+consistent values without taking a lock, never half of an update.
+
+Example:
+    snapshot = Snapshot({"FAN;PWR": "ON"})
+    snapshot = snapshot.updated({"FAN;PWR": "OFF", "FAN;SPD;ACTUAL": "0"})
+    snapshot.version  # 1
+"""
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class Snapshot(Mapping):
+    """Immutable mapping of attribute to value, with a version number."""
+
+    __slots__ = ("_values", "version")
+
+    def __init__(self, values=(), version=0):
+        """
+        :param values: mapping or pairs of attribute and value, copied
+        :param version: number that grows with every newer snapshot
+        """
+        self._values = MappingProxyType(dict(values))
+        self.version = version
+
+    def __getitem__(self, attribute):
+        return self._values[attribute]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "Snapshot(%r, version=%d)" % (dict(self._values), self.version)
+
+    def updated(self, values, removed=()):
+        """Return the next snapshot, with values changed or added.
+
+        :param removed: attributes left out of the next snapshot
+        """
+        merged = dict(self._values)
+        merged.update(values)
+        for attribute in removed:
+            merged.pop(attribute, None)
+        return Snapshot(merged, self.version + 1)
+
+    def replaced(self, values):
+        """Return the next snapshot, holding only values."""
+        return Snapshot(values, self.version + 1)
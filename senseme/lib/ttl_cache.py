@@ -0,0 +1,329 @@
+"""Thread-safe TTL cache with LRU eviction and single-flight loading.
+
+TTLCache holds values for ttl seconds, keeps at most maxsize of them,
+evicting the least recently used, and makes concurrent callers asking for
+the same missing key wait for one load rather than each running their own.
+
+With max_stale set the cache serves stale-while-revalidate: a value past
+its ttl but younger than max_stale is returned at once while a background
+thread loads a fresh one. Only values older than max_stale make callers
+wait.
+
+CachedMethod memoizes a method with a TTLCache per instance. Instances are
+held by weak reference, so caching doesn't keep them alive.
+
+Example:
+    class Fan:
+        @CachedMethod(ttl=45)
+        def slow_request(self):
+            # slow things here
+            return hard_earned_result
+
+    fan.slow_request()  # slow
+    fan.slow_request()  # instant for the next 45 seconds
+    fan.slow_request.refresh()  # load now, whatever the age
+    fan.slow_request.cache.clear()  # forget it
+"""
+import functools
+import logging
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Cache of values that expire ttl seconds after being stored."""
+
+    def __init__(self, ttl=45, maxsize=128, max_stale=None):
+        """
+        :param ttl: seconds a value stays fresh, None to never expire
+        :param maxsize: most values kept, least recently used go first
+        :param max_stale: if set, age in seconds up to which a stale value
+            is returned while it is refreshed in the background
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, stored):
+        return self.ttl is None or time.monotonic() - stored <= self.ttl
+
+    def _is_usable(self, stored):
+        """Return True if a value stored then may still be served stale."""
+        if self._is_fresh(stored):
+            return True
+        if self.max_stale is None:
+            return False
+        return time.monotonic() - stored <= self.max_stale
+
+    def get(self, key, default=None):
+        """Return the fresh value for key, or default."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if not self._is_fresh(entry[1]):
+                if not self._is_usable(entry[1]):
+                    del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """Return the value for key if it may be served, fresh or stale.
+
+        :return: tuple of (value, age in seconds), (default, None) if there
+            is no usable value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_usable(entry[1]):
+                return default, None
+            self._entries.move_to_end(key)
+            return entry[0], time.monotonic() - entry[1]
+
+    def set(self, key, value):
+        """Store value for key."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                lock = self._key_locks.get(evicted)
+                if lock is not None and not lock.locked():
+                    del self._key_locks[evicted]
+
+    def update(self, key, function):
+        """Replace the value for key with function(value), keeping its age.
+
+        Nothing happens if key isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (function(entry[0]), entry[1])
+
+    def age(self, key):
+        """Return seconds since key was stored, or None if not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else time.monotonic() - entry[1]
+
+    def items(self):
+        """Return a list of (key, value, age in seconds) of the fresh values."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                (key, value, now - stored)
+                for key, (value, stored) in self._entries.items()
+                if self._is_fresh(stored)
+            ]
+
+    def invalidate(self, key):
+        """Forget the value for key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        """Forget the values of all str keys starting with prefix."""
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Forget all values."""
+        with self._lock:
+            self._entries.clear()
+
+    def collect(self):
+        """Drop expired values."""
+        with self._lock:
+            expired = [
+                key
+                for key, (_, stored) in self._entries.items()
+                if not self._is_usable(stored)
+            ]
+            for key in expired:
+                del self._entries[key]
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_load(self, key, loader, timeout=None, revalidate=None):
+        """Return the fresh value for key, calling loader() to get it if needed.
+
+        Only one loader runs per key at a time. Callers arriving while it
+        runs wait for it and share its result. If it raises, the exception
+        goes to its caller and the next waiter tries again.
+
+        With max_stale set a stale value younger than max_stale is returned
+        immediately and loader() is run in a background thread instead.
+
+        :param timeout: most seconds to wait for another caller's load,
+            then raise socket.timeout. Default as long as it takes.
+        :param revalidate: optional function called with loader to run it
+            in the background thread, default loader()
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            LOGGER.debug("Pulled from cache")
+            return value
+        value, age = self.get_stale(key, missing)
+        if value is not missing:
+            LOGGER.debug("Pulled stale value from cache, %.1fs old", age)
+            self._refresh_in_background(key, loader, revalidate)
+            return value
+        lock = self._key_lock(key)
+        self._acquire(lock, timeout)
+        try:
+            value = self.get(key, missing)
+            if value is not missing:
+                LOGGER.debug("Pulled from cache after waiting on a load")
+                return value
+            LOGGER.debug("Ran function")
+            value = loader()
+            self.set(key, value)
+            return value
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _acquire(lock, timeout):
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise socket.timeout("Timed out waiting for a load")
+
+    def refresh(self, key, loader, timeout=None):
+        """Call loader() and store its value, whatever the age of the cached one.
+
+        If a load for key is already running this waits for it and returns
+        its result rather than loading again.
+
+        :param timeout: as for get_or_load
+        """
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            self._acquire(lock, timeout)
+            try:
+                missing = object()
+                value, _ = self.get_stale(key, missing)
+                if value is not missing:
+                    return value
+            finally:
+                lock.release()
+            return self.get_or_load(key, loader, timeout)
+        try:
+            value = loader()
+            self.set(key, value)
+            return value
+        finally:
+            lock.release()
+
+    def _refresh_in_background(self, key, loader, revalidate=None):
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            # already being loaded
+            return
+
+        def refresh():
+            try:
+                if revalidate is None:
+                    self.set(key, loader())
+                else:
+                    self.set(key, revalidate(loader))
+            except Exception:
+                LOGGER.exception("Background refresh failed")
+            finally:
+                lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedMethod:
+    """Memoize a method per instance with a TTLCache.
+
+    The bound method has a cache attribute holding the instance's TTLCache.
+    """
+
+    def __init__(
+        self, ttl=45, maxsize=128, max_stale=None, wait_timeout=None, revalidate=None
+    ):
+        """
+        :param ttl: seconds a result stays fresh
+        :param maxsize: most results kept per instance
+        :param max_stale: see TTLCache, can also be set per instance on the
+            bound method's cache
+        :param wait_timeout: optional function of the instance returning the
+            most seconds a call waits for another call's load, or None to
+            wait as long as it takes, see TTLCache.get_or_load
+        :param revalidate: optional function of the instance and a loader,
+            calling it for stale-while-revalidate refreshes, such as to run
+            them at a lower priority
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self.wait_timeout = wait_timeout
+        self.revalidate = revalidate
+        self.func = None
+        self._caches = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __call__(self, func):
+        self.func = func
+        functools.update_wrapper(self, func)
+        return self
+
+    def cache_for(self, instance):
+        """Return the TTLCache of instance, creating it if needed."""
+        with self._lock:
+            cache = self._caches.get(instance)
+            if cache is None:
+                cache = self._caches[instance] = TTLCache(
+                    self.ttl, self.maxsize, self.max_stale
+                )
+            return cache
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = self.cache_for(instance)
+        func = self.func
+        wait_timeout = self.wait_timeout
+        revalidate = None
+        if self.revalidate is not None:
+            revalidate = functools.partial(self.revalidate, instance)
+
+        def timeout():
+            return None if wait_timeout is None else wait_timeout(instance)
+
+        @functools.wraps(func)
+        def method(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(
+                key, lambda: func(instance, *args, **kwargs), timeout(), revalidate
+            )
+
+        def refresh(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.refresh(
+                key, lambda: func(instance, *args, **kwargs), timeout()
+            )
+
+        method.cache = cache
+        method.refresh = refresh
+        return method
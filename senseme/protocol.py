@@ -0,0 +1,206 @@
+"""Helpers for the SenseMe wire protocol.
+
+Requests are sent as <Device Name;FAN;SPD;GET;ACTUAL> and devices answer
+with messages like (Device Name;FAN;SPD;ACTUAL;3), the attribute path
+followed by one or more values.
+"""
+import math
+import re
+
+
+class MessageFramer:
+    """Incrementally split a byte stream into complete (...) messages.
+
+    Data may be fed in any sized pieces, messages split across pieces are
+    held until complete and several messages in one piece are all returned.
+    Each message is returned exactly once.
+
+    Example:
+        framer = MessageFramer()
+        framer.feed(b"(Fan;FAN;PWR;ON)(Fan;FAN;SP")
+        ['(Fan;FAN;PWR;ON)']
+        framer.feed(b"D;ACTUAL;3)")
+        ['(Fan;FAN;SPD;ACTUAL;3)']
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Add received data.
+
+        :param data: bytes, bytearray or memoryview
+        :return: list of the messages completed by data, as str
+        """
+        buffer = self._buffer
+        buffer += data
+        messages = []
+        start = 0
+        while True:
+            opening = buffer.find(b"(", start)
+            if opening < 0:
+                # nothing but noise left, drop it
+                start = len(buffer)
+                break
+            closing = buffer.find(b")", opening)
+            if closing < 0:
+                start = opening
+                break
+            messages.append(buffer[opening : closing + 1].decode("utf-8", "replace"))
+            start = closing + 1
+        del buffer[:start]
+        return messages
+
+    @property
+    def pending(self):
+        """Number of bytes held for an incomplete message."""
+        return len(self._buffer)
+
+
+def response_path(command):
+    """Return the attribute path a reply to a GET command will carry.
+
+    Example:
+        response_path("<Living Room Fan;FAN;SPD;GET;ACTUAL>")
+        'FAN;SPD;ACTUAL'
+    """
+    body = command.strip().lstrip("<").rstrip(">")
+    _, body = body.split(";", 1)
+    return ";".join(part for part in body.split(";") if part != "GET")
+
+
+def reply_body(message):
+    """Strip the parentheses and device name from a reply.
+
+    Example:
+        reply_body("(Living Room Fan;FAN;SPD;ACTUAL;3)")
+        'FAN;SPD;ACTUAL;3'
+    """
+    body = message.strip().lstrip("(").rstrip(")")
+    return body.split(";", 1)[1] if ";" in body else body
+
+
+def match_reply(message, paths):
+    """Return which of paths a reply message is for, or None.
+
+    The longest matching path wins, so a reply for SLEEP;EVENT;OFF isn't
+    taken as one for SLEEP;EVENT.
+    """
+    body = reply_body(message)
+    matches = [path for path in paths if body.startswith(path + ";")]
+    return max(matches, key=len) if matches else None
+
+
+DEVICE_ID_RE = re.compile(r"\((.*);DEVICE;ID;(.*);(.*),(.*)\)")
+
+
+def parse_device_id(message):
+    """Parse a reply to <ALL;DEVICE;ID;GET>.
+
+    Example:
+        parse_device_id("(Fan;DEVICE;ID;20:F8:5E:E3:AB:00;FAN,HAIKU,HSERIES)")
+        ('Fan', '20:F8:5E:E3:AB:00', 'FAN,HAIKU', 'HSERIES')
+
+    :return: tuple of (name, mac, model, series) or None if message isn't a
+        device id reply
+    """
+    match_obj = DEVICE_ID_RE.match(message)
+    if not match_obj:
+        return None
+    return match_obj.groups()
+
+
+def parse_device_ids(datagram):
+    """Return the parsed device id replies in a received datagram.
+
+    :param datagram: bytes or memoryview as received
+    :return: list of (name, mac, model, series) tuples
+    """
+    details = (parse_device_id(message) for message in MessageFramer().feed(datagram))
+    return [detail for detail in details if detail]
+
+
+def last_value(message):
+    """Return the last value of a reply, or False if it isn't a reply."""
+    match_obj = re.match(r"\(.*;([^;]+)\)", message)
+    if match_obj:
+        return match_obj.group(1)
+    return False
+
+
+def reply_values(message, count):
+    """Return the last count values of a reply, for multi value attributes.
+
+    Example:
+        reply_values("(Fan;FAN;BOOKENDS;1;7)", 2)
+        ['1', '7']
+    """
+    body = message[message.find("(") + 1 : message.find(")")]
+    return body.split(";")[-count:]
+
+
+def parse_level(value):
+    """Parse a speed or brightness value.
+
+    Devices sometimes answer OFF rather than 0, see
+    https://github.com/TomFaulkner/SenseMe/issues/38
+
+    :return: int level, or None if value couldn't be parsed
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        if value == "OFF":
+            return 0
+    return None
+
+
+def clamp(value, low, high):
+    """Limit value to the range low to high."""
+    return max(low, min(high, value))
+
+
+def to_fahrenheit(value):
+    """Convert a device temperature, in 1/100 celsius, to fahrenheit."""
+    return math.ceil(((int(value) * 9) / 500) + 32)
+
+
+def from_fahrenheit(temp):
+    """Convert fahrenheit to a device temperature, in 1/100 celsius."""
+    return int((((int(temp) - 32) * 500) / 9))
+
+
+def to_minutes(value):
+    """Convert a device timer, in milliseconds, to minutes."""
+    return int(int(value) / 60000)
+
+
+def parse_wakeup_brightness(value):
+    """Parse the light level of the sleep mode wake up event."""
+    if value in ("LIGHT,PWR,OFF", "OFF"):
+        return 0
+    return int(value.replace("LIGHT,LEVEL,", ""))
+
+
+def parse_attribute(body):
+    """Split a reply body, without the device name, into attribute and value.
+
+    Most attributes have a single value. BOOKENDS attributes have a low and
+    a high value and NW;PARAMS;ACTUAL has ip, subnet and gateway.
+
+    Example:
+        parse_attribute("FAN;BOOKENDS;1;7")
+        ('FAN;BOOKENDS', ('1', '7'))
+
+    :return: tuple of (attribute, value)
+    """
+    # handle these manually due to multiple values in result
+    # FAN and LIGHT both have BOOKENDS attributes
+    if "BOOKENDS" in body:
+        attribute, low, high = body.rsplit(";", 2)
+        return attribute, (low, high)
+    elif "NW;PARAMS;ACTUAL" in body:
+        # ip, subnet, gateway
+        return "NW;PARAMS;ACTUAL", (body.rsplit(";", 3))[1:]
+    attribute, value = body.rsplit(";", 1)
+    return attribute, value
@@ -0,0 +1,253 @@
+"""Apply the messages devices send on their own to their cache.
+
+Devices report changes made from a wall control or the Haiku app as they
+happen, on their open connections and as UDP messages to port 31415, but
+replies to our own requests were all that was ever read, so such changes
+went unseen until the next GETALL. PushListener keeps a connection open to
+each device it's given, and optionally listens on UDP, all from a single
+thread, and hands every message to its device as it arrives.
+
+Example:
+    fan.start_push()  # uses the listener shared by all devices
+    fan.start_monitor()  # with a long monitor_frequency, as a check
+"""
+import errno
+import logging
+import selectors
+import socket
+import threading
+import time
+
+from .protocol import MessageFramer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Connection:
+    """Connection to one device, reopened with backoff when it drops."""
+
+    def __init__(self, device, delay):
+        self.device = device
+        self.sock = None
+        self.connected = False
+        self.framer = MessageFramer()
+        self.retry_at = 0
+        self.delay = delay
+
+    def close(self, selector):
+        if self.sock is None:
+            return
+        try:
+            selector.unregister(self.sock)
+        except KeyError:
+            pass
+        self.sock.close()
+        self.sock = None
+        self.connected = False
+        self.framer = MessageFramer()
+
+
+class PushListener:
+    """Reads unsolicited messages for many devices from one thread."""
+
+    def __init__(self, tcp=True, udp=False, reconnect_delay=1, max_reconnect_delay=60):
+        """
+        :param tcp: hold a connection to every device
+        :param udp: listen on UDP port 31415, messages are matched to
+            devices by name
+        :param reconnect_delay: seconds before a dropped connection is
+            reopened, doubling for every failed attempt
+        :param max_reconnect_delay: most seconds between attempts
+        """
+        self.tcp = tcp
+        self.udp = udp
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._selector = None
+        self._thread = None
+        self._running = False
+        self._generation = 0
+        self._waker = None
+
+    def add(self, device):
+        """Start applying messages from device to its cache."""
+        with self._lock:
+            if device in self._connections:
+                return
+            self._connections[device] = _Connection(device, self.reconnect_delay)
+            self._start()
+        self._wake()
+
+    def remove(self, device):
+        """Stop listening for device."""
+        with self._lock:
+            connection = self._connections.pop(device, None)
+            if connection is not None:
+                connection.device = None
+        self._wake()
+
+    def _start(self):
+        # called holding _lock
+        if self._running:
+            return
+        self._running = True
+        # the thread of an earlier start may still be finishing
+        self._generation += 1
+        self._selector = selectors.DefaultSelector()
+        self._waker = socket.socketpair()
+        for sock in self._waker:
+            sock.setblocking(False)
+        self._selector.register(self._waker[0], selectors.EVENT_READ, "wake")
+        if self.udp:
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                udp.bind(("", 31415))
+            except OSError:
+                LOGGER.exception("Couldn't get port 31415, not listening on UDP")
+                udp.close()
+            else:
+                udp.setblocking(False)
+                self._selector.register(udp, selectors.EVENT_READ, "udp")
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(self._selector, self._waker, self._generation),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _wake(self):
+        try:
+            self._waker[1].send(b"\0")
+        except (AttributeError, TypeError, OSError):
+            # not started, or already stopped
+            pass
+
+    def stop(self):
+        """Close every connection and stop the thread."""
+        with self._lock:
+            self._running = False
+            self._connections.clear()
+        self._wake()
+
+    def _run(self, selector, waker, generation):
+        try:
+            while self._running and self._generation == generation:
+                self._connect_due(selector)
+                for key, _ in selector.select(self._next_timeout()):
+                    if key.data == "wake":
+                        try:
+                            while key.fileobj.recv(512):
+                                pass
+                        except (BlockingIOError, InterruptedError):
+                            pass
+                    elif key.data == "udp":
+                        self._read_udp(key.fileobj)
+                    else:
+                        self._on_tcp_event(selector, key.data)
+        except Exception:
+            LOGGER.exception("Push listener error")
+            with self._lock:
+                self._running = False
+                self._connections.clear()
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            waker[1].close()
+
+    def _connect_due(self, selector):
+        """Open connections that are due, and close those of removed devices."""
+        now = time.monotonic()
+        with self._lock:
+            current = set(self._connections.values())
+        for key in list(selector.get_map().values()):
+            if isinstance(key.data, _Connection) and key.data not in current:
+                key.data.close(selector)
+        if not self.tcp:
+            return
+        for connection in current:
+            if connection.sock is not None or connection.retry_at > now:
+                continue
+            sock = socket.socket()
+            sock.setblocking(False)
+            error = sock.connect_ex((connection.device.ip, connection.device.PORT))
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sock.close()
+                self._retry_later(connection)
+                continue
+            connection.sock = sock
+            selector.register(sock, selectors.EVENT_WRITE, connection)
+
+    def _next_timeout(self):
+        with self._lock:
+            waiting = [
+                c.retry_at for c in self._connections.values() if c.sock is None
+            ]
+        if not self.tcp or not waiting:
+            return None
+        return max(0, min(waiting) - time.monotonic())
+
+    def _retry_later(self, connection):
+        connection.retry_at = time.monotonic() + connection.delay
+        connection.delay = min(connection.delay * 2, self.max_reconnect_delay)
+
+    def _on_tcp_event(self, selector, connection):
+        if not connection.connected:
+            error = connection.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                LOGGER.debug("Couldn't connect to %r: %s", connection.device, error)
+                connection.close(selector)
+                self._retry_later(connection)
+                return
+            LOGGER.debug("Listening to %r", connection.device)
+            connection.connected = True
+            connection.delay = self.reconnect_delay
+            selector.modify(connection.sock, selectors.EVENT_READ, connection)
+            return
+        try:
+            data = connection.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            LOGGER.debug("Connection to %r closed", connection.device)
+            connection.close(selector)
+            self._retry_later(connection)
+            return
+        device = connection.device
+        for message in connection.framer.feed(data):
+            if device is not None:
+                device._apply_push(message)
+
+    def _read_udp(self, sock):
+        while True:
+            try:
+                datagram, _ = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # as for TCP, wait for the selector to report the socket again
+                LOGGER.debug("Couldn't read a datagram: %s", e)
+                return
+            with self._lock:
+                devices = list(self._connections)
+            for message in MessageFramer().feed(datagram):
+                for device in devices:
+                    if message.startswith("(%s;" % device.name):
+                        device._apply_push(message)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_push_listener():
+    """Return the PushListener shared by devices not given one."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = PushListener()
+        return _default
@@ -0,0 +1,227 @@
+"""Keep track of the devices on the network while the process runs.
+
+Devices on DHCP change address, and a SenseMe keeps talking to the address
+it was made with, timing out until it's made again. DeviceRegistry
+broadcasts <ALL;DEVICE;ID;GET> every interval seconds, keeps one SenseMe
+per MAC and updates its ip and name in place when they change, so every
+holder of the object follows the device. Scans run on the lib.Scheduler
+that runs device monitors.
+
+Example:
+    def changed(event, device, old):
+        print(event, device, old)
+
+    registry = DeviceRegistry(interval=60)
+    registry.subscribe(changed)
+    registry.start()
+    ...
+    registry.devices  # devices seen on the last scans
+"""
+import functools
+import logging
+import threading
+
+from .lib.identity_cache import resolve_identity_cache
+from .lib.scheduler import default_scheduler
+from .senseme import SenseMe, _broadcast_device_id
+
+LOGGER = logging.getLogger(__name__)
+
+JOINED = "joined"
+LEFT = "left"
+MOVED = "moved"
+RENAMED = "renamed"
+
+
+class DeviceRegistry:
+    """SenseMe devices by MAC, updated by periodic discovery broadcasts.
+
+    Callbacks given to subscribe() are called with (event, device, old):
+      JOINED: a device answered that wasn't present, old is None
+      LEFT: a device missed miss_limit scans in a row, old is None
+      MOVED: a device answered from a new ip, old is the previous ip
+      RENAMED: a device answered with a new name, old is the previous name
+
+    Scans listen on port 31415, so discover() can't run at the same time in
+    the same host.
+    """
+
+    def __init__(
+        self,
+        devices=(),
+        interval=60,
+        scan_time=2,
+        miss_limit=3,
+        interfaces=None,
+        identity_cache=None,
+        scheduler=None,
+        **device_kwargs
+    ):
+        """
+        :param devices: SenseMe devices, with their mac set, to keep updated
+        :param interval: seconds between scans
+        :param scan_time: seconds each scan listens for replies
+        :param miss_limit: scans a device may miss before it has left
+        :param interfaces: interface names or address/prefix strings to
+            broadcast on, default all local interfaces
+        :param identity_cache: an IdentityCache, or True for one at the
+            default path, kept up to date with every scan
+        :param scheduler: the lib.Scheduler running the scans, by default
+            the one shared with device monitors
+        :param device_kwargs: keyword arguments for the SenseMe made for
+            each new device, such as connection_pool or monitor
+        """
+        self.interval = interval
+        self.scan_time = scan_time
+        self.miss_limit = miss_limit
+        self.interfaces = interfaces
+        self.identity_cache = resolve_identity_cache(identity_cache)
+        self.device_kwargs = device_kwargs
+        self._scheduler = scheduler or default_scheduler()
+        self._scan_job = None
+        # set by stop() to cut a running scan short
+        self._stopped = threading.Event()
+        self._devices = {}
+        self._present = set()
+        self._misses = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        for device in devices:
+            self.add(device)
+
+    def add(self, device):
+        """Keep an existing SenseMe updated. It's present until it misses scans."""
+        if not device.mac:
+            raise ValueError("Only devices with a known mac can be tracked")
+        with self._lock:
+            self._devices[device.mac] = device
+            self._present.add(device.mac)
+            self._misses[device.mac] = 0
+
+    @property
+    def devices(self):
+        """List of devices that are present."""
+        with self._lock:
+            return [self._devices[mac] for mac in self._present]
+
+    def get(self, mac):
+        """Return the device with mac, present or not, or None."""
+        with self._lock:
+            return self._devices.get(mac)
+
+    def subscribe(self, callback):
+        """Call callback(event, device, old) on every change, see the class."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop calling callback."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def _notify(self, events):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for event in events:
+            LOGGER.info("%s %r %s" % event)
+            for callback in callbacks:
+                try:
+                    callback(*event)
+                except Exception:
+                    LOGGER.exception("Registry callback error")
+
+    def scan(self, stopped=None):
+        """Broadcast once, apply what answered and call the callbacks.
+
+        :param stopped: optional threading.Event ending the scan early, what
+            answered so far is then dropped rather than applied
+        """
+        with self._scan_lock:
+            seen = {}
+            replies = _broadcast_device_id(
+                self.scan_time, self.scan_time / 4, self.interfaces, stopped
+            )
+            try:
+                for ip, identity, _, interface in replies:
+                    seen[identity[1]] = (ip, identity, interface)
+            finally:
+                replies.close()
+            if stopped is not None and stopped.is_set():
+                # devices that hadn't answered yet would count as missing
+                return
+            events = self._apply(seen)
+        self._notify(events)
+
+    def _apply(self, seen):
+        """Update devices with the replies of a scan, return the events."""
+        events = []
+        joined = []
+        with self._lock:
+            for mac, (ip, (name, _, model, series), interface) in seen.items():
+                self._misses[mac] = 0
+                device = self._devices.get(mac)
+                if device is None:
+                    joined.append((mac, ip, name, model, series, interface))
+                    continue
+                if device.ip != ip:
+                    events.append((MOVED, device, device.ip))
+                    device.ip = ip
+                if device.name != name:
+                    events.append((RENAMED, device, device.name))
+                    device.name = name
+                device.interface = interface
+                if not device.model:
+                    device.model, device.series = model, series
+                if mac not in self._present:
+                    self._present.add(mac)
+                    events.append((JOINED, device, None))
+            for mac in list(self._present):
+                if mac in seen:
+                    continue
+                self._misses[mac] += 1
+                if self._misses[mac] >= self.miss_limit:
+                    self._present.discard(mac)
+                    events.append((LEFT, self._devices[mac], None))
+
+        # made outside the lock, SenseMe may start a monitor
+        for mac, ip, name, model, series, interface in joined:
+            device = SenseMe(
+                ip=ip,
+                name=name,
+                model=model,
+                series=series,
+                mac=mac,
+                identity_cache=self.identity_cache,
+                interface=interface,
+                **self.device_kwargs
+            )
+            with self._lock:
+                self._devices[mac] = device
+                self._present.add(mac)
+            events.append((JOINED, device, None))
+
+        if self.identity_cache is not None:
+            for event, device, _ in events:
+                if event != LEFT:
+                    self.identity_cache.store(
+                        device.name, device.mac, device.model, device.series, device.ip
+                    )
+        return events
+
+    def start(self):
+        """Scan every interval seconds, starting now."""
+        if self._scan_job is not None:
+            return
+        self._stopped = threading.Event()
+        self._scan_job = self._scheduler.schedule(
+            functools.partial(self.scan, self._stopped), self.interval, delay=0
+        )
+
+    def stop(self):
+        """Stop scanning. A scan in progress ends without waiting for it."""
+        if self._scan_job is not None:
+            self._scan_job.cancel()
+            self._scan_job = None
+        self._stopped.set()
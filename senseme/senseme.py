@@ -6,18 +6,64 @@ https://github.com/bpennypacker/SenseME-Indigo-Plugin
 
 Source can be found at https://github.com/TomFaulkner/SenseMe
 """
+import collections
+import contextlib
+import functools
 import json
 import logging
-import math
-import re
+import queue
+import select
+import selectors
 import socket
+import threading
 import time
-
-from .lib import MWT, BackgroundLoop
+from concurrent.futures import ThreadPoolExecutor
+
+from .known_attribs import NEVER_CACHE, POLICY_TTLS, attribute_policy, implied_values
+from .lib import (
+    AdaptiveInterval,
+    BurstProfile,
+    BurstReader,
+    CachedMethod,
+    Coalescer,
+    CommandQueue,
+    ConnectionPool,
+    TTLCache,
+)
+from .lib.command_queue import BACKGROUND, INTERACTIVE, Preempted
+from .lib.identity_cache import resolve_identity_cache
+from .lib.interfaces import interface_of, resolve_interfaces
+from .lib.retry import Deadline, DeadlineExceeded, RetryPolicy
+from .lib.scheduler import default_scheduler
+from .lib.snapshot import Snapshot
 from .lib.xml import data_to_xml
+from .protocol import (
+    MessageFramer,
+    clamp,
+    from_fahrenheit,
+    last_value,
+    match_reply,
+    parse_attribute,
+    parse_device_id,
+    parse_device_ids,
+    parse_level,
+    reply_body,
+    parse_wakeup_brightness,
+    reply_values,
+    response_path,
+    to_fahrenheit,
+    to_minutes,
+)
+from .push import default_push_listener
 
 LOGGER = logging.getLogger(__name__)
 
+# sources of cache changes, as passed to SenseMe.subscribe() callbacks
+GETALL = "getall"
+POLL = "poll"
+PUSH = "push"
+LOCAL = "local"
+
 __author__ = "Tom Faulkner"
 __url__ = "https://github.com/TomFaulkner/SenseMe/"
 
@@ -33,8 +79,9 @@ class SenseMe:
     other fields works.
 
     If SenseMe is instantiated without ip or name a discovery will be done and
-    the first device to answer the broadcast will be the device represented by
-    this object. Any later answers will be ignored.
+    the first device to answer the broadcast, with the name or ip given if
+    either was, will be the device represented by this object. Any later
+    answers will be ignored.
 
     After init it is suggested to start_monitoring() to make whoosh and some
     other queries instant rather than blocking for ten or so seconds.
@@ -42,6 +89,77 @@ class SenseMe:
 
     PORT = 31415
 
+    # attributes missing from GETALL, and the GET that reads them
+    _LIVE_QUERIES = {
+        "SNSROCC;STATUS": "SNSROCC;STATUS;GET",
+        "TIME;VALUE": "TIME;VALUE;GET",
+    }
+
+    # seconds between checks for waiting commands while a background GETALL
+    # waits for replies
+    PREEMPT_CHECK = 0.1
+
+    # attributes the fast tier of the monitor reads with hot_attributes=True
+    HOT_ATTRIBUTES = (
+        "FAN;PWR",
+        "FAN;SPD;ACTUAL",
+        "LIGHT;PWR",
+        "LIGHT;LEVEL;ACTUAL",
+        "SNSROCC;STATUS",
+    )
+
+    # polls in a row a hot attribute may go unanswered before it's dropped
+    HOT_MISS_LIMIT = 3
+
+    # qualifiers that follow GET rather than precede it, as in FAN;SPD;GET;MIN
+    _GET_QUALIFIERS = ("ACTUAL", "CURR", "MAX", "MIN", "STATUS")
+
+    # properties read with a single GET, and the GET they send, for get_many
+    # firmware_version needs the firmware name first, its second GET is sent
+    # on its own
+    _PIPELINE_QUERIES = {
+        "beeper_sound": "DEVICE;BEEPER;GET",
+        "device_time": "TIME;VALUE;GET",
+        "firmware_name": "FW;NAME;GET",
+        "firmware_version": "FW;NAME;GET",
+        "led_indicators": "DEVICE;INDICATORS;GET",
+        "network_ap_status": "NW;AP;GET;STATUS",
+        "network_dhcp_state": "NW;DHCP;GET",
+        "network_parameters": "NW;PARAMS;GET;ACTUAL",
+        "network_ssid": "NW;SSID;GET",
+        "network_token": "NW;TOKEN;GET",
+        "fan_powered_on": "FAN;PWR;GET",
+        "height": "WINTERMODE;HEIGHT;GET",
+        "speed": "FAN;SPD;GET;ACTUAL",
+        "min_speed": "FAN;SPD;GET;MIN",
+        "max_speed": "FAN;SPD;GET;MAX",
+        "room_settings_fan_speed_limits": "FAN;BOOKENDS;GET",
+        "learnmode": "LEARN;STATE;GET",
+        "learnmode_zerotemp": "LEARN;ZEROTEMP;GET",
+        "learnmode_minspeed": "LEARN;MINSPEED;GET",
+        "learnmode_maxspeed": "LEARN;MAXSPEED;GET",
+        "smartsleep_mode": "SLEEP;STATE;GET",
+        "smartsleep_idealtemp": "SMARTSLEEP;IDEALTEMP;GET",
+        "smartsleep_minspeed": "SMARTSLEEP;MINSPEED;GET",
+        "smartsleep_maxspeed": "SMARTSLEEP;MAXSPEED;GET",
+        "smartsleep_wakeup_brightness": "SLEEP;EVENT;OFF;GET",
+        "fan_direction": "FAN;DIR;GET",
+        "fan_motionmode": "FAN;AUTO;GET",
+        "motionmode_mintimer": "SNSROCC;TIMEOUT;GET;MIN",
+        "motionmode_maxtimer": "SNSROCC;TIMEOUT;GET;MAX",
+        "motionmode_currenttimer": "SNSROCC;TIMEOUT;GET;CURR",
+        "motionmode_occupied_status": "SNSROCC;STATUS;GET",
+        "wintermode": "WINTERMODE;STATE;GET",
+        "smartmode": "SMARTMODE;STATE;GET",
+        "brightness": "LIGHT;LEVEL;GET;ACTUAL",
+        "min_brightness": "LIGHT;LEVEL;GET;MIN",
+        "max_brightness": "LIGHT;LEVEL;GET;MAX",
+        "room_settings_brightness_limits": "LIGHT;BOOKENDS;GET",
+        "is_fan_light_installed": "DEVICE;LIGHT;GET",
+        "light_motionmode": "LIGHT;AUTO;GET",
+        "light_powered_on": "LIGHT;PWR;GET",
+    }
+
     def __init__(self, ip="", name="", model="", series="", mac="", **kwargs):
         """Init a SenseMe device.
 
@@ -56,12 +174,87 @@ class SenseMe:
         :param series: See comment on model
         :param mac: Could be used to talk to a device if name and ip aren't
             known, is not currently used.
-        """
+
+        Optional keyword arguments:
+          monitor: start the background monitor immediately
+          monitor_frequency: seconds between monitor refreshes, default 45
+          monitor_min_frequency, monitor_max_frequency: if either is given
+            the monitor adapts its frequency between them, the other bound
+            being monitor_frequency. It refreshes at the minimum after a
+            refresh found a change or a command was sent, and backs off
+            towards the maximum while nothing changes.
+          hot_attributes: attributes the monitor also reads, with one
+            pipelined GET each, every hot_frequency seconds and merges into
+            the GETALL cache, or True for HOT_ATTRIBUTES. Keeps them fresh,
+            SNSROCC;STATUS included, while monitor_frequency, the full
+            GETALL, can be long. Attributes the device doesn't answer for
+            are dropped after HOT_MISS_LIMIT polls.
+          hot_frequency: seconds between reads of hot_attributes, default 1
+          push: a push.PushListener, or True for the one shared by all
+            devices, to start applying messages the device sends on its own
+            to the cache, see start_push
+          scheduler: the lib.Scheduler running the monitor, by default one
+            shared by all devices, so monitoring many devices doesn't take a
+            thread each
+          suppress_redundant_writes: seconds a cached value may be old and
+            still stop a setter sending a value equal to it, or True for 30,
+            default None to always send. Values written by this object,
+            policy-cached replies, the hot tier and the monitor's GETALL are
+            used, each by its own age. See set_property to force a write and
+            suppressed_writes for counts.
+          coalesce_window: seconds during which writes to a setting that
+            was just written are held, only the latest being sent when the
+            window ends, default None to send every write. Keeps a dragged
+            slider from flooding the device, see lib.Coalescer. inc_speed,
+            dec_brightness, etc. then add to the value last written, or the
+            monitor's, rather than reading the device, so write_ttl should
+            be longer than the window.
+          max_queued_commands: commands that may wait for the device in
+            each of the interactive and background lanes, default 8. Calls
+            beyond that block until there is room, see lib.CommandQueue.
+          timeout: seconds any one connect, send or recv may take, default 5.
+            Pooled connections use the pool's timeout.
+          retry_policy: a lib.RetryPolicy for commands that fail with a
+            connection error or time out, default one retry. Use deadline()
+            to bound how long a call may take, retries included.
+          connection_pool: a ConnectionPool, possibly shared between devices,
+            or True to create one for this device. Keeps a warm connection to
+            the device rather than connecting for every command.
+          stale_while_revalidate: once the GETALL cache expires keep serving
+            it to get_attribute, flat_dict, etc. while a fresh one is fetched
+            in the background, see cache_age
+          max_staleness: seconds after which a stale GETALL is no longer
+            served and callers wait for a fresh one, default 300
+          policy_ttls: dict overriding known_attribs.POLICY_TTLS, seconds
+            values of each cache policy may be reused by properties and
+            get_attribute
+          write_ttl: seconds the values a setter wrote, and those it implies
+            by known_attribs.DEPENDENCIES, are returned by properties,
+            get_attribute and GETALL reads fetched before the write, monitored
+            or not, default 5. 0 reads the device again right away.
+          identity_cache: an IdentityCache, or True for one at the default
+            path. If ip or name is missing the remembered identity is checked
+            with a quick probe of its last IP before falling back to a
+            broadcast discovery, whose result is then remembered.
+          interfaces: interface names or address/prefix strings to broadcast
+            on when discovering the device, default all local interfaces
+          interface: the lib.Interface the device was discovered on, set by
+            discovery
+        """
+        self.interface = kwargs.get("interface")
+        self._identity_cache = resolve_identity_cache(kwargs.get("identity_cache"))
         if not ip or not name:
             # if ip or name are unknown, discover the device
             # if one is known but not the other a specific device will discover
             # if not one device, or none, will discover
-            self.discover_single_device()
+            if not self._identify_from_cache(ip, name):
+                self.discover_single_device(
+                    name=name, ip=ip, interfaces=kwargs.get("interfaces")
+                )
+                if self._identity_cache is not None:
+                    self._identity_cache.store(
+                        self.name, self.mac, self.model, self.series, self.ip
+                    )
         else:
             self.ip = ip
             self.name = name
@@ -70,12 +263,68 @@ class SenseMe:
             self.model = model
             self.series = series
         self.monitor_frequency = kwargs.get("monitor_frequency", 45)
+        hot_attributes = kwargs.get("hot_attributes") or ()
+        if hot_attributes is True:
+            hot_attributes = self.HOT_ATTRIBUTES
+        self.hot_attributes = list(hot_attributes)
+        self.hot_frequency = kwargs.get("hot_frequency", 1)
+        # the fast tier's values with the time they were read
+        self._hot_values = TTLCache(ttl=None)
+        self._hot_misses = collections.Counter()
+        self._hot_job = None
+        self._monitor_interval = None
+        if "monitor_min_frequency" in kwargs or "monitor_max_frequency" in kwargs:
+            self._monitor_interval = AdaptiveInterval(
+                kwargs.get("monitor_min_frequency", self.monitor_frequency),
+                kwargs.get("monitor_max_frequency", self.monitor_frequency),
+                initial=self.monitor_frequency,
+            )
         self._monitoring = False
         self._all_cache = None
-
-        self._background_monitor = BackgroundLoop(
-            self.monitor_frequency, self._get_all_bare
-        )
+        self._commit_lock = threading.Lock()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._local = threading.local()
+        self._getall_profile = BurstProfile()
+        # set while a GETALL talks to the device, the fast tier skips its polls
+        self._getall_running = threading.Event()
+        # raw replies by attribute, reused according to the attribute's policy
+        self._attribute_cache = TTLCache(ttl=None, maxsize=256)
+        self._policy_ttls = dict(POLICY_TTLS, **kwargs.get("policy_ttls", {}))
+        # values set by commands, served until the device is read again
+        self._write_ttl = kwargs.get("write_ttl", 5)
+        self._written = TTLCache(ttl=self._write_ttl, maxsize=256)
+        # attributes a write left unknown, dropped from the cache until read
+        self._unknown = set()
+        # attributes whose cached value a write only implied, not confirmed
+        self._implied = set()
+        self._getall_listeners = []
+        self._getall_listeners_lock = threading.Lock()
+        # one command at a time, the monitor's waiting for everyone else's
+        self._commands = CommandQueue(kwargs.get("max_queued_commands", 8))
+        self._suppress_age = kwargs.get("suppress_redundant_writes")
+        if self._suppress_age is True:
+            self._suppress_age = 30
+        self._suppressed = collections.Counter()
+        self._suppressed_lock = threading.Lock()
+        self.timeout = kwargs.get("timeout", 5)
+        self._retry_policy = kwargs.get("retry_policy") or RetryPolicy()
+        self._coalescer = None
+        if kwargs.get("coalesce_window"):
+            self._coalescer = Coalescer(kwargs["coalesce_window"], self._write)
+        self._adjust_lock = threading.Lock()
+        self._pool = kwargs.get("connection_pool") or None
+        if self._pool is True:
+            self._pool = ConnectionPool()
+
+        if kwargs.get("stale_while_revalidate", False):
+            self._get_all_request.cache.max_stale = kwargs.get("max_staleness", 300)
+
+        self._scheduler = kwargs.get("scheduler") or default_scheduler()
+        self._monitor_job = None
+        self._push_listener = None
+        if kwargs.get("push"):
+            self.start_push(None if kwargs["push"] is True else kwargs["push"])
         if kwargs.get("monitor", False):
             self.start_monitor()
 
@@ -89,11 +338,45 @@ class SenseMe:
 
     def __str__(self):
         """Str Method."""
+        values = self.get_many(["speed", "brightness"])
         return (
             f"SenseMe Device: {self.name}, Series: {self.series}. "
-            f"(Speed: {self.speed}. Brightness: {self.brightness})"
+            f"(Speed: {values['speed']}. Brightness: {values['brightness']})"
         )
 
+    def get_many(self, properties):
+        """Read several properties using one connection.
+
+        The GET requests for all properties are written back to back and
+        the replies matched up by attribute path as they come in, so reading
+        N properties costs about one round trip rather than N. Values are
+        parsed by the properties themselves and are the same as reading each
+        property on its own. Properties without a single GET (whoosh, for
+        instance) and any reply that doesn't arrive are read individually.
+
+        Example:
+          fan.get_many(["speed", "brightness", "fan_direction"])
+          {'speed': 3, 'brightness': 16, 'fan_direction': 'FWD'}
+
+        :param properties: iterable of property names
+        :return: dict of property name to value
+        """
+        properties = list(properties)
+        commands = []
+        for prop in properties:
+            query = self._PIPELINE_QUERIES.get(prop)
+            if query:
+                command = "<%s;%s>" % (self.name, query)
+                cached = self._cached_reply(response_path(command))
+                if command not in commands and cached is None:
+                    commands.append(command)
+
+        self._local.prefetched = self._pipeline(commands) if commands else {}
+        try:
+            return {prop: getattr(self, prop) for prop in properties}
+        finally:
+            self._local.prefetched = None
+
     # The following properties are generic to haiku devices
 
     @property
@@ -112,8 +395,9 @@ class SenseMe:
         if mode != "OFF" and mode != "ON":
             LOGGER.debug("%s is an invalid beeper sound setting.  Use ON or OFF" % mode)
         else:
-            self._send_command("<%s;DEVICE;BEEPER;%s>" % (self.name, mode))
-            self._update_cache("DEVICE;BEEPER", mode)
+            self._set(
+                "<%s;DEVICE;BEEPER;%s>" % (self.name, mode), "DEVICE;BEEPER", mode
+            )
 
     @property
     def device_time(self):
@@ -129,7 +413,12 @@ class SenseMe:
     def firmware_version(self):
         """Return the name of the firmware running on the fan"""
         name = self.firmware_name
-        return self._query("<%s;FW;%s;GET>" % (self.name, name))
+        version = self._query("<%s;FW;%s;GET>" % (self.name, name))
+        if version and self._identity_cache is not None:
+            remembered = self._identity_cache.find(mac=self.mac)
+            if remembered and remembered.get("firmware") != version:
+                self._identity_cache.update(self.mac, firmware=version)
+        return version
 
     @property
     def led_indicators(self):
@@ -147,8 +436,11 @@ class SenseMe:
         if mode != "OFF" and mode != "ON":
             LOGGER.debug("%s is an led indicator setting.  Use ON or OFF" % mode)
         else:
-            self._send_command("<%s;DEVICE;INDICATORS;%s>" % (self.name, mode))
-            self._update_cache("DEVICE;INDICATORS", mode)
+            self._set(
+                "<%s;DEVICE;INDICATORS;%s>" % (self.name, mode),
+                "DEVICE;INDICATORS",
+                mode,
+            )
 
     @property
     def network_ap_status(self):
@@ -168,12 +460,7 @@ class SenseMe:
         The string is of the form IP Address;Subnet Mask;Default Gateway
         """
         raw = self._queryraw("<%s;NW;PARAMS;GET;ACTUAL>" % self.name)
-
-        # grab all between the parens
-        raw = raw[raw.find("(") + 1 : raw.find(")")]
-
-        vals = raw.split(";")
-        return vals[4], vals[5], vals[6]
+        return tuple(reply_values(raw, 3))
 
     @property
     def network_ssid(self):
@@ -207,11 +494,9 @@ class SenseMe:
         :param power_on: True=On, False=Off
         """
         if power_on:
-            self._send_command("<%s;FAN;PWR;ON>" % self.name)
-            self._update_cache("FAN;PWR", "ON")
+            self._set("<%s;FAN;PWR;ON>" % self.name, "FAN;PWR", "ON")
         else:
-            self._send_command("<%s;FAN;PWR;OFF>" % self.name)
-            self._update_cache("FAN;PWR", "OFF")
+            self._set("<%s;FAN;PWR;OFF>" % self.name, "FAN;PWR", "OFF")
 
     def fan_toggle(self):
         """Toggle power state of fan."""
@@ -230,8 +515,11 @@ class SenseMe:
         :param val: The height in centimeters
         """
         if val > 0:
-            self._send_command("<%s;WINTERMODE;HEIGHT;SET;%s>" % (self.name, val))
-            self._update_cache("WINTERMODE;HEIGHT", str(val))
+            self._set(
+                "<%s;WINTERMODE;HEIGHT;SET;%s>" % (self.name, val),
+                "WINTERMODE;HEIGHT",
+                str(val),
+            )
 
     @property
     def speed(self):
@@ -241,11 +529,9 @@ class SenseMe:
         for _ in range(2):
             speed = self._query("<%s;FAN;SPD;GET;ACTUAL>" % self.name)
             LOGGER.debug(speed)
-            try:
-                return int(speed)
-            except ValueError:
-                if speed == "OFF":
-                    return 0
+            speed = parse_level(speed)
+            if speed is not None:
+                return speed
         return 0  # return something rather than cause an exception
 
     @speed.setter
@@ -259,8 +545,9 @@ class SenseMe:
             speed = 7
         elif speed < 0:  # 0 also sets fan to off automatically
             speed = 0
-        self._send_command("<%s;FAN;SPD;SET;%s>" % (self.name, speed))
-        self._update_cache("FAN;SPD;ACTUAL", str(speed))
+        self._set(
+            "<%s;FAN;SPD;SET;%s>" % (self.name, speed), "FAN;SPD;ACTUAL", str(speed)
+        )
 
     @property
     def min_speed(self):
@@ -276,12 +563,8 @@ class SenseMe:
     def room_settings_fan_speed_limits(self):
         """Returns a tuple of the min and max fan speeds the room is configured to support"""
         raw = self._queryraw("<%s;FAN;BOOKENDS;GET>" % self.name)
-
-        # grab all between the parens
-        raw = raw[raw.find("(") + 1 : raw.find(")")]
-
-        vals = raw.split(";")
-        return int(vals[3]), int(vals[4])
+        low, high = reply_values(raw, 2)
+        return int(low), int(high)
 
     @room_settings_fan_speed_limits.setter
     def room_settings_fan_speed_limits(self, speeds):
@@ -294,17 +577,19 @@ class SenseMe:
             LOGGER.debug("min speed cannot exceed max speed")
             return
 
-        self._send_command(
-            "<%s;FAN;BOOKENDS;SET;%s;%s>" % (self.name, speeds[0], speeds[1])
+        self._set(
+            "<%s;FAN;BOOKENDS;SET;%s;%s>" % (self.name, speeds[0], speeds[1]),
+            "FAN;BOOKENDS",
+            (str(speeds[0]), str(speeds[1])),
         )
 
     def dec_speed(self, decrement=1):
         """ Decreases fan speed by decrement value, default is 1."""
-        self.speed -= decrement
+        self._adjust("speed", "FAN;SPD;ACTUAL", -decrement)
 
     def inc_speed(self, increment=1):
         """Increases fan speed by increment value, default is 1."""
-        self.speed += increment
+        self._adjust("speed", "FAN;SPD;ACTUAL", increment)
 
     @property
     def learnmode(self):
@@ -328,14 +613,13 @@ class SenseMe:
         elif mode != "OFF":
             LOGGER.error("%s is an invalid learn mode" % mode)
 
-        self._send_command("<%s;LEARN;STATE;SET;%s>" % (self.name, mode))
-        self._update_cache("LEARN;STATE", mode)
+        self._set("<%s;LEARN;STATE;SET;%s>" % (self.name, mode), "LEARN;STATE", mode)
 
     @property
     def learnmode_zerotemp(self):
         """Returns the temperature in fahrenheit that the fan will auto shutoff"""
         temp = self._query("<%s;LEARN;ZEROTEMP;GET>" % self.name)
-        return math.ceil(((int(temp) * 9) / 500) + 32)
+        return to_fahrenheit(temp)
 
     @learnmode_zerotemp.setter
     def learnmode_zerotemp(self, temp):
@@ -344,14 +628,12 @@ class SenseMe:
 
         :params temp: valid values are 50-90
         """
-        if temp < 50:
-            temp = 50
-        elif temp > 90:
-            temp = 90
-
-        temp = int((((int(temp) - 32) * 500) / 9))
-        self._send_command("<%s;LEARN;ZEROTEMP;SET;%s>" % (self.name, temp))
-        self._update_cache("LEARN;ZEROTEMP", temp)
+        temp = from_fahrenheit(clamp(temp, 50, 90))
+        self._set(
+            "<%s;LEARN;ZEROTEMP;SET;%s>" % (self.name, temp),
+            "LEARN;ZEROTEMP",
+            str(temp),
+        )
 
     @property
     def learnmode_minspeed(self):
@@ -370,8 +652,11 @@ class SenseMe:
         elif speed < 0:  # 0 also sets fan to off automatically
             speed = 0
 
-        self._send_command("<%s;LEARN;MINSPEED;SET;%s>" % (self.name, speed))
-        self._update_cache("LEARN;MINSPEED", speed)
+        self._set(
+            "<%s;LEARN;MINSPEED;SET;%s>" % (self.name, speed),
+            "LEARN;MINSPEED",
+            str(speed),
+        )
 
     @property
     def learnmode_maxspeed(self):
@@ -390,8 +675,11 @@ class SenseMe:
         elif speed < 0:  # 0 also sets fan to off automatically
             speed = 0
 
-        self._send_command("<%s;LEARN;MAXSPEED;SET;%s>" % (self.name, speed))
-        self._update_cache("LEARN;MAXSPEED", speed)
+        self._set(
+            "<%s;LEARN;MAXSPEED;SET;%s>" % (self.name, speed),
+            "LEARN;MAXSPEED",
+            str(speed),
+        )
 
     @property
     def smartsleep_mode(self):
@@ -411,15 +699,13 @@ class SenseMe:
                 "%s is an invalid sleep mode. Valid values are ON and OFF" % mode
             )
 
-        self._send_command("<%s;SLEEP;STATE;%s>" % (self.name, mode))
-        self._update_cache("SLEEP;STATE", mode)
+        self._set("<%s;SLEEP;STATE;%s>" % (self.name, mode), "SLEEP;STATE", mode)
 
     @property
     def smartsleep_idealtemp(self):
         """Returns the fan's smart sleep ideal temp setting."""
         temp = self._query("<%s;SMARTSLEEP;IDEALTEMP;GET>" % self.name)
-
-        return math.ceil(((int(temp) * 9) / 500) + 32)
+        return to_fahrenheit(temp)
 
     @smartsleep_idealtemp.setter
     def smartsleep_idealtemp(self, temp):
@@ -428,14 +714,12 @@ class SenseMe:
 
         :param temp: valid values are 50-90 degrees fahrenheit
         """
-        if temp < 50:
-            temp = 50
-        elif temp > 90:
-            temp = 90
-
-        temp = int((((int(temp) - 32) * 500) / 9))
-        self._send_command("<%s;SMARTSLEEP;IDEALTEMP;SET;%s>" % (self.name, temp))
-        self._update_cache("SMARTSLEEP;IDEALTEMP", temp)
+        temp = from_fahrenheit(clamp(temp, 50, 90))
+        self._set(
+            "<%s;SMARTSLEEP;IDEALTEMP;SET;%s>" % (self.name, temp),
+            "SMARTSLEEP;IDEALTEMP",
+            str(temp),
+        )
 
     @property
     def smartsleep_minspeed(self):
@@ -454,8 +738,11 @@ class SenseMe:
         elif speed < 0:  # 0 also sets fan to off automatically
             speed = 0
 
-        self._send_command("<%s;SMARTSLEEP;MINSPEED;SET;%s>" % (self.name, speed))
-        self._update_cache("SMARTSLEEP;MINSPEED", speed)
+        self._set(
+            "<%s;SMARTSLEEP;MINSPEED;SET;%s>" % (self.name, speed),
+            "SMARTSLEEP;MINSPEED",
+            str(speed),
+        )
 
     @property
     def smartsleep_maxspeed(self):
@@ -474,17 +761,17 @@ class SenseMe:
         elif speed < 0:  # 0 also sets fan to off automatically
             speed = 0
 
-        self._send_command("<%s;SMARTSLEEP;MAXSPEED;SET;%s>" % (self.name, speed))
-        self._update_cache("SMARTSLEEP;MAXSPEED", speed)
+        self._set(
+            "<%s;SMARTSLEEP;MAXSPEED;SET;%s>" % (self.name, speed),
+            "SMARTSLEEP;MAXSPEED",
+            str(speed),
+        )
 
     @property
     def smartsleep_wakeup_brightness(self):
         """Returns light brightness at wakeup for sleep mode"""
         result = self._query("<%s;SLEEP;EVENT;OFF;GET>" % self.name)
-        if (result == "LIGHT,PWR,OFF") or (result == "OFF"):
-            return 0
-        else:
-            return int(result.replace("LIGHT,LEVEL,", ""))
+        return parse_wakeup_brightness(result)
 
     @smartsleep_wakeup_brightness.setter
     def smartsleep_wakeup_brightness(self, light):
@@ -497,10 +784,11 @@ class SenseMe:
             light = 16
         elif light < 0:
             light = 0
-        self._send_command(
-            "<%s;SLEEP;EVENT;OFF;SET;LIGHT,LEVEL,%s>" % (self.name, light)
+        self._set(
+            "<%s;SLEEP;EVENT;OFF;SET;LIGHT,LEVEL,%s>" % (self.name, light),
+            "SLEEP;EVENT;OFF",
+            "LIGHT,LEVEL,%s" % light,
         )
-        self._update_cache("SLEEP;EVENT;OFF;LIGHT,LEVEL,", str(light))
 
     @property
     def fan_direction(self):
@@ -521,8 +809,7 @@ class SenseMe:
                 "%s is an invalid direction.  Valid values are FWD and REV" % mode
             )
         else:
-            self._send_command("<%s;FAN;DIR;SET;%s>" % (self.name, mode))
-            self._update_cache("FAN;DIR", mode)
+            self._set("<%s;FAN;DIR;SET;%s>" % (self.name, mode), "FAN;DIR", mode)
 
     @property
     def fan_motionmode(self):
@@ -542,32 +829,35 @@ class SenseMe:
                 "%s is an invalid fan motion mode.  Valid modes are ON and OFF" % mode
             )
         else:
-            self._send_command("<%s;FAN;AUTO;SET;%s>" % (self.name, mode))
-            self._update_cache("FAN;AUTO", mode)
+            self._set("<%s;FAN;AUTO;SET;%s>" % (self.name, mode), "FAN;AUTO", mode)
 
     @property
     def motionmode_mintimer(self):
         """Returns the minimum timer setting in minutes for the fan and light auto shutoff on no motion."""
         timer = self._query("<%s;SNSROCC;TIMEOUT;GET;MIN>" % self.name)
-        return int(int(timer) / 60000)
+        return to_minutes(timer)
 
     @property
     def motionmode_maxtimer(self):
         """Returns the minimum timer setting in minutes for the fan and light auto shutoff on no motion."""
         timer = self._query("<%s;SNSROCC;TIMEOUT;GET;MAX>" % self.name)
-        return int(int(timer) / 60000)
+        return to_minutes(timer)
 
     @property
     def motionmode_currenttimer(self):
         """Returns the current timer setting in minutes for the fan and light auto shutoff on no motion."""
         timer = self._query("<%s;SNSROCC;TIMEOUT;GET;CURR>" % self.name)
-        return int(int(timer) / 60000)
+        return to_minutes(timer)
 
     @motionmode_currenttimer.setter
     def motionmode_currenttimer(self, timeout):
         """Sets the timout setting in minutes for the fan and light auto shutoff on no motion."""
-        self._send_command("<%s;SNSROCC;TIMEOUT;SET;%s>" % (self.name, int(int(timeout)*60000)))
-        self._update_cache("SNSROCC;TIMEOUT", timeout)
+        timeout = int(int(timeout) * 60000)
+        self._set(
+            "<%s;SNSROCC;TIMEOUT;SET;%s>" % (self.name, timeout),
+            "SNSROCC;TIMEOUT;CURR",
+            str(timeout),
+        )
 
     @property
     def motionmode_occupied_status(self):
@@ -592,8 +882,9 @@ class SenseMe:
                 "%s is an invalid winter mode. Valid modes are ON and OFF" % mode
             )
         else:
-            self._send_command("<%s;WINTERMODE;STATE;%s>" % (self.name, mode))
-            self._update_cache("WINTERMODE;STATE", mode)
+            self._set(
+                "<%s;WINTERMODE;STATE;%s>" % (self.name, mode), "WINTERMODE;STATE", mode
+            )
 
     @property
     def smartmode(self):
@@ -608,21 +899,22 @@ class SenseMe:
         :param mode: valid values are OFF, COOLING, and HEATING
         """
         mode = mode.upper()
-        if mode != "OFF" and mode != "COOLING" and mode != " HEATING":
+        if mode != "OFF" and mode != "COOLING" and mode != "HEATING":
             LOGGER.error("%s is an invalid smartmode" % mode)
 
-        self._send_command("<%s;SMARTMODE;STATE;SET;%s>" % (self.name, mode))
-        self._update_cache("SMARTMODE;ACTUAL", mode)
+        self._set(
+            "<%s;SMARTMODE;STATE;SET;%s>" % (self.name, mode), "SMARTMODE;STATE", mode
+        )
 
     @property
     def whoosh(self):
         """Retrieve whoosh mode.
 
-        This can have a ten second delay since there is no known one item
-        request to retrieve status
+        There is no known one item request to retrieve status, so this reads
+        GETALL, returning as soon as the whoosh status arrives.
         """
         try:
-            if self.get_attribute("FAN;WHOOSH;STATUS") == "ON":
+            if self.get_attribute("FAN;WHOOSH;STATUS", early_exit=True) == "ON":
                 return True
             else:
                 return False
@@ -640,11 +932,9 @@ class SenseMe:
         :param whoosh_on: valid values are True or False
         """
         if whoosh_on:
-            self._send_command("<%s;FAN;WHOOSH;ON>" % self.name)
-            self._update_cache("FAN;WHOOSH;STATUS", "ON")
+            self._set("<%s;FAN;WHOOSH;ON>" % self.name, "FAN;WHOOSH;STATUS", "ON")
         else:
-            self._send_command("<%s;FAN;WHOOSH;OFF>" % self.name)
-            self._update_cache("FAN;WHOOSH;STATUS", "OFF")
+            self._set("<%s;FAN;WHOOSH;OFF>" % self.name, "FAN;WHOOSH;STATUS", "OFF")
 
     # The following properties are specific to haiku fans
     # add-on light modules.  Most of these apply to the
@@ -655,12 +945,11 @@ class SenseMe:
         """Returns light brightness."""
         # workaround for https://github.com/TomFaulkner/SenseMe/issues/38
         for _ in range(2):
-            result = self._query("<%s;LIGHT;LEVEL;GET;ACTUAL>" % self.name)
-            try:
-                return int(result)
-            except ValueError:
-                if result == "OFF":
-                    return 0
+            result = parse_level(
+                self._query("<%s;LIGHT;LEVEL;GET;ACTUAL>" % self.name)
+            )
+            if result is not None:
+                return result
         return 0  # return something rather than cause an exception
 
     @brightness.setter
@@ -674,8 +963,11 @@ class SenseMe:
             light = 16
         elif light < 0:
             light = 0
-        self._send_command("<%s;LIGHT;LEVEL;SET;%s>" % (self.name, light))
-        self._update_cache("LIGHT;LEVEL;ACTUAL", str(light))
+        self._set(
+            "<%s;LIGHT;LEVEL;SET;%s>" % (self.name, light),
+            "LIGHT;LEVEL;ACTUAL",
+            str(light),
+        )
 
     @property
     def min_brightness(self):
@@ -697,8 +989,11 @@ class SenseMe:
         elif light < 0:
             light = 0
 
-        self._send_command("<%s;LIGHT;LEVEL;MIN;%s>" % (self.name, light))
-        self._update_cache("LIGHT;LEVEL;MIN", light)
+        self._set(
+            "<%s;LIGHT;LEVEL;MIN;%s>" % (self.name, light),
+            "LIGHT;LEVEL;MIN",
+            str(light),
+        )
 
     @property
     def max_brightness(self):
@@ -717,19 +1012,18 @@ class SenseMe:
         elif light < 0:
             light = 0
 
-        self._send_command("<%s;LIGHT;LEVEL;MAX;%s>" % (self.name, light))
-        self._update_cache("LIGHT;LEVEL;MAX", light)
+        self._set(
+            "<%s;LIGHT;LEVEL;MAX;%s>" % (self.name, light),
+            "LIGHT;LEVEL;MAX",
+            str(light),
+        )
 
     @property
     def room_settings_brightness_limits(self):
         """Returns a tuple of the min and max light brightnesses the room supports"""
         raw = self._queryraw("<%s;LIGHT;BOOKENDS;GET>" % self.name)
-
-        # grab all between the parens
-        raw = raw[raw.find("(") + 1 : raw.find(")")]
-
-        vals = raw.split(";")
-        return int(vals[3]), int(vals[4])
+        low, high = reply_values(raw, 2)
+        return int(low), int(high)
 
     @room_settings_brightness_limits.setter
     def room_settings_brightness_limits(self, limits):
@@ -740,8 +1034,10 @@ class SenseMe:
         """
         if limits[0] >= limits[1]:
             LOGGER.debug("minbrightness cannot exceed maxbrightness")
-        self._send_command(
-            "<%s;LIGHT;BOOKENDS;SET;%s;%s>" % (self.name, limits[0], limits[1])
+        self._set(
+            "<%s;LIGHT;BOOKENDS;SET;%s;%s>" % (self.name, limits[0], limits[1]),
+            "LIGHT;BOOKENDS",
+            (str(limits[0]), str(limits[1])),
         )
 
     def dec_brightness(self, decrement=1):
@@ -750,7 +1046,7 @@ class SenseMe:
 
         :param decrement: number of steps to decrement with the call
         """
-        self.brightness -= decrement
+        self._adjust("brightness", "LIGHT;LEVEL;ACTUAL", -decrement)
 
     def inc_brightness(self, increment=1):
         """
@@ -758,7 +1054,30 @@ class SenseMe:
 
         :param increment: number of steps to increment with the call
         """
-        self.brightness += increment
+        self._adjust("brightness", "LIGHT;LEVEL;ACTUAL", increment)
+
+    def _adjust(self, prop, attribute, delta):
+        """Add delta to a level property.
+
+        With coalesce_window set the level is taken from the value last
+        written or the monitor's snapshot when there is one, so repeated
+        steps don't each read the device first.
+
+        :param prop: property name, speed or brightness
+        :param attribute: attribute path of the property's value
+        :param delta: steps to add, negative to subtract
+        """
+        with self._adjust_lock:
+            current = None
+            if self._coalescer is not None:
+                current = self._written.get(attribute)
+                snapshot = self._all_cache
+                if current is None and self._monitoring and snapshot:
+                    current = snapshot.get(attribute)
+                current = parse_level(current)
+            if current is None:
+                current = getattr(self, prop)
+            setattr(self, prop, current + delta)
 
     @property
     def is_fan_light_installed(self):
@@ -786,8 +1105,7 @@ class SenseMe:
         if mode != "ON" and mode != "OFF":
             LOGGER.error("%s is an invalid light motion mode" % mode)
         else:
-            self._send_command("<%s;LIGHT;AUTO;%s>" % (self.name, mode))
-            self._update_cache("LIGHT;AUTO", mode)
+            self._set("<%s;LIGHT;AUTO;%s>" % (self.name, mode), "LIGHT;AUTO", mode)
 
     @property
     def light_powered_on(self):
@@ -804,11 +1122,9 @@ class SenseMe:
         :param power_on: True equals on, False equals off
         """
         if power_on:
-            self._send_command("<%s;LIGHT;PWR;ON>" % self.name)
-            self._update_cache("LIGHT;PWR", "ON")
+            self._set("<%s;LIGHT;PWR;ON>" % self.name, "LIGHT;PWR", "ON")
         else:
-            self._send_command("<%s;LIGHT;PWR;OFF>" % self.name)
-            self._update_cache("LIGHT;PWR", "OFF")
+            self._set("<%s;LIGHT;PWR;OFF>" % self.name, "LIGHT;PWR", "OFF")
 
     def light_toggle(self):
         """Toggle power state of light."""
@@ -826,137 +1142,651 @@ class SenseMe:
             m = sock.recvfrom(1024)
             LOGGER.info(m)
 
-    def _send_command(self, msg):
-        sock = socket.socket()
-        sock.settimeout(5)
+    def _transact(self, handler):
+        """Call handler(sock) with a socket connected to the device.
 
-        sock.connect((self.ip, self.PORT))
-        sock.send(msg.encode("utf-8"))
-        sock.close()
+        Calls are queued so only one talks to the device at a time, those
+        made by the monitor after all others, see _in_background. Uses the
+        connection pool if one was given, otherwise a connection is made for
+        this call alone.
 
-    def _query(self, msg):
-        sock = socket.socket()
-        sock.settimeout(5)
+        Calls failing with errors of the retry policy are retried, within
+        the deadline if one is set.
 
-        sock.connect((self.ip, self.PORT))
-        sock.send(msg.encode("utf-8"))
+        Messages the device pushed while the call had the connection are
+        applied once it's done, so subscribers never run holding the
+        connection or the command queue, see _defer_push.
+        """
+        priority = getattr(self._local, "priority", INTERACTIVE)
+        deadline = getattr(self._local, "deadline", None)
+        outermost = getattr(self._local, "pushed", None) is None
+        if outermost:
+            self._local.pushed = []
+
+        def attempt():
+            wait = None if deadline is None else deadline.timeout()
+            try:
+                return self._commands.run(
+                    functools.partial(self._connect, handler), priority, timeout=wait
+                )
+            except queue.Full:
+                raise DeadlineExceeded("Deadline exceeded waiting for the device")
 
         try:
-            status = sock.recv(1048).decode("utf-8")
-            LOGGER.info("Status: " + status)
-        except socket.timeout:
-            LOGGER.error("Socket Timed Out")
+            return self._retry_policy.run(attempt, deadline)
+        except DeadlineExceeded:
+            raise
+        except socket.timeout as e:
+            if self._deadline_passed():
+                raise DeadlineExceeded("Deadline exceeded") from e
+            raise
+        finally:
+            if outermost:
+                pushed, self._local.pushed = self._local.pushed, None
+                for message in pushed:
+                    self._apply_push(message)
+
+    def _defer_push(self, message):
+        """Apply a pushed message once the current _transact call is done."""
+        pushed = getattr(self._local, "pushed", None)
+        if pushed is None:
+            self._apply_push(message)
         else:
-            # TODO: this shouldn't return data OR False, handle this better
-            sock.close()
-            LOGGER.info(str(status))
-            match_obj = re.match("\(.*;([^;]+)\)", status)
-            if match_obj:
-                return match_obj.group(1)
-            else:
-                return False
+            pushed.append(message)
+
+    def _connect(self, handler):
+        if self._pool is not None:
+            timeout = self._socket_timeout(self._pool.timeout)
+            # what the device sent since the connection was last used
+            return self._pool.run(
+                self.ip, self.PORT, handler, timeout, on_unread=self._defer_push
+            )
 
-    def _queryraw(self, msg):
-        """An alternate version of query that does not do a default regex match on the results"""
         sock = socket.socket()
-        sock.settimeout(5)
+        sock.settimeout(self._socket_timeout(self.timeout))
+        try:
+            sock.connect((self.ip, self.PORT))
+            return handler(sock)
+        finally:
+            sock.close()
+
+    def _deadline_passed(self):
+        """Return True if this thread's deadline, if any, has passed."""
+        deadline = getattr(self._local, "deadline", None)
+        return deadline is not None and deadline.remaining() <= 0
 
-        sock.connect((self.ip, self.PORT))
-        sock.send(msg.encode("utf-8"))
+    def _socket_timeout(self, timeout):
+        """Return timeout shortened to what is left of the deadline, if any.
 
+        Raises DeadlineExceeded if the deadline has passed.
+        """
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is None:
+            return timeout
+        return deadline.timeout(timeout)
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """Bound the time calls made on this thread within the block take.
+
+        Waiting for other commands to the device, connecting, sending,
+        receiving and retries all count. A call that can't finish in time
+        raises lib.retry.DeadlineExceeded, a socket.timeout. Inside another
+        deadline the earlier of the two applies.
+
+        Example:
+          with fan.deadline(2):
+              fan.speed = 3
+              print(fan.brightness)
+
+        :param seconds: time from now the calls may take in total
+        """
+        previous = getattr(self._local, "deadline", None)
+        deadline = Deadline(seconds)
+        if previous is not None and previous.expires < deadline.expires:
+            deadline = previous
+        self._local.deadline = deadline
         try:
-            status = sock.recv(1048).decode("utf-8")
-            LOGGER.info("Status: " + status)
-        except socket.timeout:
-            LOGGER.error("Socket Timed Out")
+            yield deadline
+        finally:
+            self._local.deadline = previous
+
+    def _send_command(self, msg):
+        """Send a command that has no reply, see coalesce_window."""
+        if self._coalescer is not None:
+            path = response_path(msg)
+            if ";SET;" in path:
+                setting = path.split(";SET;", 1)[0]
+            else:
+                setting = path.rsplit(";", 1)[0]
+            self._coalescer.submit(setting, msg)
         else:
-            # TODO: this shouldn't return data OR False, handle this better
-            sock.close()
-            LOGGER.info(str(status))
-            return status
+            self._write(msg)
+
+    def _write(self, msg):
+        def send(sock):
+            sock.sendall(msg.encode("utf-8"))
+
+        self._transact(send)
+        self._adapt_monitor(changed=True)
+        # forget cached replies for the attribute group written to, i.e.
+        # FAN;SPD;SET;3 affects FAN;SPD;ACTUAL
+        group = ";".join(response_path(msg).split(";")[:2])
+        self._attribute_cache.invalidate_prefix(group + ";")
+        self._attribute_cache.invalidate(group)
+
+    def _cached_reply(self, attribute):
+        """Return the cached raw reply for attribute if its policy allows.
+
+        A value recently set by a command is returned as a reply regardless
+        of the policy, see _update_cache.
+        """
+        written = self._written.get(attribute)
+        if written is not None:
+            if not isinstance(written, str):
+                written = ";".join(written)
+            return "(%s;%s;%s)" % (self.name, attribute, written)
+        ttl = self._policy_ttls[attribute_policy(attribute)]
+        if ttl == 0:
+            return None
+        reply, age = self._attribute_cache.get_stale(attribute)
+        if reply is None or (ttl is not None and age > ttl):
+            return None
+        return reply
+
+    def _remember_reply(self, attribute, message):
+        """Cache a raw reply if attribute's policy allows reusing it."""
+        if self._policy_ttls[attribute_policy(attribute)] == 0:
+            return
+        if match_reply(message, [attribute]):
+            self._attribute_cache.set(attribute, message)
+
+    def _query(self, msg):
+        return last_value(self._queryraw(msg))
+
+    def _queryraw(self, msg):
+        """An alternate version of query that does not do a default regex match on the results"""
+        prefetched = getattr(self._local, "prefetched", None)
+        if prefetched and msg in prefetched:
+            return prefetched[msg]
+        attribute = response_path(msg)
+        cached = self._cached_reply(attribute)
+        if cached is not None:
+            return cached
+
+        def query(sock):
+            sock.sendall(msg.encode("utf-8"))
+            framer = MessageFramer()
+            while True:
+                # a timeout is raised, and retried by the retry policy
+                messages = self._recv_messages(sock, framer)
+                if not messages:
+                    return ""
+                for message in messages:
+                    LOGGER.info("Status: " + message)
+                    if match_reply(message, [attribute]):
+                        return message
+                    # devices send changes on every open connection, pooled
+                    # ones included, never take one for the reply
+                    self._defer_push(message)
+
+        status = self._transact(query)
+        if status:
+            self._remember_reply(attribute, status)
+        return status
+
+    def _pipeline(self, commands):
+        """Send GET commands back to back and collect the replies.
+
+        :param commands: list of GET commands, including the device name
+        :return: dict of command to its raw reply, commands whose reply did
+            not arrive before the socket timed out are left out
+        """
+
+        def exchange(sock):
+            pending = {response_path(command): command for command in commands}
+            replies = {}
+            sock.sendall("".join(commands).encode("utf-8"))
+            framer = MessageFramer()
+            while pending:
+                try:
+                    messages = self._recv_messages(sock, framer)
+                except socket.timeout:
+                    LOGGER.debug("Socket Timed Out")
+                    break
+                if not messages:
+                    break
+                for message in messages:
+                    LOGGER.info("Status: " + message)
+                    path = match_reply(message, pending)
+                    if path:
+                        replies[pending.pop(path)] = message
+                        self._remember_reply(path, message)
+            return replies
+
+        return self._transact(exchange)
 
     def send_raw(self, msg):
         """Send a raw command. Device name is not included.
 
-        Return list of results.
-        Sometimes multiple results come in at between iterations and they end
-        up on the same string
+        Return list of results, one complete (...) message per item.
 
         :param msg: command to send
         :return: list of responses as str
         """
-        sock = socket.socket()
-        sock.settimeout(5)
 
-        sock.connect((self.ip, self.PORT))
-        sock.send(msg.encode("utf-8"))
+        def send(sock):
+            sock.sendall(msg.encode("utf-8"))
+
+            framer = MessageFramer()
+            messages = []
+            timeout_occurred = False
+            while True:
+                try:
+                    received = self._recv_messages(sock, framer)
+                except DeadlineExceeded:
+                    raise
+                except socket.timeout:
+                    LOGGER.info("Socket Timed Out")
+                    # most likely this means no more data, give it one more iter
+                    if timeout_occurred:
+                        break
+                    else:
+                        timeout_occurred = True
+                else:
+                    if not received:
+                        break
+                    LOGGER.info("Status: " + "".join(received))
+                    messages.extend(received)
+            return messages
+
+        return self._transact(send)
+
+    def _read_burst(self, sock, profile, on_message=None, preempt=None):
+        """Read a burst of replies, such as a GETALL dump, until it is over.
+
+        Without anything learned yet this waits for the socket to time out
+        twice, like send_raw. Once profile has seen a burst, reading stops
+        as soon as every attribute the device reliably sends has arrived, or
+        when the line has been quiet for the learned idle timeout. If the
+        line goes quiet with expected attributes still missing one more
+        full socket timeout is allowed before giving up.
+
+        :param sock: connected socket the request was sent on
+        :param profile: BurstProfile for this kind of request
+        :param on_message: optional callable, called with each message as it
+            arrives
+        :param preempt: optional callable, if it returns True reading stops
+            and Preempted is raised, leaving the socket mid-burst
+        :return: list of messages
+        """
+        timeout = sock.gettimeout()
+        reader = BurstReader(profile, timeout)
+        try:
+            while True:
+                sock.settimeout(reader.next_timeout())
+                try:
+                    if preempt is not None:
+                        self._wait_readable(sock, preempt)
+                    received = self._recv_messages(sock, reader.framer)
+                except DeadlineExceeded:
+                    raise
+                except socket.timeout:
+                    # out of time rather than at the end of the burst
+                    self._socket_timeout(None)
+                    if reader.timed_out():
+                        break
+                    LOGGER.info("Socket Timed Out")
+                    continue
+                if not received:
+                    break
+                for message in received:
+                    LOGGER.info("Status: " + message)
+                    if on_message:
+                        on_message(message)
+                if reader.received(received):
+                    break
+                if preempt is not None and preempt():
+                    LOGGER.debug(
+                        "Burst preempted after %d messages", len(reader.messages)
+                    )
+                    raise Preempted()
+        finally:
+            sock.settimeout(timeout)
+        return reader.finish()
+
+    def _wait_readable(self, sock, preempt):
+        """Wait up to the socket's timeout for something to read.
+
+        preempt() is checked every PREEMPT_CHECK seconds while waiting, so
+        a burst sitting out a timeout gives way as quickly as one that is
+        streaming.
+
+        Raises Preempted if preempt() returns True, socket.timeout if nothing
+        arrives in time.
+        """
+        end = time.monotonic() + self._socket_timeout(sock.gettimeout())
+        while True:
+            if preempt():
+                LOGGER.debug("Burst preempted while waiting for replies")
+                raise Preempted()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("timed out")
+            readable, _, _ = select.select(
+                [sock], [], [], min(remaining, self.PREEMPT_CHECK)
+            )
+            if readable:
+                return
+
+    def _recv_messages(self, sock, framer):
+        """Receive until framer has at least one complete message.
 
-        messages = []
-        timeout_occurred = False
+        Raises socket.timeout if the socket times out first, or
+        DeadlineExceeded if the deadline passes.
+
+        :return: list of messages, empty if the device closed the connection
+        """
+        buffer = bytearray(4096)
+        view = memoryview(buffer)
         while True:
-            try:
-                recv = sock.recv(1048).decode("utf-8")
-                LOGGER.info("Status: " + recv)
-                messages.append(recv)
-            except socket.timeout:
-                LOGGER.info("Socket Timed Out")
-                # most likely this means no more data, give it one more iter
-                if timeout_occurred:
-                    break
-                else:
-                    timeout_occurred = True
-            else:
-                LOGGER.info(str(recv))
-        sock.close()
-        return messages
+            sock.settimeout(self._socket_timeout(sock.gettimeout()))
+            size = sock.recv_into(buffer)
+            if not size:
+                return []
+            messages = framer.feed(view[:size])
+            if messages:
+                return messages
+
+    def _set(self, msg, attribute, value):
+        """Send a command setting attribute to value and update the cache.
+
+        With suppress_redundant_writes the command isn't sent if attribute is
+        known to hold value already, unless forced with set_property.
+        """
+        if (
+            self._suppress_age is not None
+            and not getattr(self._local, "force", False)
+            and self._known_value(attribute) == value
+        ):
+            LOGGER.debug("%s is already %s, not sending it" % (attribute, value))
+            with self._suppressed_lock:
+                self._suppressed[attribute] += 1
+            return
+        self._send_command(msg)
+        self._update_cache(attribute, value)
+
+    def _known_value(self, attribute):
+        """Return the value of attribute if the cache has it fresh, else None.
+
+        Fresh is no older than suppress_redundant_writes seconds. Values
+        only implied by writes to other attributes aren't known, the device
+        may not have followed.
+        """
+        if attribute in self._implied:
+            return None
+        max_age = self._suppress_age
+        written, age = self._written.get_stale(attribute)
+        if written is not None and age <= max_age:
+            return written
+        reply, age = self._attribute_cache.get_stale(attribute)
+        if reply is not None and age <= max_age:
+            return parse_attribute(reply_body(reply))[1]
+        value, age = self._hot_values.get_stale(attribute)
+        if value is not None and age <= max_age:
+            return value
+        snapshot = self._all_cache
+        age = self.cache_age
+        if self._monitoring and snapshot and age is not None and age <= max_age:
+            return snapshot.get(attribute)
+        return None
+
+    @property
+    def suppressed_writes(self):
+        """Dict of attribute to the number of writes to it not sent.
+
+        See suppress_redundant_writes.
+        """
+        with self._suppressed_lock:
+            return dict(self._suppressed)
+
+    def set_property(self, prop, value, force=False):
+        """Set a property, like setattr, optionally forcing the write.
+
+        Example:
+          fan.set_property("speed", 3, force=True)
+
+        :param prop: property name
+        :param value: value to set
+        :param force: send the command even if suppress_redundant_writes
+            would skip it
+        """
+        self._local.force = force
+        try:
+            setattr(self, prop, value)
+        finally:
+            self._local.force = False
 
     def _update_cache(self, attribute, value):
         """Update an attribute in the cache with a new value.
 
         Allows the cache to keep up with changes made by _send_command().
-        Looks for attribute changes that affect other attributes and
-        updates them too.
+        Attributes the change affects, by known_attribs.DEPENDENCIES, are
+        updated too. The values are applied to the GETALL snapshot, if there
+        is one, and returned by reads for write_ttl seconds, monitored or
+        not, until the device is read again.
 
         :param attribute: cache attribute to update
-        :param value: new attribute value
-        """
-        if self._monitoring and self._all_cache:
-            # update cache attribute with new value
-            self._all_cache[attribute] = value
-            # check for attribute changes that affect other attributes
-            # this list is not exhaustive and there may be other attributes
-            # with the propensity to affect it's neighbors
-            if attribute == "FAN;PWR":
-                # changes to fan power also affects fan speed and whoosh
-                if value == "OFF":
-                    self._all_cache["FAN;SPD;ACTUAL"] = "0"
-                    self._all_cache["FAN;WHOOSH;STATUS"] = "OFF"
-            elif attribute == "FAN;SPD;ACTUAL":
-                # changes to fan speed also affects fan power and whoosh status
-                if int(value) == 0:
-                    self._all_cache["FAN;PWR"] = "OFF"
-                    self._all_cache["FAN;WHOOSH;STATUS"] = "OFF"
-                else:
-                    self._all_cache["FAN;PWR"] = "ON"
-            elif attribute == "LIGHT;PWR":
-                # changes to light power also affects light brightness
-                if value == "OFF":
-                    self._all_cache["LIGHT;LEVEL;ACTUAL"] = "0"
-            elif attribute == "LIGHT;LEVEL;ACTUAL":
-                # changes to light brightness also changes light power
-                if int(value) > 0:
-                    self._all_cache["LIGHT;PWR"] = "ON"
-                else:
-                    self._all_cache["LIGHT;PWR"] = "OFF"
+        :param value: new attribute value, as the device reports it
+        """
+        values = {}
+        unknown = []
+        for name, implied in implied_values(attribute, value).items():
+            if implied is None:
+                # no longer known, read it from the device
+                unknown.append(name)
+                self._written.invalidate(name)
+                self._hot_values.invalidate(name)
+                continue
+            values[name] = implied
+            self._unknown.discard(name)
+            if name == attribute:
+                self._implied.discard(name)
+            else:
+                self._implied.add(name)
+            if self._write_ttl:
+                self._written.set(name, implied)
+        if unknown:
+            self._unknown.update(unknown)
+            self._get_all_request.cache.update(
+                ((), ()), functools.partial(_without_replies, unknown)
+            )
+        self._commit(values, LOCAL, removed=unknown)
+
+    def _commit(self, values, source, replace=False, removed=()):
+        """Apply values to the GETALL snapshot and tell subscribers what changed.
+
+        Every change to the snapshot goes through here so the difference is
+        worked out once, whatever it came from. The snapshot itself is never
+        modified, a new one is made and swapped in, so readers don't need a
+        lock and never see half an update.
+
+        :param values: dict of attribute to value
+        :param source: what the values came from, GETALL, POLL, PUSH or LOCAL
+        :param replace: values are a whole new snapshot rather than updates.
+            Updates are dropped if there is no snapshot yet.
+        :param removed: attributes to drop from the snapshot, when updating
+        :return: the current snapshot, or None if there is none
+        """
+        missing = object()
+        with self._commit_lock:
+            previous = self._all_cache
+            if previous is None:
+                if replace:
+                    self._all_cache = Snapshot(values, 1)
+                # nothing known to compare with
+                return self._all_cache
+            changes = [
+                (attribute, previous.get(attribute), value)
+                for attribute, value in values.items()
+                if previous.get(attribute, missing) != value
+            ]
+            if replace:
+                removed = [
+                    attribute for attribute in previous if attribute not in values
+                ]
+            changes.extend(
+                (attribute, previous[attribute], None)
+                for attribute in removed
+                if attribute in previous
+            )
+            if not changes:
+                return previous
+            if replace:
+                self._all_cache = previous.replaced(values)
+            else:
+                self._all_cache = previous.updated(values, removed)
+            current = self._all_cache
+        self._notify_changes(changes, source)
+        return current
+
+    def _notify_changes(self, changes, source):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for attribute, old, new in changes:
+            LOGGER.debug("%s: %s changed from %s to %s" % (source, attribute, old, new))
+            for callback, attributes in subscribers:
+                if attributes is not None and attribute not in attributes:
+                    continue
+                try:
+                    callback(attribute, old, new, source)
+                except Exception:
+                    LOGGER.exception("Subscriber error")
+
+    def subscribe(self, callback, attributes=None):
+        """Call callback(attribute, old, new, source) when a value changes.
+
+        Changes are seen in the cache, so they come from monitor refreshes
+        (GETALL), its fast tier (POLL), pushed messages (PUSH) and commands
+        sent by this object (LOCAL), which are applied as soon as they are
+        sent. Changes are only reported once there is a GETALL snapshot to
+        compare with, start_monitor() keeps one. Callbacks run on the thread
+        that made the change and should be quick.
 
-    @MWT(timeout=45)
+        Example:
+          fan.subscribe(print, ["FAN;SPD;ACTUAL", "SNSROCC;STATUS"])
+          FAN;SPD;ACTUAL 3 4 poll
+
+        :param callback: function taking attribute, old value, new value and
+            source. old or new is None if the attribute wasn't, or no
+            longer is, in the snapshot.
+        :param attributes: attributes to report, default all
+        """
+        attributes = None if attributes is None else frozenset(attributes)
+        with self._subscribers_lock:
+            self._subscribers.append((callback, attributes))
+
+    def unsubscribe(self, callback):
+        """Stop calling callback."""
+        with self._subscribers_lock:
+            self._subscribers = [
+                (subscriber, attributes)
+                for subscriber, attributes in self._subscribers
+                if subscriber != callback
+            ]
+
+    @CachedMethod(
+        ttl=45,
+        maxsize=1,
+        wait_timeout=lambda self: self._socket_timeout(None),
+        # stale-while-revalidate refreshes give way like the monitor's
+        revalidate=lambda self, load: self._in_background(load),
+    )
     def _get_all_request(self):
         """Get all parameters from device, returns as a list."""
-        results = self.send_raw("<%s;GETALL>" % self.name)
-        # sometimes this gets two sections in one string:
-        # join list to str, clean up (), and split back to a list
-        results = "||".join(results).replace(")(", ")||(")
-        return results.replace("(", "").replace(")", "").split("||")
+        msg = "<%s;GETALL>" % self.name
+
+        def get_all(sock):
+            sock.sendall(msg.encode("utf-8"))
+            return self._read_burst(
+                sock,
+                self._getall_profile,
+                self._notify_getall,
+                self._commands.preempt_requested,
+            )
+
+        self._getall_running.set()
+        try:
+            results = self._transact(get_all)
+        finally:
+            self._getall_running.clear()
+        for result in results:
+            attribute, _ = parse_attribute(reply_body(result))
+            self._remember_reply(attribute, result)
+        # strip the enclosing ()
+        return [result[1:-1] for result in results]
+
+    def _notify_getall(self, message):
+        """Pass a GETALL reply to iter_all listeners as it arrives."""
+        with self._getall_listeners_lock:
+            listeners = list(self._getall_listeners)
+        for listener in listeners:
+            listener(message)
+
+    def iter_all(self):
+        """Yield (attribute, value) pairs of a GETALL as they arrive.
+
+        Attributes and values are as in flat_dict. If the GETALL is cached
+        the cached values are yielded straight away.
+
+        The GETALL runs in a background thread. Stopping iteration early
+        doesn't stop it, the rest of the dump still fills the cache.
+
+        Example:
+          for attribute, value in fan.iter_all():
+              print(attribute, value)
+        """
+        pairs = queue.Queue()
+        finished = object()
+
+        def on_message(message):
+            pairs.put(parse_attribute(reply_body(message)))
+
+        def run():
+            try:
+                result = self._get_all()
+            except Exception as e:
+                pairs.put((finished, e))
+            else:
+                pairs.put((finished, result))
+            finally:
+                self._remove_getall_listener(on_message)
+
+        with self._getall_listeners_lock:
+            self._getall_listeners.append(on_message)
+        try:
+            threading.Thread(target=run, daemon=True).start()
+            seen = set()
+            while True:
+                attribute, value = pairs.get()
+                if attribute is finished:
+                    break
+                if attribute not in seen:
+                    seen.add(attribute)
+                    yield attribute, value
+            if isinstance(value, Exception):
+                raise value
+            # cached results, or anything missed while streaming
+            for attribute, result in value.items():
+                if attribute not in seen:
+                    yield attribute, result
+        finally:
+            self._remove_getall_listener(on_message)
+
+    def _remove_getall_listener(self, listener):
+        with self._getall_listeners_lock:
+            if listener in self._getall_listeners:
+                self._getall_listeners.remove(listener)
 
     def _get_all(self):
         """Get all parameters from the fan <%s;GETALL>.
@@ -968,42 +1798,179 @@ class SenseMe:
         Suggested way to get to this data is to use the get_attribute method.
         Requesting the desired parameter.
 
-        This data is cached for 30 seconds to avoid the ten seconds it takes to
-        run and to reduce requests sent to the fan.
+        This data is cached for 45 seconds to avoid the time it takes to run
+        and to reduce requests sent to the fan. Concurrent callers share a
+        single request.
 
         :return: List of [almost] all fan data.
         """
         # if monitor running, send cache, if not do request
-        if self._monitoring and self._all_cache:
-            return self._all_cache
+        snapshot = self._all_cache
+        if self._monitoring and snapshot:
+            return snapshot
         else:
             return self._get_all_bare()
 
-    def _get_all_bare(self):
+    def _refresh_all(self):
+        """Fetch GETALL regardless of the cache, used by the monitor."""
+        previous = self._all_cache
+        current = self._get_all_bare(refresh=True)
+        if previous is not None:
+            # _commit keeps the snapshot if nothing changed
+            self._adapt_monitor(changed=current is not previous)
+        return current
+
+    def _adapt_monitor(self, changed):
+        """Move the monitor frequency within its bounds, if it adapts."""
+        if self._monitor_interval is None:
+            return
+        interval = self._monitor_interval.record(changed)
+        job = self._monitor_job
+        if job is not None and interval != job.interval:
+            LOGGER.debug("Monitor frequency now %.1f seconds" % interval)
+            job.set_interval(interval)
+
+    def _get_all_replies(self, refresh=False):
+        """Return the GETALL replies, from the cache unless refresh.
+
+        Waiting for a GETALL another thread runs is bounded by the deadline,
+        if one is set, and raises DeadlineExceeded once it has passed.
+        """
+        try:
+            if refresh:
+                return self._get_all_request.refresh()
+            return self._get_all_request()
+        except DeadlineExceeded:
+            raise
+        except socket.timeout as e:
+            if self._deadline_passed():
+                raise DeadlineExceeded("Deadline exceeded waiting for GETALL") from e
+            raise
+
+    def _get_all_bare(self, refresh=False):
         res_dict = {}
-        results = self._get_all_request()
-        for result in results:
+        for result in self._get_all_replies(refresh):
             # remove device name i.e Living Room Fan
             _, result = result.split(";", 1)
+            attribute, value = parse_attribute(result)
+            res_dict[attribute] = value
+        self._unknown.difference_update(res_dict)
+        # the GETALL may have been fetched before the latest commands
+        fetched_age = self.cache_age or 0
+        overlaid = set()
+        for attribute, value, age in self._written.items():
+            if age < fetched_age:
+                res_dict[attribute] = value
+                overlaid.add(attribute)
+        # the rest of the implied values gave way to what the device reported
+        self._implied.intersection_update(overlaid)
+        # keep what the fast tier read that GETALL doesn't include
+        for attribute, value, _ in self._hot_values.items():
+            res_dict.setdefault(attribute, value)
+        return self._commit(res_dict, GETALL, replace=True)
+
+    def _get_query(self, attribute):
+        """Return the GET command body that reads attribute.
 
-            # handle these manually due to multiple values in result
-            # FAN and LIGHT both have BOOKENDS attributes
-            if "BOOKENDS" in result:
-                device, low, high = result.rsplit(";", 2)
-                res_dict[device] = (low, high)
-            elif "NW;PARAMS;ACTUAL" in result:
-                # ip, subnet, gateway
-                res_dict["NW;PARAMS;ACTUAL"] = (result.rsplit(";", 3))[1:]
-            else:
-                category, value = result.rsplit(";", 1)
-                res_dict[category] = value
-        self._all_cache = res_dict
-        return res_dict
+        Example:
+          _get_query('FAN;SPD;ACTUAL')
+          'FAN;SPD;GET;ACTUAL'
+        """
+        for query in self._LIVE_QUERIES.values():
+            if response_path("<ALL;%s>" % query) == attribute:
+                return query
+        for query in self._PIPELINE_QUERIES.values():
+            if response_path("<ALL;%s>" % query) == attribute:
+                return query
+        head, _, last = attribute.rpartition(";")
+        if head and last in self._GET_QUALIFIERS:
+            return "%s;GET;%s" % (head, last)
+        return attribute + ";GET"
+
+    def _refresh_hot(self):
+        """Read the hot attributes and merge them into the cache.
+
+        Used by the fast tier of the monitor, the GETs are pipelined on one
+        connection. Skipped while a GETALL runs, it reads them too and would
+        otherwise be preempted by every poll. Attributes the device leaves
+        unanswered HOT_MISS_LIMIT times in a row are dropped from
+        hot_attributes, a device without an occupancy sensor never answers
+        for SNSROCC;STATUS.
+        """
+        if self._getall_running.is_set():
+            LOGGER.debug("GETALL running, skipping the hot attributes")
+            return {}
+        commands = {
+            "<%s;%s>" % (self.name, self._get_query(attribute)): attribute
+            for attribute in self.hot_attributes
+        }
+        replies = self._pipeline(list(commands))
+        values = {}
+        for command, attribute in commands.items():
+            reply = replies.get(command)
+            if reply is None:
+                self._hot_misses[attribute] += 1
+                if self._hot_misses[attribute] >= self.HOT_MISS_LIMIT:
+                    LOGGER.info(
+                        "%r doesn't answer for %s, no longer polling it"
+                        % (self, attribute)
+                    )
+                    self.hot_attributes.remove(attribute)
+                continue
+            self._hot_misses.pop(attribute, None)
+            attribute, value = parse_attribute(reply_body(reply))
+            values[attribute] = value
+        self._merge_values(values, POLL)
+        return values
+
+    def _merge_values(self, values, source):
+        """Apply attribute values read outside of GETALL to the cache."""
+        for attribute in values:
+            # the device has been heard from since the write
+            self._written.invalidate(attribute)
+            self._unknown.discard(attribute)
+            self._implied.discard(attribute)
+        self._commit(values, source)
+        for attribute, value in values.items():
+            if attribute in self.hot_attributes:
+                self._hot_values.set(attribute, value)
+
+    def _apply_push(self, message):
+        """Apply a message the device sent on its own, see start_push."""
+        if not message.startswith("(%s;" % self.name):
+            return
+        try:
+            attribute, value = parse_attribute(reply_body(message))
+        except (IndexError, ValueError):
+            LOGGER.debug("Ignoring pushed message %s" % message)
+            return
+        LOGGER.debug("Pushed: %s" % message)
+        self._apply_reply(attribute, value, message, PUSH)
+
+    def _apply_reply(self, attribute, value, message, source):
+        """Apply a reply read outside of GETALL to the caches."""
+        self._remember_reply(attribute, message)
+        if not self._monitoring:
+            # the snapshot is rebuilt from the cached GETALL when not
+            # monitoring, so it has to follow pushes too
+            self._get_all_request.cache.update(
+                ((), ()), functools.partial(_replace_reply, attribute, message[1:-1])
+            )
+        self._merge_values({attribute: value}, source)
 
-    def get_attribute(self, attribute):
+    @property
+    def cache_age(self):
+        """Seconds since the cached GETALL was fetched, None if there is none.
+
+        With stale_while_revalidate this may be past the 45 second cache
+        timeout while a refresh runs in the background.
+        """
+        return self._get_all_request.cache.age(((), ()))
+
+    def get_attribute(self, attribute, early_exit=False):
         """Given a string in the format NW;PARAMS;ACTUAL return parameter value.
 
-        There is a 30 second cache on the GETALL that this pulls from to speed
+        There is a 45 second cache on the GETALL that this pulls from to speed
         things up and to avoid hammering the fan with requests.
 
         Raises KeyError if key doesn't exist
@@ -1014,16 +1981,48 @@ class SenseMe:
         way as it returns within a second, as where this will usually take ten
         seconds if not cached.
 
+        Attributes the cache policies in known_attribs mark as IMMUTABLE or
+        SLOW are returned from earlier replies while young enough, even
+        after the GETALL cache expired. NEVER_CACHE attributes are always
+        read from the device.
+
+        With early_exit the value is returned as soon as it arrives rather
+        than after the whole GETALL, the rest of the GETALL goes on in the
+        background and fills the cache.
+
         Example:
           get_attribute('NW;PARAMS;ACTUAL')
           ['192.168.1.50', '255.255.255.0', '192.168.1.1']
         :param attribute: The attribute you seek
+        :param early_exit: return as soon as the attribute arrives
         :return: The value you find
         """
-        if attribute == "SNSROCC;STATUS":  # doesn't get retrieved in get_all
-            return self._query("<%s;SNSROCC;STATUS;GET>" % self.name)
+        if attribute in self._LIVE_QUERIES:  # don't get retrieved in get_all
+            # allow for one late read of the fast tier
+            value, age = self._hot_values.get_stale(attribute)
+            if value is not None and age <= 2 * self.hot_frequency:
+                return value
+            return self._query("<%s;%s>" % (self.name, self._LIVE_QUERIES[attribute]))
+
+        cached = self._cached_reply(attribute)
+        if cached is not None:
+            return parse_attribute(reply_body(cached))[1]
+        if attribute_policy(attribute) == NEVER_CACHE:
+            return self._get_all_bare(refresh=True)[attribute]
+        elif early_exit:
+            for key, value in self.iter_all():
+                if key == attribute:
+                    return value
+            raise KeyError(attribute)
         else:
             response_dict = self._get_all()
+        if attribute not in response_dict and attribute in self._unknown:
+            # dropped from the cache by a write, see _update_cache
+            reply = self._queryraw("<%s;%s>" % (self.name, self._get_query(attribute)))
+            if reply:
+                _, value = parse_attribute(reply_body(reply))
+                self._apply_reply(attribute, value, reply, POLL)
+                return value
         return response_dict[attribute]
 
     def _get_all_nested(self):
@@ -1036,16 +2035,7 @@ class SenseMe:
             else:
                 existing[key] = value
 
-        results = self._get_all_request()
-        # fix double results
-        extra_rows = []
-        for result in results:
-            if ")(" in result:
-                halves = result.split(")(")
-                # result = result.replace(halves[1], ')')
-                extra_rows.append(halves[1])
-        results.extend(extra_rows)
-        cleaned = [x.replace("(", "").replace(")", "") for x in results]
+        cleaned = list(self._get_all_replies())
 
         for idx, result in enumerate(cleaned):
             if "BOOKENDS" in result:
@@ -1079,7 +2069,17 @@ class SenseMe:
     @property
     def flat_dict(self):
         """Export all fan details as a flat dict."""
-        return self._get_all()
+        return dict(self._get_all())
+
+    @property
+    def snapshot(self):
+        """The latest lib.Snapshot of all fan details, or None.
+
+        Snapshots never change, so values read from one are consistent with
+        each other even while the monitor or a setter makes a newer one. Its
+        version grows with every change.
+        """
+        return self._all_cache
 
     @staticmethod
     def _parse_values(line):
@@ -1097,115 +2097,401 @@ class SenseMe:
         """
         if not self._monitoring:
             self._monitoring = True
-            self._background_monitor.start()
+            interval = self.monitor_frequency
+            if self._monitor_interval is not None:
+                interval = self._monitor_interval.interval
+            self._monitor_job = self._scheduler.schedule(
+                functools.partial(self._in_background, self._refresh_all), interval
+            )
+            if self.hot_attributes:
+                # a few short GETs, in the interactive lane so they don't
+                # wait behind other commands, skipped while a GETALL runs
+                self._hot_job = self._scheduler.schedule(
+                    self._refresh_hot, self.hot_frequency
+                )
+
+    def _in_background(self, action):
+        """Call action with its commands queued behind everyone else's.
+
+        A GETALL it runs gives way to other commands as they come, see
+        lib.CommandQueue.
+        """
+        self._local.priority = BACKGROUND
+        try:
+            return action()
+        finally:
+            self._local.priority = INTERACTIVE
+
+    def start_push(self, listener=None):
+        """Apply messages the device sends on its own to the cache.
+
+        Changes made from a wall control or the app are seen as they happen
+        rather than at the next monitor refresh. The monitor is still
+        suggested, with a long monitor_frequency, as a consistency check for
+        messages that were missed.
+
+        :param listener: a push.PushListener, default the one shared by all
+            devices, holding a connection to each device from a single thread
+        """
+        if self._push_listener is not None:
+            return
+        self._push_listener = listener or default_push_listener()
+        self._push_listener.add(self)
+
+    def stop_push(self):
+        """Stop applying pushed messages."""
+        if self._push_listener is not None:
+            self._push_listener.remove(self)
+            self._push_listener = None
 
     def stop_monitor(self):
         """Stop the monitor."""
         self._monitoring = False
-        self._background_monitor.stop()
+        if self._monitor_job is not None:
+            self._monitor_job.cancel()
+            self._monitor_job = None
+        if self._hot_job is not None:
+            self._hot_job.cancel()
+            self._hot_job = None
+            self._hot_values.clear()
+
+    def _identify_from_cache(self, ip="", name=""):
+        """Take name, ip, mac, etc. from the identity cache.
 
-    def discover_single_device(self):
+        The remembered identity is only used if the device at its last IP
+        still answers with the same name and MAC.
+
+        :return: True if the identity was found and confirmed
+        """
+        if self._identity_cache is None:
+            return False
+        remembered = self._identity_cache.find(name=name, ip=ip)
+        if remembered is None:
+            return False
+        identity = probe(remembered["ip"])
+        if identity is None or identity[:2] != (remembered["name"], remembered["mac"]):
+            LOGGER.info("Remembered identity of %s is out of date", remembered["name"])
+            return False
+        self.ip = remembered["ip"]
+        self.name, self.mac, self.model, self.series = identity
+        self.details = ""
+        self._identity_cache.store(
+            self.name, self.mac, self.model, self.series, self.ip
+        )
+        return True
+
+    def discover_single_device(self, name="", ip="", time_to_wait=5, interfaces=None):
         """Discover a single device.
 
         Called during __init__ if the device name or IP address is missing.
 
-        This function will discover only the first device to respond if both
-        name and IP were not provided on instantiation. If there is only one
+        This function will discover only the first device to respond, or the
+        first matching name or ip if either was given. If there is only one
         device in the home this will work well. Otherwise, use the discover
         function of the module rather than this one.
-        """
-        data = "<ALL;DEVICE;ID;GET>".encode("utf-8")
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.bind(("", 0))
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        LOGGER.debug("Sending broadcast.")
-        s.sendto(data, ("<broadcast>", self.PORT))
 
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        LOGGER.debug("Listening...")
+        :param name: only accept a device with this name
+        :param ip: only accept a device at this address
+        :param time_to_wait: seconds to wait for an answer before raising
+            OSError
+        :param interfaces: interface names or address/prefix strings to
+            broadcast on, default all local interfaces
+        """
+        replies = _broadcast_device_id(time_to_wait, interfaces=interfaces)
         try:
-            s.bind(("", self.PORT))
-        except OSError as e:
+            for reply_ip, identity, details, interface in replies:
+                if (name and identity[0] != name) or (ip and reply_ip != ip):
+                    continue
+                self.details = details
+                self.name, self.mac, self.model, self.series = identity
+                self.ip = reply_ip
+                self.interface = interface
+                LOGGER.info("Found %s at %s" % (self.name, self.ip))
+                return
+        except OSError:
             # Address already in use
             LOGGER.exception(
                 "Port is in use or could not be opened." "Is another instance running?"
             )
             raise
-        else:
-            try:
-                m = s.recvfrom(1024)
-                LOGGER.info(m)
-                if not m:
-                    LOGGER.error("Didn't receive response.")
-                else:
-                    self.details = m[0].decode("utf-8")
-                    res = re.match("\((.*);DEVICE;ID;(.*);(.*),(.*)\)", self.details)
-                    # TODO: Parse this properly rather than regex
-                    self.name = res.group(1)
-                    self.mac = res.group(2)
-                    self.model = res.group(3)
-                    self.series = res.group(4)
-                    self.ip = m[1][0]
-
-                    LOGGER.info(self.name, self.mac, self.model, self.series)
-            except OSError as e:
-                LOGGER.critical("No device was found.\n%s" % e)
-                raise OSError
-
-
-def discover(devices_to_find=6, time_to_wait=5):
-    """Discover SenseMe devices.
+        finally:
+            replies.close()
+        LOGGER.critical("No device was found.")
+        raise OSError("No device was found")
 
-    :return: List of discovered SenseMe devices.
-    """
-    port = 31415
 
+def _without_replies(attributes, results):
+    """Return GETALL results without those for attributes."""
+    return [
+        result
+        for result in results
+        if parse_attribute(result.split(";", 1)[1])[0] not in attributes
+    ]
+
+
+def _replace_reply(attribute, reply, results):
+    """Return GETALL results with reply in place of those for attribute.
+
+    :param reply: reply without the enclosing (), as in the results
+    """
+    return _without_replies([attribute], results) + [reply]
+
+
+def _broadcast_device_id(
+    time_to_wait=5, resend_interval=0.25, interfaces=None, stopped=None
+):
+    """Broadcast <ALL;DEVICE;ID;GET> and yield replies the moment they arrive.
+
+    The broadcast goes to the directed broadcast address of every interface
+    at once, or to <broadcast> if no interface is known. It is sent again
+    after resend_interval seconds, then at doubling intervals, to catch
+    devices whose reply or request was lost. Devices answer every broadcast
+    so the same device is usually yielded more than once.
+
+    :param time_to_wait: seconds to listen before stopping
+    :param resend_interval: seconds before the first resend, None to send
+        only once
+    :param interfaces: interface names, address/prefix strings or
+        lib.Interfaces to broadcast on, None for all local interfaces
+    :param stopped: optional threading.Event, listening ends soon after it
+        is set
+    :return: generator of (ip, (name, mac, model, series), details,
+        interface) tuples, details being the whole datagram as text and
+        interface the lib.Interface whose network the reply came from, or
+        None
+    """
+    interfaces = resolve_interfaces(interfaces)
+    targets = [interface.broadcast for interface in interfaces] or ["<broadcast>"]
     data = "<ALL;DEVICE;ID;GET>".encode("utf-8")
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.bind(("", port))
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    LOGGER.debug("Sending broadcast.")
-    s.sendto(data, ("<broadcast>", port))
-    LOGGER.debug("Listening...")
-    devices = []
-    start_time = time.time()
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    selector = selectors.DefaultSelector()
+    try:
+        try:
+            sock.bind(("", SenseMe.PORT))
+        except OSError:
+            raise OSError("Couldn't get port %s" % SenseMe.PORT)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+
+        now = time.monotonic()
+        deadline = now + time_to_wait
+        next_send = now
+        interval = resend_interval
+        while now < deadline:
+            if stopped is not None and stopped.is_set():
+                LOGGER.debug("Stopped listening")
+                return
+            if next_send is not None and now >= next_send:
+                _send_broadcasts(sock, data, targets)
+                if interval:
+                    next_send = now + interval
+                    interval *= 2
+                else:
+                    next_send = None
+            wake = deadline if next_send is None else min(deadline, next_send)
+            if stopped is not None:
+                wake = min(wake, now + SenseMe.PREEMPT_CHECK)
+            if selector.select(max(0, wake - time.monotonic())):
+                while True:
+                    try:
+                        datagram, address = sock.recvfrom(1024)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    LOGGER.info("Received a message")
+                    # our own broadcast comes back too, it has no device ids
+                    for identity in parse_device_ids(datagram):
+                        details = datagram.decode("utf-8", "replace")
+                        interface = interface_of(address[0], interfaces)
+                        yield address[0], identity, details, interface
+            now = time.monotonic()
+        LOGGER.debug("time_to_wait exceeded")
+    finally:
+        selector.close()
+        sock.close()
+
+
+def probe(ip, timeout=1):
+    """Ask the device at ip who it is, over TCP.
+
+    :param ip: IP address to probe
+    :param timeout: seconds to wait for the connection and the reply
+    :return: tuple of (name, mac, model, series), or None if there was no
+        device id reply in time
+    """
+    deadline = time.monotonic() + timeout
+    sock = socket.socket()
+    sock.settimeout(timeout)
+    framer = MessageFramer()
     try:
-        s.bind(("", port))
-        s.settimeout(2)
+        sock.connect((ip, SenseMe.PORT))
+        sock.sendall("<ALL;DEVICE;ID;GET>".encode("utf-8"))
         while True:
-            try:
-                message = s.recvfrom(1024)
-            except OSError:
-                # timeout occurred
-                message = b""
-            if message:
-                LOGGER.info("Received a message")
-                message_decoded = message[0].decode("utf-8")
-                res = re.match("\((.*);DEVICE;ID;(.*);(.*),(.*)\)", message_decoded)
-                # TODO: Parse this properly rather than regex
-                name = res.group(1)
-                mac = res.group(2)
-                model = res.group(3)
-                series = res.group(4)
-                ip = message[1][0]
-                devices.append(
-                    SenseMe(ip=ip, name=name, model=model, series=series, mac=mac)
-                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            data = sock.recv(1024)
+            if not data:
+                return None
+            for message in framer.feed(data):
+                identity = parse_device_id(message)
+                if identity:
+                    return identity
+    except OSError as e:
+        LOGGER.debug("Probe of %s failed: %s" % (ip, e))
+        return None
+    finally:
+        sock.close()
+
+
+def _confirm_identities(identity_cache):
+    """Probe every remembered device at its last IP, all at once.
+
+    :return: tuple of (list of SenseMe for the devices that still answer with
+        the same name and MAC, number of devices that didn't)
+    """
+    remembered = identity_cache.devices()
+    if not remembered:
+        return [], 0
+    with ThreadPoolExecutor(max_workers=min(16, len(remembered))) as executor:
+        identities = list(executor.map(probe, [device["ip"] for device in remembered]))
+    devices = []
+    for device, identity in zip(remembered, identities):
+        if identity is None or identity[:2] != (device["name"], device["mac"]):
+            LOGGER.info("Remembered identity of %s is out of date", device["name"])
+            continue
+        name, mac, model, series = identity
+        identity_cache.store(name, mac, model, series, device["ip"])
+        devices.append(
+            SenseMe(
+                ip=device["ip"],
+                name=name,
+                model=model,
+                series=series,
+                mac=mac,
+                identity_cache=identity_cache,
+            )
+        )
+    return devices, len(remembered) - len(devices)
+
 
-            time.sleep(0.5)
-            if (
-                start_time + time_to_wait < time.time()
-                or len(devices) >= devices_to_find
-            ):
-                LOGGER.debug("time_to_wait exceeded or devices_to_find met")
-                break
-        return devices
-    except OSError:
-        # couldn't get port
-        raise OSError("Couldn't get port 31415")
+def _send_broadcasts(sock, data, targets):
+    """Send data to port 31415 of every target address.
+
+    :raises OSError: if it couldn't be sent to any of them
+    """
+    error = None
+    sent = False
+    for target in targets:
+        LOGGER.debug("Sending broadcast to %s." % target)
+        try:
+            sock.sendto(data, (target, SenseMe.PORT))
+            sent = True
+        except OSError as e:
+            LOGGER.warning("Couldn't broadcast to %s: %s" % (target, e))
+            error = e
+    if not sent:
+        raise error
+
+
+def iter_discover(
+    devices_to_find=6,
+    time_to_wait=5,
+    match=None,
+    resend_interval=0.25,
+    identity_cache=None,
+    interfaces=None,
+):
+    """Discover SenseMe devices, yielding each one as soon as it answers.
+
+    Stops once devices_to_find devices were yielded or after time_to_wait
+    seconds, or whenever the caller stops iterating.
+
+    Example:
+        # returns as soon as the living room fan answers
+        fan = next(iter_discover(1, match=lambda name, mac: name == "Living Room"))
+
+    :param devices_to_find: stop once this many devices have been found
+    :param time_to_wait: seconds to listen for replies
+    :param match: predicate called with the name and MAC of each device,
+        only devices it returns True for are yielded and counted
+    :param resend_interval: seconds before the broadcast is first sent again,
+        doubling after every resend. None to broadcast only once.
+    :param identity_cache: an IdentityCache the devices found are stored in
+    :param interfaces: interface names or address/prefix strings to
+        broadcast on, default all local interfaces. The interface each
+        device answered on is its interface attribute.
+    :return: generator of SenseMe devices, each device yielded once
+    """
+    found = set()
+    if devices_to_find <= 0:
+        return
+    replies = _broadcast_device_id(time_to_wait, resend_interval, interfaces)
+    try:
+        for ip, (name, mac, model, series), _, interface in replies:
+            if mac in found or (match is not None and not match(name, mac)):
+                continue
+            found.add(mac)
+            if identity_cache is not None:
+                identity_cache.store(name, mac, model, series, ip)
+            yield SenseMe(
+                ip=ip,
+                name=name,
+                model=model,
+                series=series,
+                mac=mac,
+                identity_cache=identity_cache,
+                interface=interface,
+            )
+            if len(found) >= devices_to_find:
+                LOGGER.debug("devices_to_find met")
+                return
     finally:
-        s.close()
+        replies.close()
+
+
+def discover(
+    devices_to_find=6, time_to_wait=5, identity_cache=None, match=None, interfaces=None
+):
+    """Discover SenseMe devices.
+
+    :param devices_to_find: stop once this many devices have been found
+    :param time_to_wait: seconds to listen for broadcast replies
+    :param identity_cache: an IdentityCache, or True for one at the default
+        path. Remembered devices are probed at their last IP first. If they
+        all still answer no broadcast is sent, otherwise the broadcast looks
+        for the rest and new or moved devices are remembered.
+    :param match: predicate called with the name and MAC of each device, see
+        iter_discover
+    :param interfaces: interface names or address/prefix strings to
+        broadcast on, default all local interfaces
+    :return: List of discovered SenseMe devices.
+    """
+    identity_cache = resolve_identity_cache(identity_cache)
+    devices = []
+    if identity_cache is not None:
+        devices, missing = _confirm_identities(identity_cache)
+        if match is not None:
+            devices = [device for device in devices if match(device.name, device.mac)]
+        if (devices and not missing) or len(devices) >= devices_to_find:
+            LOGGER.debug("All devices found in the identity cache")
+            return devices
+    found_macs = {device.mac for device in devices}
+
+    def wanted(name, mac):
+        return mac not in found_macs and (match is None or match(name, mac))
+
+    devices.extend(
+        iter_discover(
+            devices_to_find - len(devices),
+            time_to_wait,
+            match=wanted,
+            identity_cache=identity_cache,
+            interfaces=interfaces,
+        )
+    )
+    return devices
 
     @staticmethod
     def listen(cycles=30):
@@ -0,0 +1,246 @@
+"""Find SenseMe devices by asking every address of a network directly.
+
+Broadcasts don't cross routers or VLANs, so discover() can't see devices
+on other segments. sweep() sends <ALL;DEVICE;ID;GET> to each address
+instead, over UDP, TCP or both, many addresses at a time.
+
+Example:
+    from senseme.sweep import sweep
+
+    fans = sweep(["192.168.4.0/22", "10.0.8.17"])
+"""
+import errno
+import ipaddress
+import logging
+import selectors
+import socket
+import time
+
+from .lib.identity_cache import resolve_identity_cache
+from .protocol import MessageFramer, parse_device_id, parse_device_ids
+from .senseme import SenseMe
+
+LOGGER = logging.getLogger(__name__)
+
+QUERY = "<ALL;DEVICE;ID;GET>".encode("utf-8")
+
+
+def _addresses(networks):
+    """Yield each host address of networks once, as str."""
+    if isinstance(networks, str):
+        networks = [networks]
+    seen = set()
+    for network in networks:
+        network = ipaddress.ip_network(network, strict=False)
+        if network.num_addresses == 1:
+            hosts = [network.network_address]
+        else:
+            hosts = network.hosts()
+        for host in hosts:
+            if host not in seen:
+                seen.add(host)
+                yield str(host)
+
+
+def _udp_socket(port):
+    """Return a UDP socket for probes, bound to port if it's free.
+
+    Devices may answer to port 31415 rather than the port a probe came from,
+    so that port is preferred.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.bind(("", port))
+    except OSError:
+        LOGGER.warning("Port %s is in use, replies sent to it will be missed", port)
+        sock.bind(("", 0))
+    sock.setblocking(False)
+    return sock
+
+
+class _Probe:
+    """Probe of one address, over UDP and/or TCP, until a deadline."""
+
+    def __init__(self, ip, port, timeout, udp, tcp):
+        self.ip = ip
+        self.deadline = time.monotonic() + timeout
+        self.udp = False
+        self.sock = None
+        self.connected = False
+        self.framer = MessageFramer()
+        if udp is not None:
+            try:
+                udp.sendto(QUERY, (ip, port))
+                self.udp = True
+            except OSError as e:
+                LOGGER.debug("UDP probe of %s failed: %s", ip, e)
+        if tcp:
+            self.sock = socket.socket()
+            self.sock.setblocking(False)
+            error = self.sock.connect_ex((ip, port))
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                LOGGER.debug("TCP probe of %s failed: %s", ip, errno.errorcode[error])
+                self.close_tcp()
+
+    @property
+    def waiting(self):
+        """True while either protocol may still get an answer."""
+        return self.udp or self.sock is not None
+
+    def close_tcp(self, selector=None):
+        """Close the TCP connection, unregistering it from selector first."""
+        if self.sock is None:
+            return
+        if selector is not None:
+            try:
+                selector.unregister(self.sock)
+            except KeyError:
+                pass
+        self.sock.close()
+        self.sock = None
+
+    def on_tcp_event(self, selector):
+        """Advance the TCP exchange, return the device id if it's complete."""
+        if not self.connected:
+            error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                LOGGER.debug("TCP probe of %s failed: %s", self.ip, error)
+                self.close_tcp(selector)
+                return None
+            self.connected = True
+            try:
+                self.sock.send(QUERY)
+            except OSError:
+                self.close_tcp(selector)
+                return None
+            selector.modify(self.sock, selectors.EVENT_READ, self)
+            return None
+        try:
+            data = self.sock.recv(1024)
+        except (BlockingIOError, InterruptedError):
+            return None
+        except OSError:
+            data = b""
+        if not data:
+            self.close_tcp(selector)
+            return None
+        for message in self.framer.feed(data):
+            identity = parse_device_id(message)
+            if identity:
+                return identity
+        return None
+
+
+def sweep(
+    networks,
+    protocols=("udp", "tcp"),
+    timeout=1,
+    max_concurrency=256,
+    port=SenseMe.PORT,
+    identity_cache=None,
+):
+    """Discover SenseMe devices by probing every address of networks.
+
+    Up to max_concurrency addresses are probed at once, each given timeout
+    seconds to answer over any of the protocols, so a /22 takes about
+    1022 / 256 * timeout seconds at most.
+
+    :param networks: CIDR range, such as "192.168.4.0/22", or single
+        address, or a list of them
+    :param protocols: "udp", "tcp" or both, UDP is cheaper but some
+        networks drop it
+    :param timeout: seconds each address has to answer
+    :param max_concurrency: most addresses probed at the same time
+    :param port: port devices listen on
+    :param identity_cache: an IdentityCache, or True for one at the default
+        path, the devices found are stored in
+    :return: list of SenseMe devices, one per MAC
+    """
+    identity_cache = resolve_identity_cache(identity_cache)
+    addresses = _addresses(networks)
+    selector = selectors.DefaultSelector()
+    udp = _udp_socket(port) if "udp" in protocols else None
+    if udp is not None:
+        selector.register(udp, selectors.EVENT_READ, None)
+    tcp = "tcp" in protocols
+    active = {}
+    found = {}
+
+    def finish(ip):
+        probe = active.pop(ip, None)
+        if probe is not None:
+            probe.close_tcp(selector)
+
+    def record(ip, identity):
+        if identity[1] not in found:
+            LOGGER.info("Found %s at %s", identity[0], ip)
+            found[identity[1]] = (ip, identity)
+        finish(ip)
+
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(active) < max_concurrency:
+                ip = next(addresses, None)
+                if ip is None:
+                    exhausted = True
+                    break
+                probe = _Probe(ip, port, timeout, udp, tcp)
+                if not probe.waiting:
+                    continue
+                active[ip] = probe
+                if probe.sock is not None:
+                    selector.register(probe.sock, selectors.EVENT_WRITE, probe)
+
+            now = time.monotonic()
+            for ip in [ip for ip, probe in active.items() if probe.deadline <= now]:
+                finish(ip)
+            if not active:
+                if exhausted:
+                    break
+                continue
+
+            wait = min(probe.deadline for probe in active.values()) - now
+            for key, _ in selector.select(max(0, wait)):
+                if key.fileobj is udp:
+                    while True:
+                        try:
+                            datagram, address = udp.recvfrom(1024)
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except OSError:
+                            # ICMP port unreachable from an earlier probe
+                            continue
+                        for identity in parse_device_ids(datagram):
+                            record(address[0], identity)
+                    continue
+                probe = key.data
+                if active.get(probe.ip) is not probe or probe.sock is None:
+                    continue
+                identity = probe.on_tcp_event(selector)
+                if identity:
+                    record(probe.ip, identity)
+                elif not probe.waiting:
+                    finish(probe.ip)
+    finally:
+        for ip in list(active):
+            finish(ip)
+        selector.close()
+        if udp is not None:
+            udp.close()
+
+    devices = []
+    for mac, (ip, (name, _, model, series)) in found.items():
+        if identity_cache is not None:
+            identity_cache.store(name, mac, model, series, ip)
+        devices.append(
+            SenseMe(
+                ip=ip,
+                name=name,
+                model=model,
+                series=series,
+                mac=mac,
+                identity_cache=identity_cache,
+            )
+        )
+    return devices
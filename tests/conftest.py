@@ -0,0 +1,246 @@
+"""Fixtures emulating SenseMe devices on loopback addresses."""
+import re
+import socket
+import threading
+import time
+
+import pytest
+
+from senseme import SenseMe
+
+NAME = "Test Fan"
+MAC = "20:F8:5E:00:00:01"
+OTHER_NAME = "Other Fan"
+OTHER_MAC = "20:F8:5E:00:00:02"
+
+STATE = {
+    "FAN;PWR": "ON",
+    "FAN;SPD;ACTUAL": "3",
+    "FAN;SPD;MIN": "1",
+    "FAN;SPD;MAX": "7",
+    "FAN;DIR": "FWD",
+    "FAN;WHOOSH;STATUS": "OFF",
+    "FAN;BOOKENDS": "1;7",
+    "LIGHT;PWR": "ON",
+    "LIGHT;LEVEL;ACTUAL": "8",
+    "LIGHT;BOOKENDS": "1;16",
+    "DEVICE;BEEPER": "ON",
+    "NW;SSID": "home",
+    "NW;PARAMS;ACTUAL": "127.0.0.2;255.0.0.0;127.0.0.254",
+    "SMARTMODE;STATE": "OFF",
+    "SMARTMODE;ACTUAL": "OFF",
+    "SLEEP;EVENT;OFF": "LIGHT,LEVEL,5",
+}
+
+# setters naming a different attribute than their reply carries
+SET_PATHS = {"FAN;SPD": "FAN;SPD;ACTUAL", "LIGHT;LEVEL": "LIGHT;LEVEL;ACTUAL"}
+
+COMMAND_RE = re.compile(rb"<([^>]*)>")
+
+
+class FakeDevice:
+    """A SenseMe fan answering over TCP and UDP on ip:port.
+
+    GETALL replies are sent getall_gap seconds apart, so a GETALL can be
+    made to take long enough to be interrupted. The replies for the
+    attributes in unsolicited are sent ahead of every GET reply, as changes
+    the device pushes can be. Without udp the UDP port is left to discovery,
+    which the device answers with announce().
+    """
+
+    def __init__(
+        self,
+        ip="127.0.0.2",
+        port=0,
+        name=NAME,
+        mac=MAC,
+        getall_gap=0,
+        unsolicited=(),
+        udp=True,
+    ):
+        self.name = name
+        self.mac = mac
+        self.getall_gap = getall_gap
+        self.unsolicited = unsolicited
+        self.state = dict(STATE)
+        self.commands = []
+        self.connections = 0
+        self.getalls_started = 0
+        self.getalls_finished = 0
+        self._closed = threading.Event()
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((ip, port))
+        self._server.listen(16)
+        self._server.settimeout(0.1)
+        self.ip, self.port = self._server.getsockname()
+        self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._udp.bind((self.ip, self.port if udp else 0))
+        self._udp.settimeout(0.1)
+        self._threads = [threading.Thread(target=self._accept, daemon=True)]
+        if udp:
+            self._threads.append(
+                threading.Thread(target=self._answer_udp, daemon=True)
+            )
+        for thread in self._threads:
+            thread.start()
+
+    def reply(self, attribute):
+        return "(%s;%s;%s)" % (self.name, attribute, self.state[attribute])
+
+    def device_id(self):
+        return "(%s;DEVICE;ID;%s;FAN,HAIKU,HSERIES)" % (self.name, self.mac)
+
+    def announce(self):
+        """Send the device id reply to discovery listening on this host."""
+        self._udp.sendto(self.device_id().encode("utf-8"), ("127.0.0.1", self.port))
+
+    def wait_for(self, attribute, value, timeout=1):
+        """Return True once attribute is value, False after timeout.
+
+        Writes aren't answered, so they may still be on their way.
+        """
+        deadline = time.monotonic() + timeout
+        while self.state.get(attribute) != value:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self):
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        self._server.close()
+        self._udp.close()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _answer_udp(self):
+        while not self._closed.is_set():
+            try:
+                data, address = self._udp.recvfrom(1024)
+            except socket.timeout:
+                continue
+            if b";DEVICE;ID;GET>" in data:
+                self._udp.sendto(self.device_id().encode("utf-8"), address)
+
+    def _serve(self, conn):
+        buffer = b""
+        with conn:
+            try:
+                while not self._closed.is_set():
+                    data = conn.recv(1024)
+                    if not data:
+                        return
+                    buffer += data
+                    for command in COMMAND_RE.findall(buffer):
+                        self._handle(conn, command.decode("utf-8"))
+                    buffer = buffer[buffer.rfind(b">") + 1 :]
+            except OSError:
+                # the client hung up, as a preempted GETALL does
+                pass
+
+    def _handle(self, conn, command):
+        self.commands.append(command)
+        _, body = command.split(";", 1)
+        parts = body.split(";")
+        if body == "DEVICE;ID;GET":
+            replies = [self.device_id()]
+        elif body == "GETALL":
+            self._send_getall(conn)
+            return
+        elif "GET" in parts:
+            parts.remove("GET")
+            attribute = ";".join(parts)
+            replies = [self.reply(other) for other in self.unsolicited]
+            if attribute in self.state:
+                replies.append(self.reply(attribute))
+        else:
+            if "SET" in parts:
+                parts.remove("SET")
+            path = ";".join(parts[:-1])
+            attribute = SET_PATHS.get(path, path)
+            self.state[attribute] = parts[-1]
+            replies = [self.reply(attribute)]
+        for reply in replies:
+            conn.sendall(reply.encode("utf-8"))
+
+    def _send_getall(self, conn):
+        self.getalls_started += 1
+        for attribute in list(self.state):
+            conn.sendall(self.reply(attribute).encode("utf-8"))
+            time.sleep(self.getall_gap)
+        self.getalls_finished += 1
+
+
+@pytest.fixture
+def make_device():
+    """Factory of FakeDevices, closed at the end of the test."""
+    devices = []
+
+    def make(**kwargs):
+        device = FakeDevice(**kwargs)
+        devices.append(device)
+        return device
+
+    yield make
+    for device in devices:
+        device.close()
+
+
+@pytest.fixture
+def fake_device(make_device):
+    return make_device()
+
+
+@pytest.fixture
+def make_fan(monkeypatch):
+    """Factory of SenseMes talking to a FakeDevice, monitors stopped after."""
+    fans = []
+
+    def make(device, **kwargs):
+        monkeypatch.setattr(SenseMe, "PORT", device.port)
+        kwargs.setdefault("timeout", 0.5)
+        fan = SenseMe(ip=device.ip, name=device.name, **kwargs)
+        fans.append(fan)
+        return fan
+
+    yield make
+    for fan in fans:
+        fan.stop_monitor()
+
+
+@pytest.fixture
+def fan(fake_device, make_fan):
+    """A SenseMe talking to fake_device."""
+    return make_fan(fake_device)
+
+
+@pytest.fixture
+def announcing(make_device, monkeypatch):
+    """Two devices answering discovery until the end of the test."""
+    first = make_device(ip="127.0.0.2", udp=False)
+    second = make_device(
+        ip="127.0.0.3", port=first.port, name=OTHER_NAME, mac=OTHER_MAC, udp=False
+    )
+    monkeypatch.setattr(SenseMe, "PORT", first.port)
+    stopped = threading.Event()
+
+    def announce():
+        while not stopped.wait(0.05):
+            first.announce()
+            second.announce()
+
+    thread = threading.Thread(target=announce)
+    thread.start()
+    yield first, second
+    stopped.set()
+    thread.join()
@@ -0,0 +1,23 @@
+import pytest
+
+from senseme.lib import AdaptiveInterval
+
+
+def test_interval_backs_off_to_maximum():
+    interval = AdaptiveInterval(minimum=5, maximum=10, initial=5)
+    assert [interval.record(changed=False) for _ in range(3)] == [7.5, 10, 10]
+
+
+def test_change_drops_to_minimum():
+    interval = AdaptiveInterval(minimum=5, maximum=300)
+    assert interval.interval == 300
+    assert interval.record(changed=True) == 5
+
+
+def test_initial_interval_is_bounded():
+    assert AdaptiveInterval(minimum=5, maximum=10, initial=60).interval == 10
+
+
+def test_minimum_above_maximum_is_refused():
+    with pytest.raises(ValueError):
+        AdaptiveInterval(minimum=10, maximum=5)
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from senseme.aio import AsyncSenseMe
+
+
+def test_made_outside_the_event_loop(fake_device, monkeypatch):
+    monkeypatch.setattr(AsyncSenseMe, "PORT", fake_device.port)
+    fan = AsyncSenseMe(fake_device.ip, fake_device.name, timeout=0.5)
+
+    async def read_twice():
+        return await asyncio.gather(fan.get_all(), fan.get_all())
+
+    first, second = asyncio.run(read_twice())
+    assert first is second
+    assert first["FAN;BOOKENDS"] == ("1", "7")
+    assert fake_device.getalls_started == 1
+
+
+def test_query_skips_unrelated_messages(make_device, monkeypatch):
+    device = make_device(unsolicited=["LIGHT;LEVEL;ACTUAL", "FAN;SPD;MIN"])
+    monkeypatch.setattr(AsyncSenseMe, "PORT", device.port)
+    fan = AsyncSenseMe(device.ip, device.name, timeout=0.5)
+    assert asyncio.run(fan.get_speed()) == 3
+    assert asyncio.run(fan.get_room_settings_fan_speed_limits()) == (1, 7)
+
+
+def test_query_without_reply_returns_none(fake_device, monkeypatch):
+    monkeypatch.setattr(AsyncSenseMe, "PORT", fake_device.port)
+    fan = AsyncSenseMe(fake_device.ip, fake_device.name, timeout=0.2)
+    assert asyncio.run(fan._queryraw("<%s;NO;SUCH;GET>" % fake_device.name)) is None
+
+
+def test_getall_stops_once_learned_attributes_arrived(fake_device, monkeypatch):
+    monkeypatch.setattr(AsyncSenseMe, "PORT", fake_device.port)
+    fan = AsyncSenseMe(fake_device.ip, fake_device.name, timeout=0.3)
+    asyncio.run(fan._get_all_request())
+    assert fan._getall_profile.expected == frozenset(fake_device.state)
+    started = time.monotonic()
+    assert len(asyncio.run(fan._get_all_request())) == len(fake_device.state)
+    assert time.monotonic() - started < 0.2
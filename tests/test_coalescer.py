@@ -0,0 +1,59 @@
+import threading
+import time
+
+from senseme.lib import Coalescer
+
+
+def test_first_write_sent_at_once_latest_at_window_end():
+    sent = []
+    coalescer = Coalescer(0.1, sent.append)
+    for level in range(16):
+        coalescer.submit("LIGHT;LEVEL", level)
+    assert sent == [0]
+    assert coalescer.pending == 1
+    time.sleep(0.2)
+    assert sent == [0, 15]
+    assert coalescer.pending == 0
+
+
+def test_keys_are_independent():
+    sent = []
+    coalescer = Coalescer(0.1, sent.append)
+    coalescer.submit("FAN;SPD", 1)
+    coalescer.submit("LIGHT;LEVEL", 2)
+    assert sent == [1, 2]
+
+
+def test_held_writes_are_sent_before_a_later_one():
+    sent = []
+    coalescer = Coalescer(10, sent.append)
+    coalescer.submit("FAN;SPD", 1)
+    coalescer.submit("FAN;SPD", 5)
+    coalescer.submit("FAN;PWR", "OFF")
+    assert sent == [1, 5, "OFF"]
+
+
+def test_flush_sends_held_writes():
+    sent = []
+    coalescer = Coalescer(10, sent.append)
+    coalescer.submit("FAN;SPD", 1)
+    coalescer.submit("FAN;SPD", 2)
+    coalescer.flush()
+    assert sent == [1, 2]
+    assert coalescer.pending == 0
+
+
+def test_send_errors_at_window_end_are_logged(caplog):
+    failed = threading.Event()
+
+    def send(write):
+        if write == 2:
+            failed.set()
+            raise OSError("unreachable")
+
+    coalescer = Coalescer(0.05, send)
+    coalescer.submit("FAN;SPD", 1)
+    coalescer.submit("FAN;SPD", 2)
+    assert failed.wait(1)
+    time.sleep(0.05)
+    assert "Error sending held writes" in caplog.text
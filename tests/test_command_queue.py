@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from senseme.lib.command_queue import BACKGROUND, CommandQueue, Preempted
+
+
+def test_interactive_goes_before_waiting_background():
+    commands = CommandQueue()
+    order = []
+    release = threading.Event()
+
+    def blocker():
+        release.wait()
+        order.append("blocker")
+
+    threads = [threading.Thread(target=commands.run, args=(blocker,))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(
+        threading.Thread(
+            target=commands.run,
+            args=(lambda: order.append("background"), BACKGROUND),
+        )
+    )
+    threads[1].start()
+    time.sleep(0.05)
+    threads.append(
+        threading.Thread(
+            target=commands.run, args=(lambda: order.append("interactive"),)
+        )
+    )
+    threads[2].start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ["blocker", "interactive", "background"]
+
+
+def test_nested_command_runs_at_once():
+    commands = CommandQueue()
+    assert commands.run(lambda: commands.run(lambda: 1) + 1) == 2
+
+
+def test_preempted_background_command_runs_again():
+    commands = CommandQueue()
+    attempts = []
+    interactive_done = threading.Event()
+
+    def background():
+        attempts.append(None)
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            if commands.preempt_requested():
+                raise Preempted
+            time.sleep(0.01)
+        return "done"
+
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(commands.run(background, BACKGROUND))
+    )
+    thread.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    commands.run(interactive_done.set)
+    assert time.monotonic() - started < 0.5
+    thread.join()
+    assert result == ["done"]
+    assert len(attempts) == 2
+
+
+def test_full_lane_raises_without_blocking():
+    commands = CommandQueue(maxsize=1)
+    release = threading.Event()
+    threads = [
+        threading.Thread(target=commands.run, args=(release.wait,)) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    try:
+        with pytest.raises(queue.Full):
+            commands.run(lambda: None, block=False)
+        with pytest.raises(queue.Full):
+            commands.run(lambda: None, timeout=0.05)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    assert len(commands) == 0
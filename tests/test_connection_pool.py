@@ -0,0 +1,60 @@
+import time
+
+from senseme.lib import ConnectionPool, Scheduler
+
+
+def send(command):
+    """Return a handler sending command and not reading the reply."""
+
+    def handler(sock):
+        sock.sendall(command.encode("utf-8"))
+
+    return handler
+
+
+def test_connection_is_reused(fake_device, make_fan):
+    pool = ConnectionPool(timeout=0.5)
+    fan = make_fan(fake_device, connection_pool=pool)
+    assert fan.speed == 3
+    assert fan.light_powered_on
+    assert fake_device.connections == 1
+    pool.close()
+
+
+def test_idle_connection_is_evicted_without_further_use(fake_device):
+    scheduler = Scheduler(jitter=0)
+    pool = ConnectionPool(idle_timeout=0.1, timeout=0.5, scheduler=scheduler)
+    try:
+        pool.run(fake_device.ip, fake_device.port, send("<Test Fan;FAN;DIR;GET>"))
+        time.sleep(0.35)
+        conn = pool._connections[(fake_device.ip, fake_device.port)]
+        assert conn.sock is None
+    finally:
+        pool.close()
+        scheduler.stop()
+
+
+def test_unread_messages_are_handed_over(fake_device):
+    pool = ConnectionPool(timeout=0.5)
+    address = fake_device.ip, fake_device.port
+    pool.run(*address, send("<Test Fan;FAN;DIR;GET><Test Fan;LIGHT;PWR;GET>"))
+    time.sleep(0.1)
+    unread = []
+    pool.run(*address, lambda sock: None, on_unread=unread.append)
+    pool.close()
+    assert unread == ["(Test Fan;FAN;DIR;FWD)", "(Test Fan;LIGHT;PWR;ON)"]
+    assert fake_device.connections == 1
+
+
+def test_messages_sent_between_commands_are_applied(fake_device, make_fan):
+    pool = ConnectionPool(timeout=0.5)
+    fan = make_fan(fake_device, connection_pool=pool)
+    fan._get_all()
+    fake_device.state["FAN;DIR"] = "REV"
+    # the device tells of the change while the connection sits unused
+    pool.run(fake_device.ip, fake_device.port, send("<Test Fan;FAN;DIR;GET>"))
+    time.sleep(0.1)
+    fan.speed = 5
+    assert fan.get_attribute("FAN;DIR") == "REV"
+    assert fake_device.getalls_started == 1
+    pool.close()
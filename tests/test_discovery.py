@@ -0,0 +1,38 @@
+import time
+
+from senseme import iter_discover
+
+
+def test_iter_discover_stops_once_enough_devices_answered(announcing):
+    started = time.monotonic()
+    found = list(iter_discover(2, time_to_wait=5, interfaces=["127.0.0.1/32"]))
+    assert time.monotonic() - started < 1
+    assert sorted((fan.name, fan.ip) for fan in found) == [
+        ("Other Fan", "127.0.0.3"),
+        ("Test Fan", "127.0.0.2"),
+    ]
+
+
+def test_iter_discover_yields_each_device_once(announcing):
+    found = iter_discover(6, time_to_wait=0.5, interfaces=["127.0.0.1/32"])
+    assert sorted(fan.mac for fan in found) == sorted(
+        device.mac for device in announcing
+    )
+
+
+def test_iter_discover_yields_matching_devices(announcing):
+    _, second = announcing
+    fans = iter_discover(
+        time_to_wait=5,
+        match=lambda name, mac: mac == second.mac,
+        interfaces=["127.0.0.1/32"],
+    )
+    fan = next(fans)
+    fans.close()
+    assert (fan.name, fan.ip) == ("Other Fan", "127.0.0.3")
+
+
+def test_devices_know_the_interface_they_answered_on(announcing):
+    interfaces = ["127.0.0.1/30", "127.0.1.1/24"]
+    found = iter_discover(2, time_to_wait=5, interfaces=interfaces)
+    assert {fan.interface.name for fan in found} == {"127.0.0.1/30"}
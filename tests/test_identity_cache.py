@@ -0,0 +1,65 @@
+from senseme import SenseMe, discover
+from senseme.lib import IdentityCache
+from senseme.lib.identity_cache import resolve_identity_cache
+from senseme.senseme import _confirm_identities
+
+
+def remember(cache, device, **fields):
+    identity = dict(
+        name=device.name,
+        mac=device.mac,
+        model="FAN,HAIKU",
+        series="HSERIES",
+        ip=device.ip,
+    )
+    identity.update(fields)
+    cache.store(**identity)
+
+
+def test_identities_are_kept_on_disk(tmp_path, fake_device):
+    path = str(tmp_path / "devices.json")
+    remember(IdentityCache(path), fake_device)
+    cache = IdentityCache(path)
+    assert cache.find(name=fake_device.name)["ip"] == fake_device.ip
+    # the only identity remembered
+    assert cache.find()["mac"] == fake_device.mac
+    cache.remove(fake_device.mac)
+    assert IdentityCache(path).devices() == []
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text("{not json")
+    assert IdentityCache(str(path)).devices() == []
+
+
+def test_resolve_identity_cache():
+    assert resolve_identity_cache(None) is None
+    assert resolve_identity_cache(False) is None
+    assert isinstance(resolve_identity_cache(True), IdentityCache)
+
+
+def test_device_identified_from_cache(tmp_path, fake_device, monkeypatch):
+    monkeypatch.setattr(SenseMe, "PORT", fake_device.port)
+    cache = IdentityCache(str(tmp_path / "devices.json"))
+    remember(cache, fake_device)
+    fan = SenseMe(name=fake_device.name, identity_cache=cache)
+    assert (fan.ip, fan.mac) == (fake_device.ip, fake_device.mac)
+    assert fan.model == "FAN,HAIKU"
+
+
+def test_discover_returns_remembered_devices_that_answer(
+    tmp_path, fake_device, monkeypatch
+):
+    # a broadcast would fail, the fake device holds the UDP port
+    monkeypatch.setattr(SenseMe, "PORT", fake_device.port)
+    cache = IdentityCache(str(tmp_path / "devices.json"))
+    remember(cache, fake_device)
+    assert [fan.mac for fan in discover(identity_cache=cache)] == [fake_device.mac]
+
+
+def test_out_of_date_identity_is_not_used(tmp_path, fake_device, monkeypatch):
+    monkeypatch.setattr(SenseMe, "PORT", fake_device.port)
+    cache = IdentityCache(str(tmp_path / "devices.json"))
+    remember(cache, fake_device, mac="20:F8:5E:00:00:09")
+    assert _confirm_identities(cache) == ([], 1)
@@ -0,0 +1,55 @@
+import ipaddress
+import socket
+
+import pytest
+
+from senseme import SenseMe
+from senseme.lib import Interface
+from senseme.lib.interfaces import interface_of, resolve_interfaces
+from senseme.senseme import _send_broadcasts
+
+
+def test_interface_from_string_knows_its_broadcast():
+    interface = Interface.from_string("10.0.8.2/22")
+    assert interface.address == ipaddress.ip_address("10.0.8.2")
+    assert interface.broadcast == "10.0.11.255"
+
+
+def test_resolve_interfaces_accepts_strings_and_interfaces():
+    known = Interface.from_string("192.168.1.2/24", name="eth0")
+    assert resolve_interfaces("10.0.0.1/8") == [Interface.from_string("10.0.0.1/8")]
+    assert resolve_interfaces([known, "10.0.0.1/8"])[0] is known
+
+
+def test_resolve_interfaces_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        resolve_interfaces(["no-such-interface0"])
+
+
+def test_interface_of_finds_the_network_holding_an_address():
+    interfaces = resolve_interfaces(["192.168.1.2/24", "10.0.8.2/22"])
+    assert interface_of("10.0.9.40", interfaces) is interfaces[1]
+    assert interface_of("172.16.0.1", interfaces) is None
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    """UDP socket on 127.0.0.1 at the port broadcasts are sent to."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    monkeypatch.setattr(SenseMe, "PORT", sock.getsockname()[1])
+    yield sock
+    sock.close()
+
+
+def test_broadcast_goes_on_when_one_target_fails(receiver):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        _send_broadcasts(sock, b"<ALL;DEVICE;ID;GET>", ["256.0.0.1", "127.0.0.1"])
+    assert receiver.recvfrom(64)[0] == b"<ALL;DEVICE;ID;GET>"
+
+
+def test_broadcast_fails_when_no_target_works(receiver):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        with pytest.raises(OSError):
+            _send_broadcasts(sock, b"<ALL;DEVICE;ID;GET>", ["256.0.0.1"])
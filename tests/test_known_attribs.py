@@ -0,0 +1,32 @@
+from senseme.known_attribs import implied_values
+
+
+def test_power_off_implies_speed_and_whoosh():
+    implied = implied_values("FAN;PWR", "OFF")
+    assert implied["FAN;PWR"] == "OFF"
+    assert implied["FAN;SPD;ACTUAL"] == "0"
+    assert implied["FAN;WHOOSH;STATUS"] == "OFF"
+
+
+def test_power_on_leaves_speed_unknown():
+    assert implied_values("FAN;PWR", "ON")["FAN;SPD;ACTUAL"] is None
+
+
+def test_speed_implies_power():
+    assert implied_values("FAN;SPD;ACTUAL", "0")["FAN;PWR"] == "OFF"
+    assert implied_values("FAN;SPD;ACTUAL", "4")["FAN;PWR"] == "ON"
+
+
+def test_implications_are_followed():
+    # speed 0 turns the fan off, which turns whoosh off
+    assert implied_values("FAN;SPD;ACTUAL", "0")["FAN;WHOOSH;STATUS"] == "OFF"
+
+
+def test_unrelated_attribute_implies_only_itself():
+    assert implied_values("DEVICE;BEEPER", "ON") == {"DEVICE;BEEPER": "ON"}
+
+
+def test_custom_dependencies():
+    dependencies = [("A", lambda value: value == "1", {"B": "2"})]
+    assert implied_values("A", "1", dependencies) == {"A": "1", "B": "2"}
+    assert implied_values("A", "0", dependencies) == {"A": "0"}
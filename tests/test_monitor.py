@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+def test_hot_poll_merges_values(fan, fake_device):
+    fan.hot_attributes = ["FAN;SPD;ACTUAL", "LIGHT;PWR"]
+    fan._get_all()
+    fake_device.state["FAN;SPD;ACTUAL"] = "5"
+    assert fan._refresh_hot() == {"FAN;SPD;ACTUAL": "5", "LIGHT;PWR": "ON"}
+    assert fan._all_cache["FAN;SPD;ACTUAL"] == "5"
+
+
+def test_unanswered_hot_attribute_is_dropped(fake_device, make_fan):
+    fan = make_fan(
+        fake_device, hot_attributes=["FAN;SPD;ACTUAL", "SNSROCC;STATUS"], timeout=0.2
+    )
+    for _ in range(fan.HOT_MISS_LIMIT):
+        assert fan._refresh_hot() == {"FAN;SPD;ACTUAL": "3"}
+    assert fan.hot_attributes == ["FAN;SPD;ACTUAL"]
+
+
+def test_hot_poll_skipped_while_getall_runs(make_device, make_fan):
+    device = make_device(getall_gap=0.05)
+    fan = make_fan(device, hot_attributes=["FAN;SPD;ACTUAL"])
+    thread = threading.Thread(
+        target=fan._in_background, args=(lambda: fan._get_all_bare(refresh=True),)
+    )
+    thread.start()
+    while not device.getalls_started:
+        time.sleep(0.01)
+    assert fan._refresh_hot() == {}
+    thread.join()
+    # not preempted
+    assert device.getalls_started == 1
+
+
+def test_hot_values_trusted_while_young(fake_device, make_fan):
+    fan = make_fan(
+        fake_device, hot_attributes=["FAN;SPD;ACTUAL"], suppress_redundant_writes=0.2
+    )
+    fan._refresh_hot()
+    assert fan._known_value("FAN;SPD;ACTUAL") == "3"
+    time.sleep(0.3)
+    assert fan._known_value("FAN;SPD;ACTUAL") is None
+
+
+def test_monitor_runs_both_tiers(fake_device, make_fan):
+    fan = make_fan(
+        fake_device,
+        monitor_frequency=60,
+        hot_attributes=["FAN;SPD;ACTUAL"],
+        hot_frequency=0.1,
+    )
+    fan.start_monitor()
+    fake_device.state["FAN;SPD;ACTUAL"] = "6"
+    deadline = time.monotonic() + 2
+    while fan.get_attribute("FAN;SPD;ACTUAL") != "6":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert fake_device.getalls_started == 1
+
+
+def test_monitor_frequency_adapts(fake_device, make_fan):
+    fan = make_fan(fake_device, monitor_frequency=10, monitor_min_frequency=1)
+    interval = fan._monitor_interval
+    fan._get_all()
+    fan.speed = 5
+    assert interval.interval == 1
+    fake_device.state["FAN;DIR"] = "REV"
+    fan._refresh_all()
+    assert interval.interval == 1
+    fan._refresh_all()
+    assert interval.interval == 1.5
+    fan.start_monitor()
+    assert fan._monitor_job.interval == 1.5
@@ -0,0 +1,58 @@
+from senseme.protocol import (
+    MessageFramer,
+    match_reply,
+    parse_attribute,
+    reply_body,
+    response_path,
+)
+
+
+def test_framer_joins_messages_split_across_reads():
+    framer = MessageFramer()
+    assert framer.feed(b"(Fan;FAN;PWR;ON)(Fan;FAN;SP") == ["(Fan;FAN;PWR;ON)"]
+    assert framer.pending == len(b"(Fan;FAN;SP")
+    assert framer.feed(b"D;ACTUAL;3)") == ["(Fan;FAN;SPD;ACTUAL;3)"]
+    assert framer.pending == 0
+
+
+def test_framer_returns_every_message_of_a_read_once():
+    framer = MessageFramer()
+    messages = framer.feed(b"noise(Fan;A;1)(Fan;B;2)")
+    assert messages == ["(Fan;A;1)", "(Fan;B;2)"]
+    assert framer.feed(b"") == []
+
+
+def test_framer_accepts_memoryview():
+    framer = MessageFramer()
+    assert framer.feed(memoryview(b"(Fan;A;1)")) == ["(Fan;A;1)"]
+
+
+def test_response_path_drops_name_and_get():
+    assert response_path("<Living Room Fan;FAN;SPD;GET;ACTUAL>") == "FAN;SPD;ACTUAL"
+    assert response_path("<Fan;SLEEP;EVENT;OFF;GET>") == "SLEEP;EVENT;OFF"
+
+
+def test_reply_body_strips_name():
+    assert reply_body("(Living Room Fan;FAN;SPD;ACTUAL;3)") == "FAN;SPD;ACTUAL;3"
+
+
+def test_match_reply_prefers_longest_path():
+    paths = ["SLEEP;EVENT", "SLEEP;EVENT;OFF"]
+    assert match_reply("(Fan;SLEEP;EVENT;OFF;LIGHT,LEVEL,5)", paths) == (
+        "SLEEP;EVENT;OFF"
+    )
+    assert match_reply("(Fan;SLEEP;EVENT;ON)", paths) == "SLEEP;EVENT"
+
+
+def test_match_reply_ignores_other_attributes():
+    assert match_reply("(Fan;FAN;SPD;MIN;1)", ["FAN;SPD;ACTUAL"]) is None
+    assert match_reply("(Fan;FAN;SPD;ACTUALLY;1)", ["FAN;SPD;ACTUAL"]) is None
+
+
+def test_parse_attribute():
+    assert parse_attribute("FAN;SPD;ACTUAL;3") == ("FAN;SPD;ACTUAL", "3")
+    assert parse_attribute("FAN;BOOKENDS;1;7") == ("FAN;BOOKENDS", ("1", "7"))
+    assert parse_attribute("NW;PARAMS;ACTUAL;10.0.0.5;255.255.255.0;10.0.0.1") == (
+        "NW;PARAMS;ACTUAL",
+        ["10.0.0.5", "255.255.255.0", "10.0.0.1"],
+    )
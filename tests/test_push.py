@@ -0,0 +1,25 @@
+import threading
+
+from senseme.push import PushListener
+
+
+class FailingSocket:
+    """A UDP socket whose every read fails."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def recvfrom(self, size):
+        self.reads += 1
+        raise ConnectionResetError("port unreachable")
+
+
+def test_udp_read_error_returns_to_the_selector():
+    sock = FailingSocket()
+    thread = threading.Thread(
+        target=PushListener(udp=True)._read_udp, args=(sock,), daemon=True
+    )
+    thread.start()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert sock.reads == 1
@@ -0,0 +1,65 @@
+import time
+
+from senseme import DeviceRegistry, SenseMe
+from senseme.lib import Scheduler
+from senseme.registry import JOINED, LEFT, MOVED, RENAMED
+
+INTERFACES = ["127.0.0.1/32"]
+
+
+def make_registry(events, **kwargs):
+    registry = DeviceRegistry(scan_time=0.3, interfaces=INTERFACES, **kwargs)
+    registry.subscribe(lambda event, device, old: events.append((event, old)))
+    return registry
+
+
+def test_scan_finds_devices(announcing):
+    events = []
+    registry = make_registry(events)
+    registry.scan()
+    assert events == [(JOINED, None), (JOINED, None)]
+    assert sorted((fan.name, fan.ip) for fan in registry.devices) == [
+        ("Other Fan", "127.0.0.3"),
+        ("Test Fan", "127.0.0.2"),
+    ]
+
+
+def test_device_is_updated_in_place(announcing):
+    first, _ = announcing
+    fan = SenseMe(ip="127.0.0.9", name="Old Name", mac=first.mac)
+    events = []
+    registry = make_registry(events, devices=[fan])
+    registry.scan()
+    assert (MOVED, "127.0.0.9") in events
+    assert (RENAMED, "Old Name") in events
+    assert (fan.ip, fan.name) == (first.ip, first.name)
+    assert registry.get(first.mac) is fan
+
+
+def test_device_leaves_after_missing_scans(announcing):
+    gone = SenseMe(ip="127.0.0.9", name="Gone", mac="20:F8:5E:00:00:09")
+    events = []
+    registry = make_registry(events, devices=[gone], miss_limit=2)
+    registry.scan()
+    assert gone in registry.devices
+    registry.scan()
+    assert gone not in registry.devices
+    assert events.count((LEFT, None)) == 1
+
+
+def test_stop_cuts_a_running_scan_short(announcing):
+    scheduler = Scheduler()
+    events = []
+    registry = make_registry(events, scheduler=scheduler)
+    registry.scan_time = 5
+    try:
+        registry.start()
+        time.sleep(0.2)
+        registry.stop()
+        started = time.monotonic()
+        with registry._scan_lock:
+            assert time.monotonic() - started < 0.5
+        # what answered before the stop isn't applied
+        assert events == []
+    finally:
+        scheduler.stop()
@@ -0,0 +1,56 @@
+import socket
+import time
+
+import pytest
+
+from senseme.lib import Deadline, DeadlineExceeded, RetryPolicy
+
+
+def failing(errors):
+    """Return a call raising errors in turn, then returning "done"."""
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return "done"
+
+    return call
+
+
+def test_retryable_error_is_retried():
+    policy = RetryPolicy(attempts=3, backoff=0)
+    assert policy.run(failing([ConnectionResetError(), socket.timeout()])) == "done"
+
+
+def test_last_error_raised_once_attempts_run_out():
+    policy = RetryPolicy(attempts=2, backoff=0)
+    with pytest.raises(ConnectionResetError):
+        policy.run(failing([ConnectionResetError(), ConnectionResetError()]))
+
+
+def test_other_errors_are_not_retried():
+    policy = RetryPolicy(attempts=3, backoff=0)
+    with pytest.raises(ValueError):
+        policy.run(failing([ValueError()]))
+
+
+def test_no_retry_that_would_start_after_the_deadline():
+    policy = RetryPolicy(attempts=3, backoff=0.5, jitter=0)
+    started = time.monotonic()
+    with pytest.raises(ConnectionResetError):
+        policy.run(failing([ConnectionResetError()]), Deadline(0.2))
+    assert time.monotonic() - started < 0.1
+
+
+def test_backoff_grows_up_to_max_backoff():
+    policy = RetryPolicy(backoff=0.1, multiplier=2, max_backoff=0.3, jitter=0)
+    assert [policy.delay(retry) for retry in range(3)] == [0.1, 0.2, 0.3]
+
+
+def test_deadline_shortens_timeouts_and_expires():
+    deadline = Deadline(0.05)
+    assert deadline.timeout(5) <= 0.05
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(5)
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from senseme.lib import Scheduler
+
+
+def test_job_runs_every_interval():
+    scheduler = Scheduler(workers=2, jitter=0)
+    runs = []
+    job = scheduler.schedule(lambda: runs.append(time.monotonic()), 0.05, delay=0)
+    try:
+        time.sleep(0.28)
+    finally:
+        job.cancel()
+        scheduler.stop()
+    assert 4 <= len(runs) <= 7
+
+
+def test_cancelled_job_stops():
+    scheduler = Scheduler(workers=1, jitter=0)
+    runs = []
+    job = scheduler.schedule(lambda: runs.append(None), 0.02, delay=0)
+    time.sleep(0.1)
+    job.cancel()
+    count = len(runs)
+    time.sleep(0.1)
+    scheduler.stop()
+    assert count and len(runs) <= count + 1
+
+
+def test_running_job_skips_its_turn():
+    scheduler = Scheduler(workers=4, jitter=0)
+    running = []
+    overlapped = threading.Event()
+
+    def slow():
+        if running:
+            overlapped.set()
+        running.append(None)
+        time.sleep(0.15)
+        running.pop()
+
+    job = scheduler.schedule(slow, 0.02, delay=0)
+    time.sleep(0.4)
+    job.cancel()
+    scheduler.stop()
+    assert not overlapped.is_set()
+
+
+def test_failing_job_keeps_running():
+    scheduler = Scheduler(workers=1, jitter=0)
+    runs = []
+
+    def failing():
+        runs.append(None)
+        raise RuntimeError
+
+    job = scheduler.schedule(failing, 0.02, delay=0)
+    time.sleep(0.15)
+    job.cancel()
+    scheduler.stop()
+    assert len(runs) > 1
+
+
+def test_set_interval_brings_next_run_forward():
+    scheduler = Scheduler(workers=1, jitter=0)
+    runs = []
+    job = scheduler.schedule(lambda: runs.append(None), 60, delay=60)
+    job.set_interval(0.02)
+    time.sleep(0.15)
+    job.cancel()
+    scheduler.stop()
+    assert runs
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import pytest
+
+from senseme import SenseMe
+from senseme.lib import ConnectionPool, DeadlineExceeded
+
+
+def test_properties_read_the_device(fan):
+    assert fan.speed == 3
+    assert fan.get_attribute("SLEEP;EVENT;OFF") == "LIGHT,LEVEL,5"
+
+
+def test_setter_writes_and_is_read_back(fan, fake_device):
+    fan.speed = 5
+    assert fake_device.wait_for("FAN;SPD;ACTUAL", "5")
+    assert fan.speed == 5
+
+
+def test_getall_parses_multi_value_replies(fan):
+    values = fan._get_all()
+    assert values["FAN;BOOKENDS"] == ("1", "7")
+    assert values["NW;PARAMS;ACTUAL"] == ["127.0.0.2", "255.0.0.0", "127.0.0.254"]
+    assert values["SLEEP;EVENT;OFF"] == "LIGHT,LEVEL,5"
+
+
+def test_getall_learns_attributes_by_name(fan, fake_device):
+    fan._get_all()
+    assert fan._getall_profile.expected == frozenset(fake_device.state)
+
+
+def test_getall_is_cached(fan, fake_device):
+    fan._get_all()
+    fan._get_all()
+    assert fake_device.getalls_started == 1
+
+
+def test_push_is_merged_into_cached_getall(fan, fake_device):
+    fan._get_all()
+    fan._apply_push("(%s;FAN;BOOKENDS;2;6)" % fake_device.name)
+    assert fan.get_attribute("FAN;BOOKENDS") == ("2", "6")
+    assert fake_device.getalls_started == 1
+
+
+def test_interactive_command_preempts_getall(make_device, monkeypatch):
+    device = make_device(getall_gap=0.05)
+    monkeypatch.setattr(SenseMe, "PORT", device.port)
+    fan = SenseMe(ip=device.ip, name=device.name, timeout=0.5)
+    result = []
+
+    def refresh():
+        result.append(fan._in_background(lambda: fan._get_all_bare(refresh=True)))
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+    while not device.getalls_started:
+        time.sleep(0.01)
+    started = time.monotonic()
+    fan.speed = 6
+    # a whole GETALL takes 16 * 0.05 seconds
+    assert time.monotonic() - started < 0.5
+    assert device.wait_for("FAN;SPD;ACTUAL", "6")
+    thread.join()
+    assert device.getalls_started >= 2
+    # the GETALL ran again, to the end
+    assert result[0]["FAN;BOOKENDS"] == ("1", "7")
+
+
+def test_query_skips_unrelated_messages(make_device, monkeypatch):
+    device = make_device(unsolicited=["LIGHT;LEVEL;ACTUAL", "FAN;SPD;MIN"])
+    monkeypatch.setattr(SenseMe, "PORT", device.port)
+    fan = SenseMe(ip=device.ip, name=device.name, timeout=0.5)
+    assert fan.speed == 3
+
+
+def test_power_on_drops_cached_speed(fan, fake_device):
+    fan._get_all()
+    fan.fan_powered_on = False
+    assert fan._get_all()["FAN;SPD;ACTUAL"] == "0"
+    # the device picks the speed it comes back on at
+    fake_device.state["FAN;SPD;ACTUAL"] = "4"
+    fan.fan_powered_on = True
+    assert "FAN;SPD;ACTUAL" not in fan._all_cache
+    assert fan.get_attribute("FAN;SPD;ACTUAL") == "4"
+    assert fan._get_all()["FAN;SPD;ACTUAL"] == "4"
+    assert fake_device.getalls_started == 1
+
+
+def test_callbacks_may_use_the_device_with_a_pool(make_device, monkeypatch):
+    device = make_device(unsolicited=["FAN;DIR"])
+    monkeypatch.setattr(SenseMe, "PORT", device.port)
+    pool = ConnectionPool(timeout=0.5)
+    fan = SenseMe(ip=device.ip, name=device.name, connection_pool=pool)
+    fan._get_all()
+    seen = []
+
+    def changed(attribute, old, new, source):
+        # reads the device, on the pooled connection the push came in on
+        seen.append((attribute, new, fan.light_powered_on))
+
+    fan.subscribe(changed, ["FAN;DIR"])
+    device.state["FAN;DIR"] = "REV"
+    thread = threading.Thread(target=lambda: fan.speed, daemon=True)
+    thread.start()
+    thread.join(3)
+    assert not thread.is_alive()
+    assert seen == [("FAN;DIR", "REV", True)]
+
+
+def test_interactive_command_preempts_revalidating_getall(make_device, make_fan):
+    device = make_device(getall_gap=0.05)
+    fan = make_fan(device, stale_while_revalidate=True)
+    fan._get_all()
+    fan._get_all_request.cache.ttl = 0
+    # served stale, refreshed in the background
+    assert fan._get_all()["FAN;SPD;ACTUAL"] == "3"
+    while device.getalls_started < 2:
+        time.sleep(0.01)
+    started = time.monotonic()
+    assert fan.speed == 3
+    assert time.monotonic() - started < 0.5
+
+
+def test_redundant_write_is_suppressed(fake_device, make_fan):
+    fan = make_fan(fake_device, suppress_redundant_writes=5)
+    fan.speed = 4
+    fan.speed = 4
+    assert fake_device.wait_for("FAN;SPD;ACTUAL", "4")
+    assert fan.suppressed_writes == {"FAN;SPD;ACTUAL": 1}
+    fan.set_property("speed", 4, force=True)
+    time.sleep(0.1)
+    assert sum("FAN;SPD;SET" in command for command in fake_device.commands) == 2
+
+
+def test_implied_value_does_not_suppress_write(fake_device, make_fan):
+    fan = make_fan(fake_device, suppress_redundant_writes=5)
+    # implies the fan is off, which the fake device doesn't follow
+    fan.speed = 0
+    fan.fan_powered_on = False
+    assert fake_device.wait_for("FAN;PWR", "OFF")
+    assert fan.suppressed_writes == {}
+
+
+def test_deadline_bounds_an_unanswered_query(fake_device, make_fan):
+    fan = make_fan(fake_device, timeout=5)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with fan.deadline(0.2):
+            fan._query("<%s;NO;SUCH;GET>" % fake_device.name)
+    assert time.monotonic() - started < 1
+
+
+def test_deadline_bounds_waiting_for_another_getall(make_device, make_fan):
+    device = make_device(getall_gap=0.05)
+    fan = make_fan(device)
+    thread = threading.Thread(target=fan._get_all)
+    thread.start()
+    while not device.getalls_started:
+        time.sleep(0.01)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            with fan.deadline(0.1):
+                fan._get_all()
+    finally:
+        thread.join()
+
+
+def test_get_many_reads_properties_on_one_connection(fan, fake_device):
+    properties = ["speed", "brightness", "fan_direction", "beeper_sound"]
+    values = fan.get_many(properties)
+    assert fake_device.connections == 1
+    assert len(fake_device.commands) == 4
+    assert values == {prop: getattr(fan, prop) for prop in properties}
+    assert values["speed"] == 3
+
+
+def test_iter_all_yields_replies_as_they_arrive(make_device, make_fan):
+    device = make_device(getall_gap=0.02)
+    fan = make_fan(device)
+    pairs = fan.iter_all()
+    assert next(pairs) == ("FAN;PWR", "ON")
+    assert not device.getalls_finished
+    rest = dict(pairs)
+    assert rest["FAN;BOOKENDS"] == ("1", "7")
+    assert len(rest) == len(device.state) - 1
+
+
+def test_iter_all_yields_a_cached_getall(fan, fake_device):
+    fan._get_all()
+    assert dict(fan.iter_all()) == dict(fan._get_all())
+    assert fake_device.getalls_started == 1
+
+
+def test_get_attribute_early_exit_leaves_getall_to_fill_cache(make_device, make_fan):
+    device = make_device(getall_gap=0.02)
+    fan = make_fan(device)
+    assert fan.get_attribute("FAN;DIR", early_exit=True) == "FWD"
+    assert not device.getalls_finished
+    assert fan.get_attribute("SLEEP;EVENT;OFF") == "LIGHT,LEVEL,5"
+    assert device.getalls_started == 1
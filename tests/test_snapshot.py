@@ -0,0 +1,40 @@
+import pytest
+
+from senseme.lib import Snapshot
+
+
+def test_updated_returns_a_new_version():
+    snapshot = Snapshot({"FAN;PWR": "ON", "FAN;SPD;ACTUAL": "3"})
+    updated = snapshot.updated({"FAN;SPD;ACTUAL": "0"}, removed=["FAN;PWR"])
+    assert dict(updated) == {"FAN;SPD;ACTUAL": "0"}
+    assert updated.version == 1
+    assert dict(snapshot) == {"FAN;PWR": "ON", "FAN;SPD;ACTUAL": "3"}
+
+
+def test_replaced_holds_only_the_new_values():
+    snapshot = Snapshot({"FAN;PWR": "ON"}, version=4).replaced({"LIGHT;PWR": "ON"})
+    assert dict(snapshot) == {"LIGHT;PWR": "ON"}
+    assert snapshot.version == 5
+
+
+def test_snapshot_cannot_be_changed():
+    values = {"FAN;PWR": "ON"}
+    snapshot = Snapshot(values)
+    values["FAN;PWR"] = "OFF"
+    assert snapshot["FAN;PWR"] == "ON"
+    with pytest.raises(TypeError):
+        snapshot["FAN;PWR"] = "OFF"
+
+
+def test_readers_keep_a_consistent_snapshot(fan):
+    held = fan._get_all()
+    fan._apply_push("(%s;FAN;DIR;REV)" % fan.name)
+    assert held["FAN;DIR"] == "FWD"
+    current = fan._get_all()
+    assert current["FAN;DIR"] == "REV"
+    assert current.version > held.version
+
+
+def test_unchanged_refresh_keeps_the_snapshot(fan):
+    held = fan._get_all()
+    assert fan._refresh_all() is held
@@ -0,0 +1,64 @@
+from senseme.senseme import GETALL, LOCAL, PUSH
+
+
+def record(fan, attributes=None):
+    changes = []
+    fan.subscribe(lambda *change: changes.append(change), attributes)
+    return changes
+
+
+def test_commands_report_written_and_implied_changes(fan):
+    fan._get_all()
+    changes = record(fan)
+    fan.speed = 0
+    assert sorted(changes) == [
+        ("FAN;PWR", "ON", "OFF", LOCAL),
+        ("FAN;SPD;ACTUAL", "3", "0", LOCAL),
+    ]
+
+
+def test_refresh_reports_device_changes(fan, fake_device):
+    fan._get_all()
+    changes = record(fan)
+    fake_device.state["FAN;DIR"] = "REV"
+    fan._refresh_all()
+    assert changes == [("FAN;DIR", "FWD", "REV", GETALL)]
+
+
+def test_nothing_is_reported_without_a_snapshot(fan):
+    changes = record(fan)
+    fan.speed = 4
+    assert changes == []
+
+
+def test_subscribers_get_the_attributes_they_asked_for(fan):
+    fan._get_all()
+    light = record(fan, ["LIGHT;PWR"])
+    fan._apply_push("(%s;FAN;DIR;REV)" % fan.name)
+    fan._apply_push("(%s;LIGHT;PWR;OFF)" % fan.name)
+    assert light == [("LIGHT;PWR", "ON", "OFF", PUSH)]
+
+
+def test_failing_subscriber_does_not_stop_the_others(fan):
+    fan._get_all()
+
+    def fail(*change):
+        raise RuntimeError("broken subscriber")
+
+    fan.subscribe(fail)
+    changes = record(fan)
+    fan._apply_push("(%s;FAN;DIR;REV)" % fan.name)
+    assert changes == [("FAN;DIR", "FWD", "REV", PUSH)]
+
+
+def test_unsubscribed_callback_is_not_called(fan):
+    fan._get_all()
+    changes = []
+
+    def callback(*change):
+        changes.append(change)
+
+    fan.subscribe(callback)
+    fan.unsubscribe(callback)
+    fan._apply_push("(%s;FAN;DIR;REV)" % fan.name)
+    assert changes == []
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from senseme.lib import IdentityCache
+from senseme.sweep import sweep
+
+
+@pytest.fixture
+def devices(make_device):
+    first = make_device(ip="127.0.0.2")
+    second = make_device(
+        ip="127.0.0.3", port=first.port, name="Other Fan", mac="20:F8:5E:00:00:02"
+    )
+    return first, second
+
+
+@pytest.mark.parametrize("protocols", [("tcp",), ("udp",), ("udp", "tcp")])
+def test_sweep_finds_each_device_once(devices, protocols):
+    first, _ = devices
+    found = sweep("127.0.0.0/28", protocols=protocols, timeout=0.5, port=first.port)
+    assert sorted((fan.name, fan.ip, fan.mac) for fan in found) == [
+        ("Other Fan", "127.0.0.3", "20:F8:5E:00:00:02"),
+        ("Test Fan", "127.0.0.2", "20:F8:5E:00:00:01"),
+    ]
+    assert {(fan.model, fan.series) for fan in found} == {("FAN,HAIKU", "HSERIES")}
+
+
+def test_sweep_probes_addresses_concurrently(devices):
+    first, _ = devices
+    started = time.monotonic()
+    found = sweep(
+        ["127.0.1.0/24", "127.0.0.2"],
+        protocols=("tcp",),
+        timeout=0.5,
+        max_concurrency=64,
+        port=first.port,
+    )
+    assert [fan.ip for fan in found] == ["127.0.0.2"]
+    # 255 addresses, 64 at a time, at most 0.5 seconds each
+    assert time.monotonic() - started < 4
+
+
+def test_sweep_stores_identities(devices, tmp_path):
+    first, _ = devices
+    cache = IdentityCache(str(tmp_path / "identities.json"))
+    sweep(
+        "127.0.0.2",
+        protocols=("tcp",),
+        timeout=0.5,
+        port=first.port,
+        identity_cache=cache,
+    )
+    assert cache.find(mac=first.mac)["ip"] == "127.0.0.2"
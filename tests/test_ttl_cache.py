@@ -0,0 +1,175 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from senseme.lib import MWT, CachedMethod, TTLCache
+
+
+def test_value_expires_after_ttl():
+    cache = TTLCache(ttl=0.05)
+    cache.set("key", 1)
+    assert cache.get("key") == 1
+    time.sleep(0.1)
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_update_keeps_age():
+    cache = TTLCache()
+    cache.set("key", [1])
+    time.sleep(0.05)
+    cache.update("key", lambda value: value + [2])
+    cache.update("missing", lambda value: value + [2])
+    assert cache.get("key") == [1, 2]
+    assert cache.age("key") >= 0.05
+    assert cache.get("missing") is None
+
+
+def test_concurrent_callers_share_one_load():
+    cache = TTLCache()
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(None)
+        started.set()
+        time.sleep(0.1)
+        return len(calls)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [1] * 5
+
+
+def test_failed_load_is_retried_by_next_caller():
+    cache = TTLCache()
+
+    def failing():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        cache.get_or_load("k", failing)
+    assert cache.get_or_load("k", lambda: 2) == 2
+
+
+def test_waiting_for_a_load_times_out():
+    cache = TTLCache()
+    release = threading.Event()
+
+    def slow():
+        release.wait()
+        return 1
+
+    thread = threading.Thread(target=cache.get_or_load, args=("k", slow))
+    thread.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(socket.timeout):
+            cache.get_or_load("k", slow, timeout=0.05)
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_stale_value_served_while_revalidating():
+    cache = TTLCache(ttl=0.05, max_stale=10)
+    cache.set("k", "old")
+    time.sleep(0.1)
+    loaded = threading.Event()
+
+    def loader():
+        loaded.set()
+        return "new"
+
+    assert cache.get_or_load("k", loader) == "old"
+    assert loaded.wait(1)
+    for _ in range(100):
+        if cache.get("k") == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get("k") == "new"
+
+
+def test_too_stale_value_is_loaded():
+    cache = TTLCache(ttl=0.02, max_stale=0.05)
+    cache.set("k", "old")
+    time.sleep(0.1)
+    assert cache.get_or_load("k", lambda: "new") == "new"
+
+
+class Device:
+    def __init__(self):
+        self.calls = 0
+
+    @CachedMethod(ttl=45)
+    def slow_request(self):
+        self.calls += 1
+        return self.calls
+
+
+def test_cached_method_per_instance():
+    first, second = Device(), Device()
+    assert first.slow_request() == 1
+    assert first.slow_request() == 1
+    assert second.slow_request() == 1
+    assert first.slow_request.refresh() == 2
+    first.slow_request.cache.clear()
+    assert first.slow_request() == 3
+
+
+def test_mwt_is_a_deprecated_ttl_cache():
+    calls = []
+    with pytest.warns(DeprecationWarning):
+        memoize = MWT(timeout=0.05)
+
+    @memoize
+    def slow(value):
+        calls.append(value)
+        return value * 2
+
+    assert slow(2) == 4
+    assert slow(2) == 4
+    assert calls == [2]
+    time.sleep(0.1)
+    memoize.collect()
+    assert len(slow.cache) == 0
+    assert slow(2) == 4
+    assert calls == [2, 2]
+
+
+def test_revalidate_runs_the_background_load():
+    cache = TTLCache(ttl=0.01, max_stale=10)
+    cache.set("k", "old")
+    time.sleep(0.05)
+    ran = []
+    done = threading.Event()
+
+    def revalidate(load):
+        ran.append(threading.current_thread())
+        try:
+            return load()
+        finally:
+            done.set()
+
+    assert cache.get_or_load("k", lambda: "new", revalidate=revalidate) == "old"
+    assert done.wait(1)
+    assert ran and ran[0] is not threading.current_thread()